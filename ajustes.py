@@ -0,0 +1,293 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from metricas import METRICAS
+from transformacion import aplicar_tipos
+
+# Serie ajustada por splits y dividendos y estado de los eventos con que se calculó
+TABLA_AJUSTADA = "mercado_ajustado"
+TABLA_ESTADO_AJUSTES = "estado_ajustes"
+
+# Base de los precios de mercado_diario por ticker: "raw" desde que se descargan con auto_adjust=False
+TABLA_BASE_PRECIOS = "base_precios"
+BASE_SIN_AJUSTAR = "raw"
+TABLAS_AJUSTES = (TABLA_AJUSTADA, TABLA_ESTADO_AJUSTES, TABLA_BASE_PRECIOS)
+
+COLUMNAS_PRECIO = ("open price", "high price", "low price", "closing price")
+
+# =============================================================================
+# SERIE AJUSTADA POR SPLITS Y DIVIDENDOS
+# =============================================================================
+# mercado_diario guarda los precios tal como llegan (sin ajustar por
+# dividendos) y los eventos van en dividendos y splits. Aquí se calcula, por
+# ticker, el factor acumulado de ajuste de cada sesión y se materializa la
+# serie OHLC ajustada en mercado_ajustado. Cada evento multiplica por su
+# factor todas las sesiones anteriores a su fecha, así que un evento nuevo
+# obliga a recalcular su ticker entero; los demás tickers solo añaden sus
+# sesiones nuevas (con factor 1, porque no hay eventos posteriores a ellas).
+
+def _fechas(valores):
+    # Según el destino la fecha llega como date, datetime64 o texto (SQLite)
+    return pd.to_datetime(pd.Series(valores)).to_numpy()
+
+def _eventos(df, columna_valor):
+    """Eventos (ticker, date, valor) válidos de la tabla dividendos o splits"""
+    if df is None or df.empty:
+        return pd.DataFrame({"ticker": pd.Series(dtype=object), "date": pd.Series(dtype="datetime64[ns]"),
+                             "valor": pd.Series(dtype=float)})
+    eventos = pd.DataFrame({
+        "ticker": df["ticker"].astype(str).to_numpy(),
+        "date": _fechas(df["Date"]),
+        "valor": pd.to_numeric(df[columna_valor], errors="coerce").astype("float64").to_numpy()
+    })
+    eventos = eventos[eventos["valor"] > 0]
+    return eventos.drop_duplicates(["ticker", "date"], keep="last").reset_index(drop=True)
+
+def huella_eventos(dividendos, splits, ultimas):
+    """Hash de los eventos en vigor de cada ticker de `ultimas` ({ticker: última fecha con precio}).
+
+    Solo cuentan los eventos hasta la última sesión guardada: un dividendo
+    anunciado para una fecha futura no cambia aún ninguna sesión, y cambiará
+    la huella (y provocará el recálculo) cuando llegue su sesión.
+    """
+    partes = []
+    for tipo, eventos in (("d", _eventos(dividendos, "divident")), ("s", _eventos(splits, "split ratio"))):
+        eventos = eventos[eventos["ticker"].isin(list(ultimas))]
+        limite = pd.to_datetime(eventos["ticker"].map(ultimas))
+        eventos = eventos[eventos["date"] <= limite]
+        partes.append(pd.DataFrame({
+            "ticker": eventos["ticker"],
+            "texto": tipo + eventos["date"].dt.strftime("%Y-%m-%d") + "=" + eventos["valor"].round(6).astype(str)
+        }))
+    textos = pd.concat(partes, ignore_index=True).sort_values(["ticker", "texto"], kind="stable")
+    por_ticker = textos.groupby("ticker", sort=False)["texto"].agg(";".join).to_dict()
+    return {ticker: hashlib.sha1(por_ticker.get(ticker, "").encode()).hexdigest() for ticker in ultimas}
+
+def _fila_anterior(sesiones, eventos):
+    """Eventos con `fila`: índice en `sesiones` de la víspera (última sesión del ticker anterior a su fecha).
+
+    Se descartan los eventos sin víspera (anteriores al histórico) y los que
+    aún no tienen sesión propia (fecha posterior a la última guardada).
+    """
+    if eventos.empty:
+        return eventos.assign(fila=pd.Series(dtype=int))
+    derecha = sesiones[["ticker", "date"]].assign(fila=np.arange(len(sesiones), dtype=float))
+    eventos = pd.merge_asof(eventos.sort_values("date", kind="stable"), derecha.sort_values("date", kind="stable"),
+                            on="date", by="ticker", direction="backward", allow_exact_matches=False)
+    eventos = eventos.dropna(subset=["fila"])
+    filas = eventos["fila"].to_numpy(dtype=int)
+    siguiente = np.minimum(filas + 1, len(sesiones) - 1)
+    con_sesion = ((filas + 1 < len(sesiones))
+                  & (sesiones["ticker"].to_numpy()[siguiente] == eventos["ticker"].to_numpy()))
+    return eventos[con_sesion]
+
+def _factor_acumulado(df, factores):
+    """Producto, por ticker, de los factores de la propia fila y de las posteriores"""
+    logaritmos = pd.Series(np.log(factores), index=df.index)
+    grupos = logaritmos.groupby(df["ticker"], sort=False)
+    return np.exp(grupos.transform("sum") - grupos.cumsum() + logaritmos).to_numpy()
+
+def calcular_ajustes(precios, dividendos=None, splits=None):
+    """Serie OHLC ajustada por splits y dividendos y su factor acumulado, por ticker y fecha.
+
+    El factor de un evento se aplica a las sesiones anteriores a su fecha:
+    un split de razón r multiplica los precios por 1/r (y el volumen por r)
+    y un dividendo D por 1 - D / cierre de la víspera, como Yahoo. Yahoo ya
+    entrega los precios ajustados por splits, pero las filas guardadas antes
+    del split pueden no estarlo; por eso un split solo se aplica si el salto
+    de cierre entre la víspera y su sesión se parece más a 1/r que a 1.
+    """
+    df = pd.DataFrame({
+        "ticker": precios["ticker"].astype(str).to_numpy(),
+        "market": precios["market"].astype(str).to_numpy(),
+        "date": _fechas(precios["date"]),
+        **{c: pd.to_numeric(precios[c], errors="coerce").astype("float64").to_numpy() for c in COLUMNAS_PRECIO},
+        "volume": pd.to_numeric(precios["volume"], errors="coerce").astype("float64").to_numpy()
+    })
+    df = df[df["closing price"] > 0]
+    df = (df.sort_values(["ticker", "date"], kind="stable")
+          .drop_duplicates(["ticker", "date"], keep="last").reset_index(drop=True))
+    cierre = df["closing price"].to_numpy()
+
+    # Splits: factor 1/r en la víspera si los precios guardados aún no lo reflejan
+    factor_split = np.ones(len(df))
+    splits = _fila_anterior(df, _eventos(splits, "split ratio"))
+    if not splits.empty:
+        filas = splits["fila"].to_numpy(dtype=int)
+        razon = splits["valor"].to_numpy()
+        salto = cierre[filas + 1] / cierre[filas]
+        sin_aplicar = np.abs(np.log(salto * razon)) < np.abs(np.log(salto))
+        np.multiply.at(factor_split, filas[sin_aplicar], 1 / razon[sin_aplicar])
+    acumulado_split = _factor_acumulado(df, factor_split)
+
+    # Dividendos: el cierre de la víspera, ya en la base de los splits posteriores
+    factor_dividendo = np.ones(len(df))
+    dividendos = _fila_anterior(df, _eventos(dividendos, "divident"))
+    if not dividendos.empty:
+        filas = dividendos["fila"].to_numpy(dtype=int)
+        factor = 1 - dividendos["valor"].to_numpy() / (cierre[filas] * acumulado_split[filas])
+        validos = (factor > 0) & (factor < 1)
+        np.multiply.at(factor_dividendo, filas[validos], factor[validos])
+    acumulado = acumulado_split * _factor_acumulado(df, factor_dividendo)
+
+    for columna in COLUMNAS_PRECIO:
+        df[columna] = df[columna] * acumulado
+    df["volume"] = df["volume"] / acumulado_split
+    df["adjustment factor"] = acumulado
+    df["date"] = df["date"].dt.date
+    return aplicar_tipos(df, TABLA_AJUSTADA)
+
+# =============================================================================
+# MIGRACIÓN DE LOS PRECIOS GUARDADOS AJUSTADOS
+# =============================================================================
+# Antes mercado_diario se descargaba con auto_adjust=True (precios ya
+# ajustados por dividendos). Esas filas no pueden mezclarse con las sin
+# ajustar ni volver a ajustarse: cada ticker se marca en base_precios cuando
+# su histórico ya está sin ajustar, y los que tienen precios guardados sin
+# la marca recargan su histórico completo antes de seguir en incremental.
+
+def precios_por_migrar(destino, tickers):
+    """Tickers sin la marca de precios sin ajustar y, de ellos, los que ya tienen precios guardados.
+
+    Los segundos se guardaron ajustados por dividendos: su histórico debe
+    recargarse entero para no mezclar las dos bases.
+    """
+    base = destino.leer(TABLA_BASE_PRECIOS, tickers=list(tickers))
+    marcados = set() if base.empty else set(base.loc[base["price basis"] == BASE_SIN_AJUSTAR, "ticker"].astype(str))
+    sin_marca = [t for t in tickers if t not in marcados]
+    guardados = destino.ultimas_fechas("mercado_diario", "date") if sin_marca else {}
+    return sin_marca, [t for t in sin_marca if t in guardados]
+
+def marcar_precios_sin_ajustar(destino, acciones, recargados=()):
+    """Marca en base_precios los tickers de `acciones` cuyo histórico ya está guardado sin ajustar.
+
+    La huella en estado_ajustes de los `recargados` (antes ajustados) se
+    invalida para que su serie ajustada se recalcule entera.
+    """
+    if not acciones:
+        return False
+    marcas = pd.DataFrame({
+        "ticker": [accion["ticker"] for accion in acciones],
+        "market": [accion["mercado"] for accion in acciones],
+        "price basis": BASE_SIN_AJUSTAR
+    })
+    if not destino.reemplazar(aplicar_tipos(marcas, TABLA_BASE_PRECIOS), TABLA_BASE_PRECIOS):
+        return False
+    recargados = [accion["ticker"] for accion in acciones if accion["ticker"] in set(recargados)]
+    estado = destino.leer(TABLA_ESTADO_AJUSTES, tickers=recargados) if recargados else pd.DataFrame()
+    if not estado.empty:
+        estado["actions hash"] = ""
+        destino.reemplazar(aplicar_tipos(estado, TABLA_ESTADO_AJUSTES), TABLA_ESTADO_AJUSTES)
+    if recargados:
+        print(f"🧬 {len(recargados)} tickers con el histórico recargado sin ajustar")
+    return True
+
+# =============================================================================
+# ACTUALIZACIÓN INCREMENTAL EN EL DESTINO
+# =============================================================================
+
+def _ultimo_estado(destino, tickers):
+    """{ticker: huella} de estado_ajustes, que guarda una fila por ticker"""
+    estado = destino.leer(TABLA_ESTADO_AJUSTES, tickers=tickers)
+    if estado.empty:
+        return {}
+    if estado["ticker"].duplicated().any():
+        # Formato anterior (una fila por ticker y ejecución): se conserva la última de cada ticker
+        estado = (destino.leer(TABLA_ESTADO_AJUSTES).assign(_fecha=lambda df: _fechas(df["date"]))
+                  .sort_values("_fecha", kind="stable").drop_duplicates("ticker", keep="last")
+                  .drop(columns="_fecha").reset_index(drop=True))
+        destino.eliminar(TABLA_ESTADO_AJUSTES)
+        destino.reemplazar(aplicar_tipos(estado, TABLA_ESTADO_AJUSTES), TABLA_ESTADO_AJUSTES)
+        print(f"🧬 {TABLA_ESTADO_AJUSTES} migrada a una fila por ticker")
+        estado = estado[estado["ticker"].astype(str).isin(tickers)]
+    return dict(zip(estado["ticker"].astype(str), estado["actions hash"]))
+
+def _primer_cambio(anterior, ajustada):
+    """{ticker: primera fecha cuyo rendimiento cambió} comparando el factor guardado con el nuevo.
+
+    El cociente entre el factor nuevo y el anterior es constante entre
+    eventos; donde salta, cambia el rendimiento de esa sesión.
+    """
+    if anterior.empty:
+        return {}
+    comparada = pd.DataFrame({
+        "ticker": ajustada["ticker"].astype(str).to_numpy(), "date": _fechas(ajustada["date"]),
+        "nuevo": ajustada["adjustment factor"].astype("float64").to_numpy()
+    })
+    anterior = pd.DataFrame({
+        "ticker": anterior["ticker"].astype(str).to_numpy(), "date": _fechas(anterior["date"]),
+        "viejo": pd.to_numeric(anterior["adjustment factor"], errors="coerce").to_numpy()
+    })
+    comparada = comparada.merge(anterior, on=["ticker", "date"], how="inner")
+    cociente = np.log(comparada["nuevo"] / comparada["viejo"])
+    cambio = cociente.groupby(comparada["ticker"], sort=False).diff().abs() > 1e-9
+    cambios = comparada[cambio]
+    return {ticker: fecha.date() for ticker, fecha in cambios.groupby("ticker")["date"].min().items()}
+
+def actualizar_ajustes(destino, tickers=None, completo=False):
+    """Actualiza mercado_ajustado; devuelve {ticker recalculado entero: primera fecha con rendimiento distinto}.
+
+    Los tickers cuyos eventos cambiaron (o nuevos, o todos con `completo`)
+    se recalculan con todo su histórico; para el resto solo se añaden las
+    sesiones posteriores a la última ajustada. La fecha es None si el
+    ticker es nuevo o si sus rendimientos no cambian.
+    """
+    ultimos_precios = destino.ultimas_fechas("mercado_diario", "date")
+    if tickers is not None:
+        tickers = set(tickers)
+        ultimos_precios = {t: f for t, f in ultimos_precios.items() if t in tickers}
+    if not ultimos_precios:
+        return {}
+
+    with METRICAS.medir("analitica_lectura", tabla=TABLA_AJUSTADA):
+        lista = list(ultimos_precios)
+        dividendos = destino.leer("dividendos", tickers=lista)
+        splits = destino.leer("splits", tickers=lista)
+        huellas = huella_eventos(dividendos, splits, ultimos_precios)
+        estado = {} if completo else _ultimo_estado(destino, lista)
+        marcas = {} if completo else destino.ultimas_fechas(TABLA_AJUSTADA, "date")
+
+    recalcular = [t for t in ultimos_precios if t not in marcas or estado.get(t) != huellas[t]]
+    continuar = [t for t in ultimos_precios if t not in recalcular and ultimos_precios[t] > marcas[t]]
+    if not recalcular and not continuar:
+        print(f"⏭️  {TABLA_AJUSTADA} al día")
+        return {}
+
+    lecturas, filas, cambios = [], 0, {}
+    with METRICAS.medir("analitica_lectura", tabla=TABLA_AJUSTADA):
+        if recalcular:
+            lecturas.append(destino.leer("mercado_diario", tickers=recalcular))
+        if continuar:
+            lecturas.append(destino.leer("mercado_diario", tickers=continuar,
+                                         desde=min(marcas[t] for t in continuar)))
+    lecturas = [df for df in lecturas if not df.empty]
+    if lecturas:
+        with METRICAS.medir("analitica", tabla=TABLA_AJUSTADA):
+            ajustada = calcular_ajustes(pd.concat(lecturas, ignore_index=True), dividendos, splits)
+            ticker = ajustada["ticker"].astype(str)
+            limite = pd.to_datetime(ticker.map(marcas))
+            ajustada = ajustada[ticker.isin(recalcular) | (pd.to_datetime(ajustada["date"]) > limite)]
+        conocidos = [t for t in recalcular if t in marcas]
+        if conocidos:
+            cambios = _primer_cambio(destino.leer(TABLA_AJUSTADA, tickers=conocidos),
+                                     ajustada[ajustada["ticker"].astype(str).isin(conocidos)])
+        if recalcular:
+            print(f"📐 {TABLA_AJUSTADA}: {len(recalcular)} tickers recalculados por eventos nuevos o cambiados")
+        if not ajustada.empty and destino.reemplazar(ajustada, TABLA_AJUSTADA, "date"):
+            filas = len(ajustada)
+
+    # La huella solo se guarda si la serie se escribió: si no, el próximo intento vuelve a recalcular
+    escritos = recalcular + continuar if filas else []
+    if escritos:
+        mercados = ajustada.groupby(ajustada["ticker"].astype(str), observed=True)["market"].first()
+        estado_nuevo = pd.DataFrame({
+            "ticker": escritos,
+            "market": [mercados.get(t) for t in escritos],
+            "date": [ultimos_precios[t] for t in escritos],
+            "actions hash": [huellas[t] for t in escritos]
+        })
+        destino.reemplazar(aplicar_tipos(estado_nuevo, TABLA_ESTADO_AJUSTES), TABLA_ESTADO_AJUSTES)
+    print(f"📐 {TABLA_AJUSTADA}: {filas} filas escritas")
+    return {t: cambios.get(t) for t in recalcular} if filas else {}
@@ -0,0 +1,553 @@
+import glob
+import os
+import re
+import shutil
+import time
+
+import pandas as pd
+from sqlalchemy import bindparam, inspect, text
+
+from carga import CLAVES_TABLAS, ESTRATEGIA_CARGA, MODO_ESCRITURA, columna_fecha, guardar_dataframe_seguro
+from dimensiones import TABLAS_DIMENSION, VALIDO_DESDE, VIGENTE, guardar_dimension
+from metricas import METRICAS
+from transformacion import FECHA_FOTO, tipos_de_escritura
+
+# Destinos de carga disponibles
+DESTINOS = ("mysql", "parquet", "duckdb")
+
+# Rutas por defecto de los destinos locales
+RUTA_PARQUET = "datos_parquet"
+RUTA_DUCKDB = "colcap_ibex.duckdb"
+
+# Tabla auxiliar (MySQL y DuckDB) o directorio (Parquet) con un contador de escrituras por tabla
+TABLA_VERSIONES = "versiones_tablas"
+
+# Copia de las recomendaciones guardadas antes de tener clave
+TABLA_RECOMENDACIONES_SIN_CLAVE = "recomendaciones_sin_clave"
+
+# =============================================================================
+# DESTINOS DE CARGA
+# =============================================================================
+# Todos los destinos exponen la misma interfaz:
+#   guardar(df, tabla, fecha_columna, ticker_columna) -> bool
+#   reemplazar(df, tabla, fecha_columna, ticker_columna) -> bool
+#   leer(tabla, tickers, mercados, desde, hasta, actuales) -> DataFrame
+#   ultimas_fechas(tabla, columna_fecha) -> {ticker: fecha}
+#   tickers(tabla) -> tickers distintos guardados en la tabla
+#   eliminar(tabla)
+#   renombrar(tabla, nuevo_nombre) (si `nuevo_nombre` existe, se reemplaza)
+#   columnas(tabla) -> nombres de las columnas guardadas ([] si no existe)
+#   version(tabla) -> valor que cambia con cada escritura en la tabla
+#   cerrar()
+# y la misma semántica de escritura: una fila con la misma clave (ticker,
+# fecha) reemplaza a la anterior. `version` permite a las cachés de lectura
+# (lectura.py) saber si lo que guardaron sigue al día. Las tablas de dimensión (sin fecha propia)
+# se guardan versionadas con `guardar_dimension` (ver dimensiones.py):
+# solo se escriben los tickers cuya foto cambió.
+
+def claves_de(tabla, df, fecha_columna=None, ticker_columna="ticker"):
+    """Clave de reemplazo de la tabla: (ticker, fecha) en series temporales, solo ticker en el resto"""
+    claves = CLAVES_TABLAS.get(tabla)
+    if claves is None and fecha_columna:
+        claves = [ticker_columna, fecha_columna]
+    if claves and all(c in df.columns for c in claves):
+        return claves
+    return [ticker_columna]
+
+def _filtrar(df, tickers=None, mercados=None, desde=None, hasta=None, fecha_columna=None, actuales=False):
+    """Aplica en pandas los mismos filtros que `leer` empuja al almacenamiento"""
+    if actuales and VIGENTE in df.columns:
+        df = df[df[VIGENTE].astype(bool)]
+    if tickers is not None:
+        df = df[df["ticker"].isin(tickers)]
+    if mercados is not None:
+        columna_mercado = "market" if "market" in df.columns else "mercado"
+        df = df[df[columna_mercado].isin(mercados)]
+    if fecha_columna and fecha_columna in df.columns:
+        fechas = pd.to_datetime(df[fecha_columna])
+        if desde is not None:
+            df = df[fechas >= pd.Timestamp(desde)]
+        if hasta is not None:
+            df = df[fechas <= pd.Timestamp(hasta)]
+    return df.reset_index(drop=True)
+
+def _es_foto_dimension(df, tabla):
+    """La foto de una tabla de dimensión que llega del pipeline, aún sin columnas de versión"""
+    return tabla in TABLAS_DIMENSION and VALIDO_DESDE not in df.columns
+
+
+class AlmacenamientoSQL:
+    """Destino MySQL (o cualquier base SQLAlchemy) con la carga segura de carga.py"""
+
+    nombre = "mysql"
+
+    def __init__(self, engine, modo=MODO_ESCRITURA, estrategia=ESTRATEGIA_CARGA):
+        self.engine = engine
+        self.modo = modo
+        self.estrategia = estrategia
+        self._versiones_creada = False
+
+    def _crear_versiones(self):
+        if not self._versiones_creada:
+            with self.engine.begin() as conn:
+                conn.execute(text(f"CREATE TABLE IF NOT EXISTS {TABLA_VERSIONES} ("
+                                  "tabla VARCHAR(64) NOT NULL PRIMARY KEY, version BIGINT NOT NULL)"))
+            self._versiones_creada = True
+
+    def _anotar_escritura(self, tabla):
+        """Sube la versión de la tabla tras escribir en ella"""
+        self._crear_versiones()
+        with self.engine.begin() as conn:
+            cambiadas = conn.execute(text(f"UPDATE {TABLA_VERSIONES} SET version = version + 1 "
+                                          "WHERE tabla = :tabla"), {"tabla": tabla}).rowcount
+            if not cambiadas:
+                conn.execute(text(f"INSERT INTO {TABLA_VERSIONES} (tabla, version) VALUES (:tabla, 1)"),
+                             {"tabla": tabla})
+
+    def guardar(self, df, tabla, fecha_columna=None, ticker_columna="ticker"):
+        if _es_foto_dimension(df, tabla):
+            return guardar_dimension(self, df, tabla)
+        exito = guardar_dataframe_seguro(self.engine, df, tabla, fecha_columna, ticker_columna,
+                                         modo=self.modo, estrategia=self.estrategia)
+        if exito:
+            self._anotar_escritura(tabla)
+        return exito
+
+    def reemplazar(self, df, tabla, fecha_columna=None, ticker_columna="ticker"):
+        """Como guardar, pero las filas con clave ya guardada se actualizan también en modo 'append'"""
+        exito = guardar_dataframe_seguro(self.engine, df, tabla, fecha_columna, ticker_columna,
+                                         modo="upsert", estrategia=self.estrategia)
+        if exito:
+            self._anotar_escritura(tabla)
+        return exito
+
+    def leer(self, tabla, tickers=None, mercados=None, desde=None, hasta=None, actuales=False):
+        if not inspect(self.engine).has_table(tabla):
+            return pd.DataFrame()
+        q = self.engine.dialect.identifier_preparer.quote
+        fecha_columna = columna_fecha(tabla)
+        condiciones, parametros = [], {}
+        if actuales:
+            condiciones.append(q(VIGENTE))
+        if tickers is not None:
+            condiciones.append(f"{q('ticker')} IN :tickers")
+            parametros["tickers"] = list(tickers)
+        if mercados is not None:
+            columna_mercado = "mercado" if tabla == "recomendaciones" else "market"
+            condiciones.append(f"{q(columna_mercado)} IN :mercados")
+            parametros["mercados"] = list(mercados)
+        if fecha_columna and desde is not None:
+            condiciones.append(f"{q(fecha_columna)} >= :desde")
+            parametros["desde"] = desde
+        if fecha_columna and hasta is not None:
+            condiciones.append(f"{q(fecha_columna)} <= :hasta")
+            parametros["hasta"] = hasta
+        consulta = text(f"SELECT * FROM {q(tabla)}"
+                        + (f" WHERE {' AND '.join(condiciones)}" if condiciones else ""))
+        consulta = consulta.bindparams(*(bindparam(nombre, expanding=True)
+                                         for nombre in ("tickers", "mercados") if nombre in parametros))
+        with self.engine.connect() as conn:
+            return pd.read_sql(consulta, conn, params=parametros)
+
+    def ultimas_fechas(self, tabla="mercado_diario", columna_fecha="date"):
+        from carga import obtener_ultimas_fechas
+        return obtener_ultimas_fechas(self.engine, tabla, columna_fecha)
+
+    def tickers(self, tabla):
+        if not inspect(self.engine).has_table(tabla):
+            return []
+        q = self.engine.dialect.identifier_preparer.quote
+        with self.engine.connect() as conn:
+            return [fila[0] for fila in conn.execute(text(f"SELECT DISTINCT ticker FROM {q(tabla)}"))]
+
+    def eliminar(self, tabla):
+        """Borra la tabla; si esquema.py la define, se vuelve a crear vacía con su esquema explícito"""
+        from esquema import crear_vistas_actuales, metadata
+        q = self.engine.dialect.identifier_preparer.quote
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {q(tabla)}"))
+        if tabla in metadata.tables:
+            metadata.tables[tabla].create(self.engine)
+            crear_vistas_actuales(self.engine)
+        self._anotar_escritura(tabla)
+
+    def renombrar(self, tabla, nuevo_nombre):
+        q = self.engine.dialect.identifier_preparer.quote
+        with self.engine.begin() as conn:
+            # Las vistas <tabla>_actual se vuelven a crear al escribir la tabla versionada
+            for vista in (tabla, nuevo_nombre):
+                conn.execute(text(f"DROP VIEW IF EXISTS {q(vista + '_actual')}"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {q(nuevo_nombre)}"))
+            if self.engine.dialect.name == "sqlite":
+                # En SQLite los nombres de índice son globales: se liberan para volver a crear la tabla
+                for indice in inspect(conn).get_indexes(tabla):
+                    conn.execute(text(f"DROP INDEX {q(indice['name'])}"))
+            conn.execute(text(f"ALTER TABLE {q(tabla)} RENAME TO {q(nuevo_nombre)}"))
+        self._anotar_escritura(tabla)
+        self._anotar_escritura(nuevo_nombre)
+
+    def columnas(self, tabla):
+        inspector = inspect(self.engine)
+        return [c["name"] for c in inspector.get_columns(tabla)] if inspector.has_table(tabla) else []
+
+    def version(self, tabla):
+        self._crear_versiones()
+        with self.engine.connect() as conn:
+            return conn.execute(text(f"SELECT version FROM {TABLA_VERSIONES} WHERE tabla = :tabla"),
+                                {"tabla": tabla}).scalar() or 0
+
+    def cerrar(self):
+        self.engine.dispose()
+
+
+class AlmacenamientoParquet:
+    """Destino Parquet particionado por mercado/ticker/año, con lecturas podadas por partición.
+
+    Cada partición es un archivo; al guardar se reescriben solo las
+    particiones tocadas, fusionando las filas nuevas con las existentes por
+    clave. Las tablas sin fecha se particionan solo por mercado/ticker.
+    """
+
+    nombre = "parquet"
+
+    def __init__(self, ruta=RUTA_PARQUET, compresion="zstd"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("El destino Parquet necesita pyarrow: pip install pyarrow")
+        self.ruta = ruta
+        self.compresion = compresion
+        os.makedirs(ruta, exist_ok=True)
+
+    @staticmethod
+    def _valor_particion(valor):
+        # Los valores van en nombres de directorio: sin separadores de ruta
+        return re.sub(r"[\\/:]", "_", str(valor))
+
+    def _directorio(self, tabla, mercado, ticker, anio=None):
+        partes = [self.ruta, tabla, f"market={self._valor_particion(mercado)}",
+                  f"ticker={self._valor_particion(ticker)}"]
+        if anio is not None:
+            partes.append(f"year={anio}")
+        return os.path.join(*partes)
+
+    def _escribir(self, df, directorio):
+        os.makedirs(directorio, exist_ok=True)
+        archivo = os.path.join(directorio, "part-0.parquet")
+        temporal = archivo + ".tmp"
+        # Escritura atómica: un lector nunca ve una partición a medias
+        df.to_parquet(temporal, index=False, compression=self.compresion)
+        os.replace(temporal, archivo)
+
+    def _archivo_version(self, tabla):
+        return os.path.join(self.ruta, TABLA_VERSIONES, tabla)
+
+    def _anotar_escritura(self, tabla):
+        """Sube la versión de la tabla en su archivo, reemplazado de forma atómica"""
+        archivo = self._archivo_version(tabla)
+        os.makedirs(os.path.dirname(archivo), exist_ok=True)
+        temporal = f"{archivo}.{os.getpid()}.tmp"
+        with open(temporal, "w") as f:
+            f.write(str(self.version(tabla) + 1))
+        os.replace(temporal, archivo)
+
+    def guardar(self, df, tabla, fecha_columna=None, ticker_columna="ticker"):
+        if df.empty:
+            print(f"⚠️  DataFrame vacío para {tabla}, omitiendo")
+            return False
+        if _es_foto_dimension(df, tabla):
+            return guardar_dimension(self, df, tabla)
+        particiones = 0
+        try:
+            claves = claves_de(tabla, df, fecha_columna, ticker_columna)
+            fecha_columna = claves[-1] if len(claves) > 1 else None
+            columna_mercado = "mercado" if "mercado" in df.columns and "market" not in df.columns else "market"
+            df = tipos_de_escritura(df)
+
+            grupos = [columna_mercado, ticker_columna]
+            if fecha_columna:
+                df["_anio"] = pd.to_datetime(df[fecha_columna]).dt.year
+                grupos.append("_anio")
+
+            with METRICAS.medir("carga_tabla", tabla=tabla, modo="parquet"):
+                for valores, grupo in df.groupby(grupos, sort=False, observed=True):
+                    mercado, ticker = valores[0], valores[1]
+                    anio = valores[2] if fecha_columna else None
+                    grupo = grupo.drop(columns="_anio", errors="ignore")
+                    directorio = self._directorio(tabla, mercado, ticker, anio)
+                    archivo = os.path.join(directorio, "part-0.parquet")
+                    if fecha_columna and os.path.exists(archivo):
+                        # Upsert dentro de la partición: las filas nuevas reemplazan a las de igual clave
+                        existente = pd.read_parquet(archivo)
+                        grupo = (pd.concat([existente, grupo], ignore_index=True)
+                                 .drop_duplicates(subset=claves, keep="last")
+                                 .sort_values(fecha_columna, kind="stable"))
+                    self._escribir(grupo, directorio)
+                    particiones += 1
+            METRICAS.incrementar("filas_insertadas", len(df), tabla=tabla)
+            print(f"✓ Tabla '{tabla}' guardada en Parquet: {len(df)} filas en {particiones} particiones")
+            return True
+        except Exception as e:
+            print(f"❌ Error guardando {tabla} en Parquet: {e}")
+            return False
+        finally:
+            # También si falló a medias: las particiones ya escritas cambiaron la tabla
+            if particiones:
+                self._anotar_escritura(tabla)
+
+    def reemplazar(self, df, tabla, fecha_columna=None, ticker_columna="ticker"):
+        # guardar ya reemplaza por clave
+        return self.guardar(df, tabla, fecha_columna, ticker_columna)
+
+    def _archivos(self, tabla, tickers=None, mercados=None, desde=None, hasta=None):
+        """Archivos de las particiones que pueden contener filas del filtro"""
+        tickers = {self._valor_particion(t) for t in tickers} if tickers is not None else None
+        mercados = {self._valor_particion(m) for m in mercados} if mercados is not None else None
+        archivos = []
+        for archivo in glob.glob(os.path.join(self.ruta, tabla, "market=*", "ticker=*", "**", "*.parquet"),
+                                 recursive=True):
+            partes = dict(parte.split("=", 1) for parte in archivo[len(self.ruta):].split(os.sep) if "=" in parte)
+            if mercados is not None and partes["market"] not in mercados:
+                continue
+            if tickers is not None and partes["ticker"] not in tickers:
+                continue
+            if "year" in partes:
+                anio = int(partes["year"])
+                if desde is not None and anio < desde.year:
+                    continue
+                if hasta is not None and anio > hasta.year:
+                    continue
+            archivos.append(archivo)
+        return sorted(archivos)
+
+    def leer(self, tabla, tickers=None, mercados=None, desde=None, hasta=None, actuales=False):
+        archivos = self._archivos(tabla, tickers, mercados, desde, hasta)
+        if not archivos:
+            return pd.DataFrame()
+        df = pd.concat([pd.read_parquet(archivo) for archivo in archivos], ignore_index=True)
+        return _filtrar(df, tickers, mercados, desde, hasta, columna_fecha(tabla), actuales)
+
+    def ultimas_fechas(self, tabla="mercado_diario", columna_fecha="date"):
+        # Solo hace falta la partición del año más reciente de cada ticker
+        recientes = {}
+        for archivo in self._archivos(tabla):
+            directorio = os.path.dirname(archivo)
+            ticker_dir = os.path.dirname(directorio)
+            anio = int(os.path.basename(directorio).split("=", 1)[1])
+            if anio >= recientes.get(ticker_dir, (0, None))[0]:
+                recientes[ticker_dir] = (anio, archivo)
+        ultimas = {}
+        for _, archivo in recientes.values():
+            df = pd.read_parquet(archivo, columns=["ticker", columna_fecha])
+            if not df.empty:
+                ultimas[df["ticker"].iloc[0]] = pd.Timestamp(df[columna_fecha].max()).date()
+        return ultimas
+
+    def tickers(self, tabla):
+        # Basta con los nombres de las particiones, sin abrir ningún archivo
+        return sorted({os.path.basename(directorio).split("=", 1)[1]
+                       for directorio in glob.glob(os.path.join(self.ruta, tabla, "market=*", "ticker=*"))})
+
+    def eliminar(self, tabla):
+        shutil.rmtree(os.path.join(self.ruta, tabla), ignore_errors=True)
+        self._anotar_escritura(tabla)
+
+    def renombrar(self, tabla, nuevo_nombre):
+        destino = os.path.join(self.ruta, nuevo_nombre)
+        shutil.rmtree(destino, ignore_errors=True)
+        os.replace(os.path.join(self.ruta, tabla), destino)
+        self._anotar_escritura(tabla)
+        self._anotar_escritura(nuevo_nombre)
+
+    def columnas(self, tabla):
+        archivos = self._archivos(tabla)
+        if not archivos:
+            return []
+        import pyarrow.parquet as pq
+        return pq.read_schema(archivos[0]).names
+
+    def version(self, tabla):
+        try:
+            with open(self._archivo_version(tabla)) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def cerrar(self):
+        pass
+
+
+class AlmacenamientoDuckDB:
+    """Destino DuckDB en un archivo local: columnar, comprimido y consultable con SQL"""
+
+    nombre = "duckdb"
+
+    def __init__(self, ruta=RUTA_DUCKDB):
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("El destino DuckDB necesita duckdb: pip install duckdb")
+        self.ruta = ruta
+        self.conn = duckdb.connect(ruta)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {TABLA_VERSIONES} "
+                          "(tabla VARCHAR PRIMARY KEY, version BIGINT NOT NULL)")
+
+    @staticmethod
+    def _q(nombre):
+        return '"' + nombre.replace('"', '""') + '"'
+
+    def _existe(self, tabla):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [tabla]
+        ).fetchone()[0] > 0
+
+    def guardar(self, df, tabla, fecha_columna=None, ticker_columna="ticker"):
+        if df.empty:
+            print(f"⚠️  DataFrame vacío para {tabla}, omitiendo")
+            return False
+        if _es_foto_dimension(df, tabla):
+            return guardar_dimension(self, df, tabla)
+        try:
+            claves = claves_de(tabla, df, fecha_columna, ticker_columna)
+            nuevos = tipos_de_escritura(df)
+            self.conn.register("_nuevos", nuevos)
+            q = self._q
+            self.conn.execute("BEGIN TRANSACTION")
+            inicio = time.perf_counter()
+            try:
+                if not self._existe(tabla):
+                    self.conn.execute(f"CREATE TABLE {q(tabla)} AS SELECT * FROM _nuevos LIMIT 0")
+                    if tabla in TABLAS_DIMENSION:
+                        self.conn.execute(f"CREATE OR REPLACE VIEW {q(tabla + '_actual')} AS "
+                                          f"SELECT * FROM {q(tabla)} WHERE {q(VIGENTE)}")
+                # Reemplazo por clave: se borran las filas que llegan de nuevo y se insertan todas
+                coincidencia = " AND ".join(f"t.{q(c)} = n.{q(c)}" for c in claves)
+                self.conn.execute(
+                    f"DELETE FROM {q(tabla)} t WHERE EXISTS (SELECT 1 FROM _nuevos n WHERE {coincidencia})"
+                )
+                columnas = ", ".join(q(c) for c in nuevos.columns)
+                orden = ", ".join(q(c) for c in claves)
+                self.conn.execute(
+                    f"INSERT INTO {q(tabla)} ({columnas}) SELECT {columnas} FROM _nuevos ORDER BY {orden}"
+                )
+                self._anotar_escritura(tabla)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            finally:
+                self.conn.unregister("_nuevos")
+                METRICAS.registrar_tramo("carga_tabla", time.perf_counter() - inicio, tabla=tabla, modo="duckdb")
+            METRICAS.incrementar("filas_insertadas", len(df), tabla=tabla)
+            print(f"✓ Tabla '{tabla}' guardada en DuckDB: {len(df)} filas")
+            return True
+        except Exception as e:
+            print(f"❌ Error guardando {tabla} en DuckDB: {e}")
+            return False
+
+    def reemplazar(self, df, tabla, fecha_columna=None, ticker_columna="ticker"):
+        # guardar ya reemplaza por clave
+        return self.guardar(df, tabla, fecha_columna, ticker_columna)
+
+    def leer(self, tabla, tickers=None, mercados=None, desde=None, hasta=None, actuales=False):
+        if not self._existe(tabla):
+            return pd.DataFrame()
+        q = self._q
+        fecha_columna = columna_fecha(tabla)
+        condiciones, parametros = [], []
+        if actuales:
+            condiciones.append(q(VIGENTE))
+        if tickers is not None:
+            condiciones.append(f"{q('ticker')} IN (SELECT UNNEST(?))")
+            parametros.append(list(tickers))
+        if mercados is not None:
+            columna_mercado = "mercado" if tabla == "recomendaciones" else "market"
+            condiciones.append(f"{q(columna_mercado)} IN (SELECT UNNEST(?))")
+            parametros.append(list(mercados))
+        if fecha_columna and desde is not None:
+            condiciones.append(f"{q(fecha_columna)} >= ?")
+            parametros.append(desde)
+        if fecha_columna and hasta is not None:
+            condiciones.append(f"{q(fecha_columna)} <= ?")
+            parametros.append(hasta)
+        consulta = f"SELECT * FROM {q(tabla)}" + (f" WHERE {' AND '.join(condiciones)}" if condiciones else "")
+        df = self.conn.execute(consulta, parametros).df()
+        if fecha_columna in df.columns and pd.api.types.is_datetime64_any_dtype(df[fecha_columna]):
+            # Mismas fechas (datetime.date) que devuelven los demás destinos
+            df[fecha_columna] = df[fecha_columna].dt.date
+        return df
+
+    def ultimas_fechas(self, tabla="mercado_diario", columna_fecha="date"):
+        if not self._existe(tabla):
+            return {}
+        filas = self.conn.execute(
+            f"SELECT ticker, MAX({self._q(columna_fecha)}) FROM {self._q(tabla)} GROUP BY ticker"
+        ).fetchall()
+        return {ticker: pd.Timestamp(fecha).date() for ticker, fecha in filas if fecha is not None}
+
+    def tickers(self, tabla):
+        if not self._existe(tabla):
+            return []
+        return [fila[0] for fila in self.conn.execute(f"SELECT DISTINCT ticker FROM {self._q(tabla)}").fetchall()]
+
+    def _anotar_escritura(self, tabla):
+        """Sube la versión de la tabla (dentro de la transacción de la escritura, si la hay)"""
+        self.conn.execute(f"INSERT INTO {TABLA_VERSIONES} VALUES (?, 1) "
+                          "ON CONFLICT (tabla) DO UPDATE SET version = version + 1", [tabla])
+
+    def eliminar(self, tabla):
+        self.conn.execute(f"DROP VIEW IF EXISTS {self._q(tabla + '_actual')}")
+        self.conn.execute(f"DROP TABLE IF EXISTS {self._q(tabla)}")
+        self._anotar_escritura(tabla)
+
+    def renombrar(self, tabla, nuevo_nombre):
+        self.eliminar(nuevo_nombre)
+        self.conn.execute(f"DROP VIEW IF EXISTS {self._q(tabla + '_actual')}")
+        self.conn.execute(f"ALTER TABLE {self._q(tabla)} RENAME TO {self._q(nuevo_nombre)}")
+        self._anotar_escritura(tabla)
+        self._anotar_escritura(nuevo_nombre)
+
+    def columnas(self, tabla):
+        filas = self.conn.execute("SELECT column_name FROM information_schema.columns WHERE table_name = ? "
+                                  "ORDER BY ordinal_position", [tabla]).fetchall()
+        return [fila[0] for fila in filas]
+
+    def version(self, tabla):
+        fila = self.conn.execute(f"SELECT version FROM {TABLA_VERSIONES} WHERE tabla = ?", [tabla]).fetchone()
+        return fila[0] if fila else 0
+
+    def cerrar(self):
+        self.conn.close()
+
+
+def migrar_recomendaciones(destino):
+    """Aparta las recomendaciones guardadas sin clave (una copia añadida en cada carga).
+
+    La tabla anterior se renombra a recomendaciones_sin_clave, sin borrar
+    ninguna fila, y `recomendaciones` vuelve a empezar con clave (ticker,
+    period, snapshot date): las filas antiguas no dicen de qué día eran.
+    Devuelve False si la tabla no necesitaba migrarse.
+    """
+    columnas = destino.columnas("recomendaciones")
+    if not columnas or FECHA_FOTO in columnas:
+        return False
+    if destino.columnas(TABLA_RECOMENDACIONES_SIN_CLAVE):
+        print(f"⚠️  recomendaciones no tiene '{FECHA_FOTO}' y ya existe {TABLA_RECOMENDACIONES_SIN_CLAVE}: "
+              "muévala o bórrela para migrar la tabla")
+        return False
+    destino.renombrar("recomendaciones", TABLA_RECOMENDACIONES_SIN_CLAVE)
+    # En MySQL vuelve a crear la tabla vacía con su esquema explícito
+    destino.eliminar("recomendaciones")
+    print(f"🧬 recomendaciones sin '{FECHA_FOTO}' apartadas en {TABLA_RECOMENDACIONES_SIN_CLAVE}: "
+          f"se guardan de nuevo con clave (ticker, period, {FECHA_FOTO})")
+    return True
+
+def crear_almacenamiento(destino, engine=None, ruta=None, **opciones):
+    """Crea el destino de carga: 'mysql' (necesita `engine`), 'parquet' o 'duckdb'"""
+    if destino == "mysql":
+        return AlmacenamientoSQL(engine, **opciones)
+    if destino == "parquet":
+        return AlmacenamientoParquet(ruta or RUTA_PARQUET)
+    if destino == "duckdb":
+        return AlmacenamientoDuckDB(ruta or RUTA_DUCKDB)
+    raise ValueError(f"Destino de carga desconocido: {destino}")
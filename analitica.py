@@ -0,0 +1,235 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from ajustes import TABLA_AJUSTADA, actualizar_ajustes
+from metricas import METRICAS
+from transformacion import aplicar_tipos
+
+# Tablas derivadas de la serie ajustada (mercado_ajustado)
+TABLA_RENDIMIENTOS = "rendimientos_diarios"
+TABLA_CORRELACIONES = "correlaciones_mercados"
+TABLAS_ANALITICA = (TABLA_RENDIMIENTOS, TABLA_CORRELACIONES)
+
+# Ventanas, en sesiones, de las medias móviles y las volatilidades
+VENTANAS = (20, 50, 200)
+
+# Sesiones bursátiles por año, para anualizar la volatilidad
+SESIONES_POR_ANIO = 252
+
+# Ventana de la correlación entre mercados y sesiones comunes mínimas para calcularla
+VENTANA_CORRELACION = 60
+MIN_SESIONES_CORRELACION = 40
+
+# Pares de mercados que se correlacionan (ticker a ticker y sus promedios)
+PARES_MERCADOS = (("IBEX_35", "COLCAP"),)
+
+# =============================================================================
+# ANALÍTICA DERIVADA: RENDIMIENTOS, MEDIAS, VOLATILIDAD Y CORRELACIONES
+# =============================================================================
+# Las tablas se calculan a partir de la serie ajustada por splits y dividendos
+# (ajustes.py) ya guardada en el destino y se actualizan de forma incremental:
+# por ticker solo se escriben las fechas posteriores a la última calculada, y
+# solo se lee el tramo de histórico que necesitan sus ventanas. Un ticker cuya
+# serie ajustada se recalculó entera por un evento nuevo se recalcula entero.
+
+def dias_naturales(sesiones):
+    """Días naturales que cubren con holgura `sesiones` sesiones (fines de semana y festivos)"""
+    return int(sesiones * 7 / 5 * 1.1) + 10
+
+def _fechas(valores):
+    # Según el destino la fecha llega como date, datetime64 o texto (SQLite)
+    return pd.to_datetime(pd.Series(valores)).to_numpy()
+
+def calcular_rendimientos(precios, ventanas=VENTANAS):
+    """Rendimiento logarítmico diario, medias móviles y volatilidad anualizada por ticker.
+
+    Todo se calcula sobre columnas completas: el histórico se ordena por
+    ticker y fecha y cada ventana se aplica de una vez a toda la columna; las
+    filas cuya ventana alcanzaría al ticker anterior quedan como NA. Los
+    cierres nulos o a 0 (el valor de relleno de cargas antiguas) se descartan.
+    """
+    df = pd.DataFrame({
+        "ticker": precios["ticker"].astype(str).to_numpy(),
+        "market": precios["market"].astype(str).to_numpy(),
+        "date": _fechas(precios["date"]),
+        "closing price": pd.to_numeric(precios["closing price"], errors="coerce").astype("float64").to_numpy()
+    })
+    df = df[df["closing price"] > 0]
+    df = (df.sort_values(["ticker", "date"], kind="stable")
+          .drop_duplicates(["ticker", "date"], keep="last").reset_index(drop=True))
+
+    # Sesiones previas del mismo ticker en cada fila
+    posicion = df.groupby("ticker", sort=False).cumcount().to_numpy()
+    log_cierre = np.log(df["closing price"])
+    df["log return"] = log_cierre.diff().where(posicion >= 1)
+    for ventana in ventanas:
+        df[f"avg price {ventana} days"] = df["closing price"].rolling(ventana).mean().where(posicion >= ventana - 1)
+        volatilidad = df["log return"].rolling(ventana).std() * np.sqrt(SESIONES_POR_ANIO)
+        df[f"volatility {ventana} days"] = volatilidad.where(posicion >= ventana)
+    df["date"] = df["date"].dt.date
+    return aplicar_tipos(df, TABLA_RENDIMIENTOS)
+
+def calcular_correlaciones(rendimientos, ventana=VENTANA_CORRELACION, min_sesiones=MIN_SESIONES_CORRELACION,
+                           pares=PARES_MERCADOS):
+    """Correlación móvil de los rendimientos de cada ticker de un mercado con los del otro.
+
+    Solo se usan las sesiones en que abrieron los dos mercados. Cada mercado
+    añade una columna con su promedio equiponderado (ticker = nombre del
+    mercado), así que la fila ("IBEX_35", "COLCAP") es la correlación entre
+    mercados y las demás forman, fecha a fecha, la matriz ticker x ticker.
+    """
+    rendimientos = pd.DataFrame({
+        "ticker": rendimientos["ticker"].astype(str).to_numpy(),
+        "market": rendimientos["market"].astype(str).to_numpy(),
+        "date": _fechas(rendimientos["date"]),
+        "log return": pd.to_numeric(rendimientos["log return"], errors="coerce").astype("float64").to_numpy()
+    })
+    tablas = []
+    for mercado_a, mercado_b in pares:
+        anchos = {}
+        for mercado in (mercado_a, mercado_b):
+            del_mercado = rendimientos[rendimientos["market"] == mercado]
+            ancho = (del_mercado.drop_duplicates(["ticker", "date"], keep="last")
+                     .pivot(index="date", columns="ticker", values="log return").dropna(how="all"))
+            ancho[mercado] = ancho.mean(axis=1)
+            anchos[mercado] = ancho
+        comunes = anchos[mercado_a].index.intersection(anchos[mercado_b].index)
+        if len(comunes) < min_sesiones:
+            continue
+        lado_a, lado_b = anchos[mercado_a].loc[comunes], anchos[mercado_b].loc[comunes]
+
+        # Una pasada por ticker del mercado b, vectorizada sobre todos los del mercado a
+        for ticker_b in lado_b.columns:
+            correlacion = lado_a.rolling(ventana, min_periods=min_sesiones).corr(lado_b[ticker_b])
+            largo = correlacion.melt(ignore_index=False, var_name="ticker", value_name="correlation")
+            largo = largo.dropna().reset_index()
+            largo["market"] = mercado_a
+            largo["ticker b"] = ticker_b
+            largo["market b"] = mercado_b
+            tablas.append(largo)
+
+    if not tablas:
+        return pd.DataFrame(columns=["ticker", "market", "ticker b", "market b", "date", "correlation"])
+    correlaciones = pd.concat(tablas, ignore_index=True)[["ticker", "market", "ticker b", "market b", "date",
+                                                          "correlation"]]
+    correlaciones["correlation"] = correlaciones["correlation"].clip(-1, 1)
+    correlaciones["date"] = correlaciones["date"].dt.date
+    return aplicar_tipos(correlaciones, TABLA_CORRELACIONES)
+
+# =============================================================================
+# ACTUALIZACIÓN INCREMENTAL EN EL DESTINO
+# =============================================================================
+
+def _posteriores(df, marcas):
+    """Filas posteriores a la última fecha ya calculada de su ticker"""
+    if not marcas:
+        return df
+    limite = df["ticker"].astype(str).map(marcas)
+    return df[limite.isna() | (pd.to_datetime(df["date"]) > pd.to_datetime(limite))]
+
+def _leer_desde_marcas(destino, tabla, marcas, margen):
+    """Lee de `tabla` el tramo de cada ticker desde su marca menos `margen` días.
+
+    Los tickers se agrupan por marca: un ticker atrasado no obliga a releer
+    el histórico largo de los demás.
+    """
+    grupos = {}
+    for ticker, fecha in marcas.items():
+        grupos.setdefault(fecha, []).append(ticker)
+    return [destino.leer(tabla, tickers=grupo, desde=fecha - timedelta(days=margen))
+            for fecha, grupo in sorted(grupos.items())]
+
+def actualizar_rendimientos(destino, tickers=None, completo=False, recalculados=()):
+    """Calcula y guarda rendimientos_diarios de los tickers con precios nuevos.
+
+    Devuelve (filas escritas, primera fecha escrita que no existía antes): a
+    partir de esa fecha hay que recalcular las correlaciones. Los tickers de
+    `recalculados` (su serie ajustada cambió entera) se recalculan con todo
+    su histórico.
+    """
+    previas = {} if completo else destino.ultimas_fechas(TABLA_RENDIMIENTOS, "date")
+    marcas = {t: fecha for t, fecha in previas.items() if t not in recalculados}
+    ultimos_precios = destino.ultimas_fechas(TABLA_AJUSTADA, "date")
+    if tickers is not None:
+        tickers = set(tickers)
+        ultimos_precios = {t: f for t, f in ultimos_precios.items() if t in tickers}
+    pendientes = [t for t, fecha in ultimos_precios.items() if t not in marcas or fecha > marcas[t]]
+    if not pendientes:
+        print(f"⏭️  {TABLA_RENDIMIENTOS} al día")
+        return 0, None
+
+    # Los tickers nuevos necesitan todo su histórico; el resto, sus ventanas antes de su última fecha calculada
+    nuevos = [t for t in pendientes if t not in marcas]
+    conocidos = {t: marcas[t] for t in pendientes if t in marcas}
+    lecturas = []
+    with METRICAS.medir("analitica_lectura", tabla=TABLA_RENDIMIENTOS):
+        if nuevos:
+            lecturas.append(destino.leer(TABLA_AJUSTADA, tickers=nuevos))
+        lecturas += _leer_desde_marcas(destino, TABLA_AJUSTADA, conocidos, dias_naturales(max(VENTANAS) + 1))
+    lecturas = [df for df in lecturas if not df.empty]
+    if not lecturas:
+        return 0, None
+    precios = pd.concat(lecturas, ignore_index=True)
+
+    with METRICAS.medir("analitica", tabla=TABLA_RENDIMIENTOS):
+        rendimientos = _posteriores(calcular_rendimientos(precios), marcas)
+    if rendimientos.empty:
+        return 0, None
+    print(f"📐 {TABLA_RENDIMIENTOS}: {len(rendimientos)} filas nuevas de {len(pendientes)} tickers")
+    if not destino.reemplazar(rendimientos, TABLA_RENDIMIENTOS, "date"):
+        return 0, None
+    # Las filas reescritas de un ticker recalculado no son nuevas: su cambio llega en la fecha de ajustes
+    nuevas = _posteriores(rendimientos, previas)
+    return len(rendimientos), (pd.to_datetime(nuevas["date"]).min().date() if not nuevas.empty else None)
+
+def actualizar_correlaciones(destino, completo=False, desde_cambio=None):
+    """Calcula y guarda las correlaciones de las fechas posteriores a la última calculada.
+
+    `desde_cambio` es la primera fecha cuyo rendimiento es nuevo o cambió
+    por un evento: las correlaciones desde esa fecha se recalculan y
+    reemplazan. Así una sesión cuyos rendimientos de uno de los mercados
+    llegan en una ejecución posterior se calcula cuando ya están los dos.
+    """
+    marcas = {} if completo else destino.ultimas_fechas(TABLA_CORRELACIONES, "date")
+    marca = max(marcas.values()) if marcas else None
+    if marca is not None and desde_cambio is not None:
+        marca = min(marca, desde_cambio - timedelta(days=1))
+    desde = marca - timedelta(days=dias_naturales(VENTANA_CORRELACION + 1)) if marca else None
+    with METRICAS.medir("analitica_lectura", tabla=TABLA_CORRELACIONES):
+        rendimientos = destino.leer(TABLA_RENDIMIENTOS, desde=desde)
+    if rendimientos.empty:
+        return 0
+
+    with METRICAS.medir("analitica", tabla=TABLA_CORRELACIONES):
+        correlaciones = calcular_correlaciones(rendimientos)
+        if marca is not None:
+            correlaciones = correlaciones[pd.to_datetime(correlaciones["date"]) > pd.Timestamp(marca)]
+    if correlaciones.empty:
+        print(f"⏭️  {TABLA_CORRELACIONES} al día")
+        return 0
+    print(f"📐 {TABLA_CORRELACIONES}: {len(correlaciones)} filas nuevas "
+          f"({correlaciones['date'].nunique()} sesiones)")
+    return len(correlaciones) if destino.reemplazar(correlaciones, TABLA_CORRELACIONES, "date") else 0
+
+def actualizar_analitica(destino, tickers=None, completo=False):
+    """Actualiza la serie ajustada y las tablas derivadas de ella; devuelve {tabla: filas escritas}.
+
+    Con `completo` se recalcula todo el histórico en lugar de continuar desde
+    la última fecha calculada (p. ej. tras cargar histórico antiguo o
+    corregir precios ya guardados).
+    """
+    print("\n📐 Actualizando analítica derivada...")
+    try:
+        recalculados = actualizar_ajustes(destino, tickers, completo)
+        cambios = [fecha for fecha in recalculados.values() if fecha is not None]
+        filas_rendimientos, primera_nueva = actualizar_rendimientos(destino, tickers, completo, recalculados)
+        if primera_nueva is not None:
+            cambios.append(primera_nueva)
+        filas = {TABLA_RENDIMIENTOS: filas_rendimientos}
+        filas[TABLA_CORRELACIONES] = actualizar_correlaciones(destino, completo, min(cambios) if cambios else None)
+        return filas
+    except Exception as e:
+        print(f"❌ Error actualizando la analítica: {e}")
+        return {}
@@ -0,0 +1,802 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from sqlalchemy import create_engine, inspect, text
+
+from almacenamiento import DESTINOS, AlmacenamientoSQL, crear_almacenamiento
+from analitica import actualizar_analitica
+from carga import (ESTRATEGIAS_CARGA, cargar_filas, columna_fecha, crear_tabla_vacia, filtrar_datos_nuevos,
+                   obtener_fechas_existentes)
+from extraccion import ContadorLlamadas, LimitadorTasa, extraer_datos_acciones
+from extraccion_async import MAX_CONCURRENCIA, extraer_datos_acciones_async
+from lectura import LectorDatos
+from metricas import METRICAS
+from resiliencia import ESPERA_BASE, PoliticaReintentos
+from transformacion import CONSTRUCTORES, construir_mercado_diario, construir_tablas, memoria_tablas, tipos_de_escritura
+
+# =============================================================================
+# BENCHMARKS DEL ETL CON DATOS SINTÉTICOS (SIN RED NI MYSQL)
+# =============================================================================
+
+# Tickers actuales (IBEX_35 + COLCAP) y ~10 años de sesiones bursátiles
+TICKERS_ACTUALES = 68
+DIAS_HISTORICO = 2520
+
+def generar_historial(dias=DIAS_HISTORICO, zona="Europe/Madrid", semilla=0):
+    """Genera un histórico OHLCV con la misma forma que `Ticker.history`"""
+    rng = np.random.default_rng(semilla)
+    fechas = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=dias, tz=zona, name="Date")
+    cierre = 20 * np.exp(np.cumsum(rng.normal(0, 0.015, dias)))
+    apertura = cierre * (1 + rng.normal(0, 0.005, dias))
+    historial = pd.DataFrame({
+        "Open": apertura,
+        "High": np.maximum(apertura, cierre) * (1 + rng.uniform(0, 0.01, dias)),
+        "Low": np.minimum(apertura, cierre) * (1 - rng.uniform(0, 0.01, dias)),
+        "Close": cierre,
+        "Volume": rng.integers(1_000, 5_000_000, dias).astype(float),
+        "Dividends": 0.0,
+        "Stock Splits": 0.0
+    }, index=fechas)
+    # Algunos huecos para ejercitar el relleno de nulos
+    historial.iloc[rng.integers(0, dias, max(1, dias // 500)), :4] = np.nan
+    return historial
+
+def generar_datos_acciones(n_tickers=TICKERS_ACTUALES, dias=DIAS_HISTORICO):
+    """Genera un paquete {ticker: datos} como el de `extraer_datos_acciones`"""
+    datos_acciones = {}
+    for i in range(n_tickers):
+        mercado, zona, sufijo = (("IBEX_35", "Europe/Madrid", "MC") if i % 2 == 0
+                                 else ("COLCAP", "America/Bogota", "CL"))
+        ticker = f"SIM{i:04d}.{sufijo}"
+        datos_acciones[ticker] = {
+            "ticker": ticker,
+            "mercado": mercado,
+            "historial": generar_historial(dias, zona, semilla=i)
+        }
+    return datos_acciones
+
+# =============================================================================
+# PROVEEDOR SINTÉTICO (MISMA INTERFAZ QUE yf.Ticker)
+# =============================================================================
+
+class ErrorSintetico(RuntimeError):
+    """Fallo pasajero inyectado por el proveedor sintético"""
+
+
+class ErrorLimiteSintetico(ErrorSintetico):
+    """Respuesta 429 inyectada: el proveedor pide bajar el ritmo"""
+    status = 429
+
+
+class TickerSintetico:
+    """Ticker falso con la superficie de `yf.Ticker` que usa el ETL, datos deterministas por ticker"""
+
+    def __init__(self, ticker, proveedor):
+        self.ticker = ticker
+        self._proveedor = proveedor
+        self._semilla = sum(ord(c) for c in ticker)
+        self._zona = "America/Bogota" if ticker.endswith(".CL") else "Europe/Madrid"
+
+    def _historial_completo(self):
+        return generar_historial(self._proveedor.dias, self._zona, self._semilla)
+
+    def get_info(self):
+        self._proveedor.llamada(self.ticker, "info")
+        return self._info()
+
+    def _info(self):
+        rng = np.random.default_rng(self._semilla)
+        return {
+            "longName": f"{self.ticker} S.A.", "shortName": self.ticker.split(".")[0],
+            "longBusinessSummary": "Empresa sintética para benchmarks. " * 20,
+            "website": f"https://{self.ticker.lower()}.example", "phone": "+34 900 000 000",
+            "address1": "Calle Falsa 123", "city": "Madrid", "zip": "28001", "country": "Spain",
+            "industry": "Banks", "sector": "Financial Services", "quoteType": "EQUITY",
+            "currency": "COP" if self.ticker.endswith(".CL") else "EUR", "language": "es-ES", "region": "ES",
+            "marketCap": int(rng.integers(10**8, 10**11)), "fiftyDayAverage": float(rng.uniform(5, 50)),
+            "twoHundredDayAverage": float(rng.uniform(5, 50)), "fiftyTwoWeekChangePercent": float(rng.normal(0, 20)),
+            "totalCash": int(rng.integers(10**6, 10**10)), "totalDebt": int(rng.integers(10**6, 10**10)),
+            "totalRevenue": int(rng.integers(10**7, 10**11)), "profitMargins": float(rng.uniform(-0.1, 0.4)),
+            "grossProfits": int(rng.integers(10**6, 10**10)), "freeCashflow": int(rng.integers(-10**9, 10**10)),
+            "operatingCashflow": int(rng.integers(10**6, 10**10)), "revenueGrowth": float(rng.normal(0.05, 0.1)),
+            "ebitda": int(rng.integers(10**6, 10**10)), "netIncomeToCommon": int(rng.integers(-10**8, 10**9)),
+            "financialCurrency": "EUR", "priceToSalesTrailing12Months": float(rng.uniform(0.5, 5)),
+            "enterpriseToRevenue": float(rng.uniform(0.5, 6)), "enterpriseToEbitda": float(rng.uniform(3, 20)),
+            "trailingPE": float(rng.uniform(5, 40)), "forwardPE": float(rng.uniform(5, 40)),
+            "priceToBook": float(rng.uniform(0.5, 5)), "debtToEquity": float(rng.uniform(0, 300)),
+            "returnOnAssets": float(rng.uniform(-0.05, 0.2)), "returnOnEquity": float(rng.uniform(-0.1, 0.4)),
+            "epsTrailingTwelveMonths": float(rng.uniform(-1, 5)), "epsForward": float(rng.uniform(-1, 5)),
+            "recommendationMean": float(rng.uniform(1, 5)), "numberOfAnalystOpinions": int(rng.integers(0, 30)),
+            "targetMeanPrice": float(rng.uniform(5, 60))
+        }
+
+    def history(self, period=None, start=None, **kwargs):
+        self._proveedor.llamada(self.ticker, "history")
+        historial = self._historial_completo()
+        # Como en Yahoo, los eventos también vienen en las columnas del histórico
+        historial["Dividends"] = self._dividendos(historial).reindex(historial.index, fill_value=0.0)
+        historial["Stock Splits"] = self._splits(historial).reindex(historial.index, fill_value=0.0)
+        if start is not None:
+            fechas = historial.index.tz_localize(None).normalize()
+            historial = historial[fechas >= pd.Timestamp(start)]
+        return historial
+
+    @property
+    def dividends(self):
+        self._proveedor.llamada(self.ticker, "dividends")
+        return self._dividendos()
+
+    def _dividendos(self, historial=None):
+        historial = self._historial_completo() if historial is None else historial
+        # Un dividendo por trimestre
+        eventos = historial.index[::63]
+        return pd.Series(np.round(np.random.default_rng(self._semilla).uniform(0.1, 1.0, len(eventos)), 4),
+                         index=eventos, name="Dividends")
+
+    @property
+    def splits(self):
+        self._proveedor.llamada(self.ticker, "splits")
+        return self._splits()
+
+    def _splits(self, historial=None):
+        historial = self._historial_completo() if historial is None else historial
+        # Un split en uno de cada cinco tickers
+        if self._semilla % 5:
+            return pd.Series(dtype=float, name="Stock Splits")
+        return pd.Series([2.0], index=historial.index[len(historial) // 2:len(historial) // 2 + 1],
+                         name="Stock Splits")
+
+    @property
+    def recommendations(self):
+        self._proveedor.llamada(self.ticker, "recommendations")
+        return self._recomendaciones()
+
+    def _recomendaciones(self):
+        rng = np.random.default_rng(self._semilla)
+        return pd.DataFrame({
+            "period": ["0m", "-1m", "-2m", "-3m"],
+            **{columna: rng.integers(0, 10, 4) for columna in ("strongBuy", "buy", "hold", "sell", "strongSell")}
+        })
+
+
+class ProveedorSintetico:
+    """Fábrica de tickers sintéticos con latencia y fallos inyectables.
+
+    `tasa_errores` es la probabilidad de un fallo pasajero por llamada y
+    `tasa_limite` la de una respuesta 429; los `endpoints_caidos` fallan
+    siempre. Se usa como `proveedor` de `extraer_datos_acciones` y, con
+    `descargar`, como `descargador` del backend de histórico por lotes.
+    """
+
+    def __init__(self, dias=DIAS_HISTORICO, latencia=0.0, tasa_errores=0.0, semilla=0, tasa_limite=0.0,
+                 endpoints_caidos=()):
+        self.dias = dias
+        self.latencia = latencia
+        self.tasa_errores = tasa_errores
+        self.tasa_limite = tasa_limite
+        self.endpoints_caidos = set(endpoints_caidos)
+        self.llamadas = 0
+        self.errores = 0
+        self._rng = np.random.default_rng(semilla)
+        self._lock = threading.Lock()
+
+    def llamada(self, ticker, endpoint):
+        """Simula la espera de red y, con las probabilidades configuradas, un fallo"""
+        with self._lock:
+            self.llamadas += 1
+            sorteo = self._rng.random()
+            limitada = sorteo < self.tasa_limite
+            falla = endpoint in self.endpoints_caidos or sorteo < self.tasa_limite + self.tasa_errores
+            if falla:
+                self.errores += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+        if limitada:
+            raise ErrorLimiteSintetico(f"Too Many Requests en {endpoint} de {ticker}")
+        if falla:
+            raise ErrorSintetico(f"Error inyectado en {endpoint} de {ticker}")
+
+    def __call__(self, ticker):
+        return TickerSintetico(ticker, self)
+
+    def descargar(self, tickers, start=None, **kwargs):
+        """Equivalente a `yf.download(group_by="ticker")` para varios tickers"""
+        self.llamada(",".join(tickers), "download")
+        historiales = {}
+        for ticker in tickers:
+            historial = TickerSintetico(ticker, self)._historial_completo()
+            if start is not None:
+                historial = historial[historial.index.tz_localize(None).normalize() >= pd.Timestamp(start)]
+            historiales[ticker] = historial.tz_convert("UTC")
+        return pd.concat(historiales, axis=1)
+
+def generar_lista_acciones(n_tickers=TICKERS_ACTUALES):
+    """Lista de tickers sintéticos alternando IBEX_35 y COLCAP, como `lista_acciones`"""
+    return [{"ticker": f"SIM{i:04d}.{'MC' if i % 2 == 0 else 'CL'}", "mercado": "IBEX_35" if i % 2 == 0 else "COLCAP"}
+            for i in range(n_tickers)]
+
+def _mercado_diario_iterrows(datos_acciones):
+    """Constructor fila a fila original de TABLA 2, como referencia"""
+    mercado_data = []
+    for ticker, datos in datos_acciones.items():
+        historial = datos["historial"]
+        if not historial.empty:
+            historial = historial.reset_index()
+            for _, row in historial.iterrows():
+                mercado_data.append({
+                    "ticker": ticker,
+                    "market": datos["mercado"],
+                    "date": row["Date"].date() if pd.notna(row["Date"]) else None,
+                    "open price": round(row["Open"], 2) if pd.notna(row["Open"]) else 0.00,
+                    "high price": round(row["High"], 2) if pd.notna(row["High"]) else 0.00,
+                    "low price": round(row["Low"], 2) if pd.notna(row["Low"]) else 0.00,
+                    "closing price": round(row["Close"], 2) if pd.notna(row["Close"]) else 0.00,
+                    "volume": int(row["Volume"]) if pd.notna(row["Volume"]) else 0
+                })
+    return pd.DataFrame(mercado_data)
+
+def medir(funcion, *args, repeticiones=1):
+    """Devuelve (mejor tiempo en segundos, resultado de la última ejecución)"""
+    mejor = float("inf")
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+def benchmark_mercado_diario(factor=10, dias=DIAS_HISTORICO, repeticiones=1):
+    """Compara el constructor columnar de mercado_diario con el original fila a fila"""
+    n_tickers = TICKERS_ACTUALES * factor
+    print(f"⏱️  mercado_diario: {n_tickers} tickers x {dias} días")
+    datos_acciones = generar_datos_acciones(n_tickers, dias)
+
+    t_iterrows, referencia = medir(_mercado_diario_iterrows, datos_acciones, repeticiones=repeticiones)
+    t_columnar, resultado = medir(construir_mercado_diario, datos_acciones, repeticiones=repeticiones)
+
+    # Misma salida salvo los tipos compactos y los NA, que el original rellenaba con 0
+    pd.testing.assert_frame_equal(referencia, tipos_de_escritura(resultado).fillna(0), check_dtype=False)
+    filas = len(resultado)
+    print(f"• iterrows: {t_iterrows:8.2f} s ({filas / t_iterrows:12,.0f} filas/s)")
+    print(f"• columnar: {t_columnar:8.2f} s ({filas / t_columnar:12,.0f} filas/s)")
+    print(f"✅ Misma salida ({filas} filas), aceleración x{t_iterrows / t_columnar:.1f}")
+    return {"filas": filas, "iterrows": t_iterrows, "columnar": t_columnar}
+
+def benchmark_carga(n_tickers=TICKERS_ACTUALES, dias=DIAS_HISTORICO, url=None, estrategias=ESTRATEGIAS_CARGA):
+    """Mide filas/s de cada estrategia de carga de mercado_diario contra una base local.
+
+    Sin `url` se usa un archivo SQLite temporal; con una URL de MySQL se
+    prueba también LOAD DATA LOCAL INFILE.
+    """
+    archivo = None
+    if url is None:
+        archivo = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False).name
+        url = f"sqlite:///{archivo}"
+    connect_args = {"local_infile": True} if url.startswith("mysql") else {}
+    engine = create_engine(url, connect_args=connect_args)
+    mercado_diario = construir_mercado_diario(generar_datos_acciones(n_tickers, dias))
+    tabla = "_benchmark_mercado_diario"
+    print(f"⏱️  Carga de mercado_diario: {len(mercado_diario)} filas en {engine.dialect.name}")
+
+    resultados = {}
+    try:
+        # Referencia: el to_sql(method='multi', chunksize=1000) anterior
+        with engine.begin() as conn:
+            if inspect(conn).has_table(tabla):
+                conn.execute(text(f"DROP TABLE {tabla}"))
+        inicio = time.perf_counter()
+        with engine.begin() as conn:
+            mercado_diario.to_sql(tabla, conn, index=False, method="multi", chunksize=1000)
+        segundos = time.perf_counter() - inicio
+        resultados["to_sql"] = len(mercado_diario) / segundos
+        print(f"• {'to_sql':12s}: {segundos:8.2f} s ({resultados['to_sql']:12,.0f} filas/s)")
+
+        for estrategia in estrategias:
+            if estrategia == "load_data" and engine.dialect.name != "mysql":
+                print("• load_data: omitida (solo MySQL)")
+                continue
+            with engine.begin() as conn:
+                if inspect(conn).has_table(tabla):
+                    conn.execute(text(f"DROP TABLE {tabla}"))
+                crear_tabla_vacia(conn, mercado_diario, tabla)
+            inicio = time.perf_counter()
+            with engine.begin() as conn:
+                filas = cargar_filas(conn, mercado_diario, tabla, estrategia)
+            segundos = time.perf_counter() - inicio
+            resultados[estrategia] = filas / segundos
+            print(f"• {estrategia:12s}: {segundos:8.2f} s ({filas / segundos:12,.0f} filas/s)")
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {tabla}"))
+        engine.dispose()
+        if archivo:
+            os.remove(archivo)
+    return resultados
+
+def _sin_compactar(df):
+    """La tabla con los tipos de antes de la política: cadenas en object, precios en float64"""
+    df = tipos_de_escritura(df)
+    for columna in df.columns:
+        tipo = df[columna].dtype
+        if isinstance(tipo, pd.StringDtype):
+            df[columna] = df[columna].astype(object)
+        elif isinstance(tipo, pd.api.extensions.ExtensionDtype) and tipo.kind in "iuf":
+            df[columna] = df[columna].astype("float64" if tipo.kind == "f" or df[columna].isna().any() else "int64")
+    return df
+
+def benchmark_memoria(n_tickers=TICKERS_ACTUALES, dias=DIAS_HISTORICO):
+    """Memoria de cada tabla con la política de tipos frente a los tipos de antes (object y float64)"""
+    print(f"🧠 Memoria de las tablas: {n_tickers} tickers x {dias} días")
+    datos_acciones = extraer_datos_acciones(generar_lista_acciones(n_tickers), max_workers=4,
+                                            proveedor=ProveedorSintetico(dias), limitador=LimitadorTasa(1000.0))
+    tablas = construir_tablas(datos_acciones)
+    antes = memoria_tablas({nombre: _sin_compactar(df) for nombre, df in tablas.items()})
+    despues = memoria_tablas(tablas)
+    print(f"\n{'tabla':24s} {'filas':>10s} {'antes MiB':>10s} {'ahora MiB':>10s} {'factor':>7s}")
+    for nombre, df in tablas.items():
+        factor = antes[nombre] / despues[nombre] if despues[nombre] else 1.0
+        print(f"{nombre:24s} {len(df):10,d} {antes[nombre] / 2 ** 20:10.2f} {despues[nombre] / 2 ** 20:10.2f} "
+              f"{factor:6.1f}x")
+    total_antes, total_despues = sum(antes.values()), sum(despues.values())
+    print(f"{'total':24s} {'':10s} {total_antes / 2 ** 20:10.2f} {total_despues / 2 ** 20:10.2f} "
+          f"{total_antes / total_despues:6.1f}x")
+    return antes, despues
+
+def benchmark_analitica(n_tickers=TICKERS_ACTUALES, dias=DIAS_HISTORICO, nuevas=1, destino="duckdb"):
+    """Cálculo completo de las tablas derivadas frente a la actualización con `nuevas` sesiones más"""
+    print(f"⏱️  Analítica derivada: {n_tickers} tickers x {dias} días en {destino}, {nuevas} sesiones nuevas")
+    mercado_diario = construir_mercado_diario(generar_datos_acciones(n_tickers, dias))
+    corte = sorted(mercado_diario["date"].unique())[-nuevas - 1]
+    directorio = tempfile.mkdtemp(prefix="benchmark_")
+    almacenamiento = crear_almacenamiento(
+        destino, ruta=os.path.join(directorio, "datos.duckdb" if destino == "duckdb" else "parquet"))
+    try:
+        almacenamiento.guardar(mercado_diario[mercado_diario["date"] <= corte], "mercado_diario", "date")
+        inicio = time.perf_counter()
+        filas_completo = sum(actualizar_analitica(almacenamiento).values())
+        t_completo = time.perf_counter() - inicio
+
+        almacenamiento.guardar(mercado_diario[mercado_diario["date"] > corte], "mercado_diario", "date")
+        inicio = time.perf_counter()
+        filas_incremental = sum(actualizar_analitica(almacenamiento).values())
+        t_incremental = time.perf_counter() - inicio
+    finally:
+        almacenamiento.cerrar()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print(f"\n• completo:    {t_completo:8.2f} s ({filas_completo:,} filas)")
+    print(f"• incremental: {t_incremental:8.2f} s ({filas_incremental:,} filas)")
+    return t_completo, t_incremental
+
+def benchmark_lectura(n_tickers=TICKERS_ACTUALES, dias=DIAS_HISTORICO, refrescos=10, destino="duckdb"):
+    """Refrescos de un panel (precios de un mercado en el último año): tabla entera vs filtrada vs caché"""
+    print(f"⏱️  Lectura: {n_tickers} tickers x {dias} días en {destino}, {refrescos} refrescos")
+    mercado_diario = construir_mercado_diario(generar_datos_acciones(n_tickers, dias))
+    hasta = pd.Timestamp(mercado_diario["date"].max())
+    desde = (hasta - pd.Timedelta(days=365)).date()
+    directorio = tempfile.mkdtemp(prefix="benchmark_")
+    almacenamiento = crear_almacenamiento(
+        destino, ruta=os.path.join(directorio, "datos.duckdb" if destino == "duckdb" else "parquet"))
+    try:
+        almacenamiento.guardar(mercado_diario, "mercado_diario", "date")
+        tiempos = {}
+
+        # Referencia: SELECT * de la tabla entera y el filtro en pandas, como en los cuadernos
+        inicio = time.perf_counter()
+        for _ in range(refrescos):
+            tabla = almacenamiento.leer("mercado_diario")
+            filas = len(tabla[(tabla["market"] == "COLCAP") & (pd.to_datetime(tabla["date"]) >= pd.Timestamp(desde))])
+        tiempos["tabla entera"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for _ in range(refrescos):
+            almacenamiento.leer("mercado_diario", mercados=["COLCAP"], desde=desde)
+        tiempos["filtrada en destino"] = time.perf_counter() - inicio
+
+        lector = LectorDatos(almacenamiento, cache_disco=os.path.join(directorio, "cache.sqlite"))
+        inicio = time.perf_counter()
+        for _ in range(refrescos):
+            lector.precios(mercados=["COLCAP"], desde=desde)
+        tiempos["caché en memoria"] = time.perf_counter() - inicio
+
+        # Otro proceso con la caché en disco ya llena
+        inicio = time.perf_counter()
+        for _ in range(refrescos):
+            LectorDatos(almacenamiento, cache_disco=lector.cache_disco).precios(mercados=["COLCAP"], desde=desde)
+        tiempos["caché en disco"] = time.perf_counter() - inicio
+    finally:
+        almacenamiento.cerrar()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print(f"\nFilas por refresco: {filas:,} de {len(mercado_diario):,}")
+    for nombre, segundos in tiempos.items():
+        print(f"• {nombre:<20} {segundos / refrescos * 1000:8.1f} ms por refresco")
+    return tiempos
+
+def pico_rss_mb():
+    """Memoria residente máxima del proceso hasta ahora, en MB"""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux la da en KB y macOS en bytes
+    return pico / 1024 ** 2 if sys.platform == "darwin" else pico / 1024
+
+def benchmark_etl(n_tickers=TICKERS_ACTUALES, dias=DIAS_HISTORICO, latencia=0.0, tasa_errores=0.0,
+                  hilos=4, llamadas_por_segundo=1000.0, url=None, destino="sqlite", ruta=None,
+                  backend_historial="por_ticker", tasa_limite=0.0, endpoints_caidos=(), espera_base=ESPERA_BASE):
+    """Ejecuta el ETL completo contra el proveedor sintético y mide cada etapa.
+
+    Por etapa informa tiempo, filas, filas/s y el pico de RSS del proceso al
+    terminarla (el pico es acumulado: solo crece). Sin `url` la carga va a un
+    SQLite temporal; `destino` puede ser también "parquet" o "duckdb".
+    `tasa_limite` y `endpoints_caidos` inyectan respuestas 429 y endpoints
+    caídos para ver los reintentos, el frenado del limitador y los circuitos.
+    """
+    proveedor = ProveedorSintetico(dias, latencia, tasa_errores, tasa_limite=tasa_limite,
+                                   endpoints_caidos=endpoints_caidos)
+    lista_acciones = generar_lista_acciones(n_tickers)
+    print(f"⏱️  ETL sintético: {n_tickers} tickers x {dias} días, latencia {latencia * 1000:.0f} ms, "
+          f"errores {tasa_errores:.1%}, {hilos} hilos")
+
+    temporales, directorios_temporales = [], []
+    if destino == "sqlite" or destino == "mysql":
+        if url is None:
+            temporales.append(tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False).name)
+            url = f"sqlite:///{temporales[-1]}"
+        almacenamiento = AlmacenamientoSQL(create_engine(url), modo="upsert")
+    else:
+        if ruta is None:
+            directorios_temporales.append(tempfile.mkdtemp(prefix="benchmark_"))
+            ruta = os.path.join(directorios_temporales[-1], "datos.duckdb" if destino == "duckdb" else "parquet")
+        almacenamiento = crear_almacenamiento(destino, ruta=ruta)
+
+    etapas = []
+
+    def registrar(etapa, segundos, filas):
+        etapas.append((etapa, segundos, filas, pico_rss_mb()))
+
+    try:
+        # Extracción (con la espera de red simulada)
+        inicio = time.perf_counter()
+        datos_acciones = extraer_datos_acciones(
+            lista_acciones, max_workers=hilos, proveedor=proveedor,
+            limitador=LimitadorTasa(llamadas_por_segundo) if hilos > 1 else None,
+            backend_historial=backend_historial, descargador=proveedor.descargar,
+            politica_reintentos=PoliticaReintentos(espera_base=espera_base)
+        )
+        registrar("extracción", time.perf_counter() - inicio, len(datos_acciones))
+
+        # TABLA 1-8
+        tablas = {}
+        for nombre, constructor in CONSTRUCTORES.items():
+            inicio = time.perf_counter()
+            tablas[nombre] = constructor(datos_acciones)
+            registrar(f"tabla {nombre}", time.perf_counter() - inicio, len(tablas[nombre]))
+
+        # Carga en el destino
+        for nombre, df in tablas.items():
+            inicio = time.perf_counter()
+            if not df.empty:
+                almacenamiento.guardar(df, nombre, columna_fecha(nombre))
+            registrar(f"carga {nombre}", time.perf_counter() - inicio, len(df))
+
+        # Deduplicación de una segunda pasada: todas las filas ya están guardadas
+        if isinstance(almacenamiento, AlmacenamientoSQL):
+            mercado_diario = tablas["mercado_diario"]
+            inicio = time.perf_counter()
+            existentes = obtener_fechas_existentes(almacenamiento.engine, "mercado_diario", "date")
+            nuevos = filtrar_datos_nuevos(mercado_diario, existentes, "date")
+            registrar("dedup mercado_diario", time.perf_counter() - inicio, len(mercado_diario))
+            assert nuevos.empty, "La segunda pasada no debería tener filas nuevas"
+    finally:
+        almacenamiento.cerrar()
+        for archivo in temporales:
+            os.remove(archivo)
+        for directorio in directorios_temporales:
+            shutil.rmtree(directorio)
+
+    print(f"\n{'etapa':32s} {'segundos':>9s} {'filas':>10s} {'filas/s':>12s} {'RSS pico':>10s}")
+    for etapa, segundos, filas, rss in etapas:
+        por_segundo = filas / segundos if segundos > 0 else float("inf")
+        print(f"{etapa:32s} {segundos:9.3f} {filas:10,d} {por_segundo:12,.0f} {rss:8.0f} MB")
+    total = sum(segundos for _, segundos, _, _ in etapas)
+    print(f"{'total':32s} {total:9.3f}")
+    print(f"📡 {proveedor.llamadas} llamadas al proveedor, {proveedor.errores} errores inyectados, "
+          f"{n_tickers - len(datos_acciones)} tickers sin datos")
+    print(f"🔁 {METRICAS.total('reintentos')} reintentos, {METRICAS.total('frenadas_limitador')} frenadas del "
+          f"limitador, {METRICAS.total('circuitos_abiertos')} aperturas de circuito, "
+          f"{sum(1 for datos in datos_acciones.values() if datos.get('errores'))} tickers con endpoints vacíos")
+    return etapas
+
+
+# =============================================================================
+# SERVIDOR HTTP LOCAL CON LA API DE YAHOO (PARA EL MOTOR ASÍNCRONO)
+# =============================================================================
+# Sirve chart, quoteSummary, quote y getcrumb con los datos del proveedor
+# sintético, con su latencia y sus fallos (429 y 503), para ejercitar
+# extraccion_async.py sin salir a la red.
+
+# Claves de info que Yahoo da en la cotización v7 y no en quoteSummary
+CLAVES_COTIZACION = ("language", "region", "quoteType", "currency")
+
+def _json_numpy(valor):
+    return valor.item() if hasattr(valor, "item") else str(valor)
+
+def _marcas(indice):
+    if not isinstance(indice, pd.DatetimeIndex):
+        return []  # Serie vacía sin fechas
+    return indice.tz_convert("UTC").as_unit("s").asi8.tolist()
+
+def _desde_fecha(datos, inicio):
+    if not isinstance(datos.index, pd.DatetimeIndex):
+        return datos
+    return datos[datos.index.tz_localize(None).normalize() >= inicio]
+
+def _chart_sintetico(ticker, historial, dividendos, splits, parametros):
+    """Respuesta de /v8/finance/chart con las velas (si se piden diarias) y los eventos"""
+    zona = str(historial.index.tz)
+    if parametros.get("interval") == "1d":
+        if "period1" in parametros:
+            inicio = pd.Timestamp(int(parametros["period1"]), unit="s", tz="UTC").tz_localize(None).normalize()
+            historial, dividendos, splits = (_desde_fecha(datos, inicio) for datos in (historial, dividendos, splits))
+        velas = historial
+    else:
+        velas = historial.iloc[:0]  # Solo interesan los eventos
+    eventos = parametros.get("events", "")
+    cotizacion = {columna.lower(): [None if pd.isna(v) else float(v) for v in velas[columna]]
+                  for columna in ("Open", "High", "Low", "Close", "Volume")}
+    resultado = {
+        "meta": {"symbol": ticker, "exchangeTimezoneName": zona},
+        "timestamp": _marcas(velas.index),
+        "indicators": {"quote": [cotizacion], "adjclose": [{"adjclose": cotizacion["close"]}]},
+        "events": {
+            "dividends": {str(m): {"amount": float(v), "date": m}
+                          for m, v in zip(_marcas(dividendos.index), dividendos)} if "div" in eventos else {},
+            "splits": {str(m): {"numerator": float(v), "denominator": 1.0, "splitRatio": f"{v:g}:1", "date": m}
+                       for m, v in zip(_marcas(splits.index), splits)} if "split" in eventos else {}
+        }
+    }
+    return {"chart": {"result": [resultado], "error": None}}
+
+def _quote_summary_sintetico(ticker_sintetico, modulos):
+    if modulos == "recommendationTrend":
+        tendencia = ticker_sintetico._recomendaciones().to_dict("records")
+        return {"quoteSummary": {"result": [{"recommendationTrend": {"trend": tendencia}}], "error": None}}
+    # Los números van envueltos como en Yahoo: {"raw": valor, "fmt": texto}
+    info = {clave: {"raw": valor, "fmt": f"{valor:,}"} if isinstance(valor, (int, float)) else valor
+            for clave, valor in ticker_sintetico._info().items() if clave not in CLAVES_COTIZACION}
+    return {"quoteSummary": {"result": [{"summaryDetail": info}], "error": None}}
+
+
+class _ManejadorYahoo(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive: el cliente reutiliza las conexiones
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, estado, cuerpo, tipo="application/json"):
+        datos = (cuerpo if isinstance(cuerpo, str) else json.dumps(cuerpo, default=_json_numpy)).encode()
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parametros = {clave: valores[0] for clave, valores in parse_qs(url.query).items()}
+        proveedor = self.server.proveedor
+        if url.path == "/v1/test/getcrumb":
+            return self._responder(200, "crumb-sintetico", "text/plain")
+        if url.path.startswith("/v8/finance/chart/"):
+            ticker = url.path.rsplit("/", 1)[1]
+            endpoint = {"div": "dividends", "splits": "splits"}.get(parametros.get("events"), "history")
+        elif url.path.startswith("/v10/finance/quoteSummary/"):
+            ticker = url.path.rsplit("/", 1)[1]
+            endpoint = "recommendations" if parametros.get("modules") == "recommendationTrend" else "info"
+        elif url.path == "/v7/finance/quote":
+            ticker, endpoint = parametros.get("symbols", ""), "quote"
+        else:
+            return self._responder(404, {"error": "Not Found"})
+
+        try:
+            proveedor.llamada(ticker, endpoint)
+        except ErrorLimiteSintetico as e:
+            return self._responder(429, str(e), "text/plain")
+        except ErrorSintetico as e:
+            return self._responder(503, str(e), "text/plain")
+
+        ticker_sintetico = TickerSintetico(ticker, proveedor)
+        if endpoint == "quote":
+            info = ticker_sintetico._info()
+            cotizacion = {"symbol": ticker, **{clave: info[clave] for clave in CLAVES_COTIZACION}}
+            return self._responder(200, {"quoteResponse": {"result": [cotizacion], "error": None}})
+        if url.path.startswith("/v10/"):
+            return self._responder(200, _quote_summary_sintetico(ticker_sintetico, parametros.get("modules")))
+        historial = ticker_sintetico._historial_completo()
+        return self._responder(200, _chart_sintetico(ticker, historial, ticker_sintetico._dividendos(historial),
+                                                     ticker_sintetico._splits(historial), parametros))
+
+
+class _ServidorHTTP(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # Muchas conexiones simultáneas del motor asíncrono
+
+
+def _servir(argumentos_proveedor, puertos):
+    servidor = _ServidorHTTP(("127.0.0.1", 0), _ManejadorYahoo)
+    servidor.proveedor = ProveedorSintetico(**argumentos_proveedor)
+    puertos.put(servidor.server_address[1])
+    servidor.serve_forever()
+
+
+class ServidorYahooSintetico:
+    """Servidor HTTP local con la API de Yahoo sobre un ProveedorSintetico.
+
+    Corre en su propio proceso (un hilo por conexión) para no competir por
+    el GIL con el cliente que se mide. Los argumentos son los de
+    ProveedorSintetico. Uso: `with ServidorYahooSintetico(dias, latencia)
+    as servidor:` y apuntar el motor asíncrono a `servidor.url`.
+    """
+
+    def __init__(self, dias=DIAS_HISTORICO, latencia=0.0, tasa_errores=0.0, tasa_limite=0.0, endpoints_caidos=()):
+        self._argumentos = dict(dias=dias, latencia=latencia, tasa_errores=tasa_errores, tasa_limite=tasa_limite,
+                                endpoints_caidos=tuple(endpoints_caidos))
+        self._proceso = None
+        self.puerto = None
+
+    def __enter__(self):
+        puertos = mp.Queue()
+        self._proceso = mp.Process(target=_servir, args=(self._argumentos, puertos), name="servidor-yahoo",
+                                   daemon=True)
+        self._proceso.start()
+        self.puerto = puertos.get(timeout=30)
+        return self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.puerto}"
+
+    def __exit__(self, *exc):
+        self._proceso.terminate()
+        self._proceso.join()
+
+def _comparar_tablas(datos_a, datos_b):
+    """Compara tabla a tabla lo que construyen dos paquetes de datos; devuelve las que difieren"""
+    distintas = []
+    for nombre, constructor in CONSTRUCTORES.items():
+        a, b = constructor(datos_a), constructor(datos_b)
+        try:
+            pd.testing.assert_frame_equal(a.reset_index(drop=True), b.reset_index(drop=True),
+                                          check_dtype=False, check_exact=False)
+        except AssertionError as e:
+            distintas.append((nombre, str(e).splitlines()[0]))
+    return distintas
+
+def benchmark_async(n_tickers=TICKERS_ACTUALES, dias=DIAS_HISTORICO, latencia=0.05, hilos=4,
+                    concurrencia=MAX_CONCURRENCIA, llamadas_por_segundo=1000.0, tasa_errores=0.0):
+    """Motor por hilos frente al asíncrono con la misma latencia por llamada.
+
+    El motor por hilos usa el proveedor sintético en proceso; el asíncrono
+    hace peticiones HTTP reales al servidor local. Después se comprueba que
+    los dos paquetes de datos dan las mismas tablas.
+    """
+    lista_acciones = generar_lista_acciones(n_tickers)
+    print(f"⏱️  Extracción de {n_tickers} tickers x {dias} días, latencia {latencia * 1000:.0f} ms por llamada")
+
+    contador_hilos = ContadorLlamadas()
+    inicio = time.perf_counter()
+    datos_hilos = extraer_datos_acciones(lista_acciones, max_workers=hilos,
+                                         proveedor=ProveedorSintetico(dias, latencia, tasa_errores),
+                                         limitador=LimitadorTasa(llamadas_por_segundo), contador=contador_hilos)
+    t_hilos = time.perf_counter() - inicio
+
+    contador_async = ContadorLlamadas()
+    with ServidorYahooSintetico(dias, latencia, tasa_errores) as servidor:
+        inicio = time.perf_counter()
+        datos_async = extraer_datos_acciones_async(lista_acciones, max_concurrencia=concurrencia,
+                                                   limitador=LimitadorTasa(llamadas_por_segundo),
+                                                   contador=contador_async, url_base=servidor.url)
+        t_async = time.perf_counter() - inicio
+
+    print(f"\n{'motor':28s} {'segundos':>9s} {'tickers':>8s} {'llamadas':>9s} {'tickers/s':>10s}")
+    for motor, segundos, datos, contador in ((f"hilos ({hilos})", t_hilos, datos_hilos, contador_hilos),
+                                             (f"async ({concurrencia} en vuelo)", t_async, datos_async,
+                                              contador_async)):
+        llamadas = sum(contador.total_por_endpoint().values())
+        print(f"{motor:28s} {segundos:9.3f} {len(datos):8d} {llamadas:9d} {len(datos) / segundos:10.1f}")
+
+    distintas = _comparar_tablas(datos_hilos, datos_async)
+    if distintas:
+        for nombre, detalle in distintas:
+            print(f"⚠️  {nombre} difiere entre motores: {detalle}")
+    else:
+        print("✅ Los dos motores construyen las mismas tablas")
+    return t_hilos, t_async, distintas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks del ETL con datos sintéticos")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    p_transformacion = subparsers.add_parser("mercado_diario", help="Constructor columnar vs iterrows")
+    p_transformacion.add_argument("--factor", type=int, default=10,
+                                  help="Múltiplo del número actual de tickers (68)")
+    p_transformacion.add_argument("--dias", type=int, default=DIAS_HISTORICO, help="Sesiones por ticker")
+    p_transformacion.add_argument("--repeticiones", type=int, default=1)
+
+    p_memoria = subparsers.add_parser("memoria", help="Memoria por tabla con la política de tipos vs object")
+    p_memoria.add_argument("--tickers", type=int, default=TICKERS_ACTUALES)
+    p_memoria.add_argument("--dias", type=int, default=DIAS_HISTORICO, help="Sesiones por ticker")
+
+    p_analitica = subparsers.add_parser("analitica", help="Tablas derivadas: cálculo completo vs incremental")
+    p_analitica.add_argument("--tickers", type=int, default=TICKERS_ACTUALES)
+    p_analitica.add_argument("--dias", type=int, default=DIAS_HISTORICO, help="Sesiones por ticker")
+    p_analitica.add_argument("--nuevas", type=int, default=1, help="Sesiones añadidas antes de la actualización")
+    p_analitica.add_argument("--destino", choices=("parquet", "duckdb"), default="duckdb")
+
+    p_lectura = subparsers.add_parser("lectura", help="Refrescos de un panel: tabla entera vs filtrada vs caché")
+    p_lectura.add_argument("--tickers", type=int, default=TICKERS_ACTUALES)
+    p_lectura.add_argument("--dias", type=int, default=DIAS_HISTORICO, help="Sesiones por ticker")
+    p_lectura.add_argument("--refrescos", type=int, default=10)
+    p_lectura.add_argument("--destino", choices=("parquet", "duckdb"), default="duckdb")
+
+    p_carga = subparsers.add_parser("carga", help="Filas/s por estrategia de carga masiva")
+    p_carga.add_argument("--tickers", type=int, default=TICKERS_ACTUALES)
+    p_carga.add_argument("--dias", type=int, default=DIAS_HISTORICO, help="Sesiones por ticker")
+    p_carga.add_argument("--url", help="URL SQLAlchemy de la base local (por defecto, SQLite temporal)")
+
+    p_async = subparsers.add_parser("async", help="Motor por hilos vs asíncrono contra un servidor HTTP local")
+    p_async.add_argument("--tickers", type=int, default=TICKERS_ACTUALES)
+    p_async.add_argument("--dias", type=int, default=DIAS_HISTORICO, help="Sesiones por ticker")
+    p_async.add_argument("--latencia", type=float, default=0.05, help="Segundos de espera por llamada")
+    p_async.add_argument("--hilos", type=int, default=4)
+    p_async.add_argument("--concurrencia", type=int, default=MAX_CONCURRENCIA,
+                         help="Peticiones HTTP en vuelo del motor asíncrono")
+    p_async.add_argument("--errores", type=float, default=0.0, help="Probabilidad de fallo por llamada (0-1)")
+
+    p_etl = subparsers.add_parser("etl", help="ETL completo con el proveedor sintético, por etapa")
+    p_etl.add_argument("--tickers", type=int, default=TICKERS_ACTUALES)
+    p_etl.add_argument("--dias", type=int, default=DIAS_HISTORICO, help="Sesiones por ticker")
+    p_etl.add_argument("--latencia", type=float, default=0.0, help="Segundos de espera por llamada")
+    p_etl.add_argument("--errores", type=float, default=0.0, help="Probabilidad de fallo por llamada (0-1)")
+    p_etl.add_argument("--limite", type=float, default=0.0, help="Probabilidad de una respuesta 429 por llamada (0-1)")
+    p_etl.add_argument("--caido", nargs="+", default=(), metavar="ENDPOINT",
+                       help="Endpoints que fallan siempre (info, history, dividends, splits, recommendations, download)")
+    p_etl.add_argument("--espera-base", type=float, default=ESPERA_BASE,
+                       help="Espera base en segundos del backoff exponencial")
+    p_etl.add_argument("--hilos", type=int, default=4)
+    p_etl.add_argument("--backend", choices=("por_ticker", "lote"), default="por_ticker",
+                       help="Histórico por ticker o descargado por lotes de mercado")
+    p_etl.add_argument("--url", help="URL SQLAlchemy de la base local (por defecto, SQLite temporal)")
+    p_etl.add_argument("--destino", choices=("sqlite",) + DESTINOS, default="sqlite")
+    p_etl.add_argument("--ruta", help="Directorio Parquet o archivo DuckDB (por defecto, temporal)")
+
+    args = parser.parse_args()
+    if args.benchmark == "mercado_diario":
+        benchmark_mercado_diario(args.factor, args.dias, args.repeticiones)
+    elif args.benchmark == "analitica":
+        benchmark_analitica(args.tickers, args.dias, args.nuevas, args.destino)
+    elif args.benchmark == "lectura":
+        benchmark_lectura(args.tickers, args.dias, args.refrescos, args.destino)
+    elif args.benchmark == "memoria":
+        benchmark_memoria(args.tickers, args.dias)
+    elif args.benchmark == "async":
+        benchmark_async(args.tickers, args.dias, args.latencia, args.hilos, args.concurrencia,
+                        tasa_errores=args.errores)
+    elif args.benchmark == "carga":
+        benchmark_carga(args.tickers, args.dias, args.url)
+    else:
+        benchmark_etl(args.tickers, args.dias, args.latencia, args.errores, args.hilos,
+                      url=args.url, destino=args.destino, ruta=args.ruta, backend_historial=args.backend,
+                      tasa_limite=args.limite, endpoints_caidos=args.caido, espera_base=args.espera_base)
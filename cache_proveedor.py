@@ -0,0 +1,137 @@
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import date, datetime, timedelta
+
+from extraccion import TickerEnvuelto
+from metricas import METRICAS
+
+# Archivo SQLite donde se guardan las respuestas del proveedor
+RUTA_CACHE = "cache_yfinance.sqlite"
+
+# Vigencia de cada tipo de respuesta. El histórico solo vale el mismo día en
+# que se descargó (None); los fundamentales unos días y los eventos
+# corporativos, que casi nunca cambian, bastante más.
+TTL_POR_ENDPOINT = {
+    "history": None,
+    "info": timedelta(days=3),
+    "recommendations": timedelta(days=1),
+    "dividends": timedelta(days=30),
+    "splits": timedelta(days=30),
+}
+
+
+class SinDatosEnCache(LookupError):
+    """La respuesta no está en caché y el modo offline prohíbe ir a la red"""
+
+
+class CacheRespuestas:
+    """Caché persistente en SQLite de las respuestas del proveedor, con TTL por endpoint"""
+
+    def __init__(self, ruta=RUTA_CACHE, ttl=None):
+        self.ruta = ruta
+        self.ttl = dict(TTL_POR_ENDPOINT, **(ttl or {}))
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        with closing(self._conectar()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS respuestas (
+                    ticker TEXT NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    parametros TEXT NOT NULL,
+                    guardado_en REAL NOT NULL,
+                    contenido BLOB NOT NULL,
+                    PRIMARY KEY (ticker, endpoint, parametros)
+                )
+            """)
+
+    def _conectar(self):
+        # Una conexión por operación: los hilos de extracción comparten la caché
+        return sqlite3.connect(self.ruta, timeout=30)
+
+    @staticmethod
+    def _parametros(kwargs):
+        return json.dumps(kwargs, sort_keys=True, default=str)
+
+    def _vigente(self, endpoint, guardado_en):
+        ttl = self.ttl.get(endpoint)
+        if ttl is None:
+            return datetime.fromtimestamp(guardado_en).date() == date.today()
+        return time.time() - guardado_en < ttl.total_seconds()
+
+    def leer(self, ticker, endpoint, kwargs=None, ignorar_ttl=False):
+        """Devuelve (encontrado, valor) para la respuesta guardada"""
+        with closing(self._conectar()) as conn:
+            fila = conn.execute(
+                "SELECT guardado_en, contenido FROM respuestas "
+                "WHERE ticker = ? AND endpoint = ? AND parametros = ?",
+                (ticker, endpoint, self._parametros(kwargs or {}))
+            ).fetchone()
+        encontrado = fila is not None and (ignorar_ttl or self._vigente(endpoint, fila[0]))
+        with self._lock:
+            if encontrado:
+                self.aciertos += 1
+            else:
+                self.fallos += 1
+        METRICAS.incrementar("cache_aciertos" if encontrado else "cache_fallos", endpoint=endpoint)
+        return (True, pickle.loads(fila[1])) if encontrado else (False, None)
+
+    def guardar(self, ticker, endpoint, valor, kwargs=None):
+        """Guarda (o reemplaza) una respuesta del proveedor"""
+        with closing(self._conectar()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO respuestas VALUES (?, ?, ?, ?, ?)",
+                (ticker, endpoint, self._parametros(kwargs or {}), time.time(),
+                 pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+            )
+
+    def limpiar_expirados(self):
+        """Elimina las respuestas que ya no están vigentes"""
+        with closing(self._conectar()) as conn, conn:
+            filas = conn.execute("SELECT rowid, endpoint, guardado_en FROM respuestas").fetchall()
+            expirados = [(rowid,) for rowid, endpoint, guardado_en in filas
+                         if not self._vigente(endpoint, guardado_en)]
+            conn.executemany("DELETE FROM respuestas WHERE rowid = ?", expirados)
+        return len(expirados)
+
+    def resumen(self):
+        total = self.aciertos + self.fallos
+        print(f"🗄️  Caché: {self.aciertos}/{total} respuestas servidas desde {self.ruta}")
+
+
+class _TickerCacheado(TickerEnvuelto):
+    def __init__(self, ticker, fabrica, cache, solo_cache):
+        super().__init__(ticker, fabrica)
+        self._cache = cache
+        self._solo_cache = solo_cache
+
+    def _llamar(self, endpoint, funcion, *args, **kwargs):
+        encontrado, valor = self._cache.leer(self.ticker, endpoint, kwargs, ignorar_ttl=self._solo_cache)
+        if encontrado:
+            return valor
+        if self._solo_cache:
+            raise SinDatosEnCache(f"{self.ticker} {endpoint} no está en la caché (modo offline)")
+        valor = funcion(*args, **kwargs)
+        self._cache.guardar(self.ticker, endpoint, valor, kwargs)
+        return valor
+
+
+class ProveedorCacheado:
+    """Fábrica de tickers que sirve las respuestas desde la caché cuando están vigentes.
+
+    Con `solo_cache=True` (repetición offline) nunca se crea el Ticker real:
+    se usa lo que haya en caché sin importar su antigüedad y los faltantes
+    lanzan SinDatosEnCache.
+    """
+
+    def __init__(self, cache, proveedor, solo_cache=False):
+        self.cache = cache
+        self.proveedor = proveedor
+        self.solo_cache = solo_cache
+
+    def __call__(self, ticker):
+        return _TickerCacheado(ticker, self.proveedor, self.cache, self.solo_cache)
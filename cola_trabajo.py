@@ -0,0 +1,269 @@
+import multiprocessing as mp
+import os
+import queue
+import socket
+import sqlite3
+import time
+import traceback
+from contextlib import closing
+
+from extraccion import LLAMADAS_POR_SEGUNDO, ContadorLlamadas, LimitadorTasa, extraer_datos_acciones
+from metricas import METRICAS
+from resiliencia import CortaCircuitos
+from pipeline import guardar_tablas
+from transformacion import construir_tablas
+
+# Archivo SQLite con la cola de trabajo; varios hosts pueden compartirlo
+RUTA_COLA = "cola_trabajo.sqlite"
+
+# Tickers que reclama cada trabajador de una vez
+TAM_LOTE_TRABAJO = 5
+
+# Un lote reclamado vuelve a estar disponible si su lease vence sin completarse
+# (el trabajador murió o se colgó); debe cubrir extracción, transformación y carga
+DURACION_LEASE = 900
+
+# Reintentos de un ticker antes de darlo por fallido
+MAX_INTENTOS = 3
+
+# Segundos entre consultas de un trabajador sin lote mientras quedan tickers en proceso
+ESPERA_COLA = 1.0
+
+# =============================================================================
+# COLA DE TRABAJO CON LEASES (SQLITE)
+# =============================================================================
+
+class ColaTrabajo:
+    """Cola persistente de tickers en SQLite con reclamación atómica y leases.
+
+    Cada ticker es un elemento de trabajo. Un trabajador lo reclama por un
+    tiempo limitado (lease); si no lo completa antes de que venza, otro
+    trabajador puede reclamarlo. Así ningún ticker se procesa dos veces en
+    paralelo ni se pierde si un proceso muere.
+    """
+
+    def __init__(self, ruta=RUTA_COLA, duracion_lease=DURACION_LEASE, max_intentos=MAX_INTENTOS):
+        self.ruta = ruta
+        self.duracion_lease = duracion_lease
+        self.max_intentos = max_intentos
+        with closing(self._conectar()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS trabajo (
+                    ticker TEXT PRIMARY KEY,
+                    mercado TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    trabajador TEXT,
+                    lease_hasta REAL,
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    error TEXT
+                )
+            """)
+
+    def _conectar(self):
+        # isolation_level=None: las transacciones se abren a mano con BEGIN IMMEDIATE
+        return sqlite3.connect(self.ruta, timeout=60, isolation_level=None)
+
+    def encolar(self, lista_acciones, reiniciar=False):
+        """Añade los tickers como pendientes; con `reiniciar` se vuelve a procesar todo"""
+        with closing(self._conectar()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if reiniciar:
+                conn.execute("DELETE FROM trabajo")
+            conn.executemany(
+                "INSERT OR IGNORE INTO trabajo (ticker, mercado, estado) VALUES (?, ?, 'pendiente')",
+                [(accion["ticker"], accion["mercado"]) for accion in lista_acciones]
+            )
+            conn.execute("COMMIT")
+
+    def reclamar(self, trabajador, n=TAM_LOTE_TRABAJO):
+        """Reclama hasta `n` tickers pendientes o con el lease vencido"""
+        ahora = time.time()
+        with closing(self._conectar()) as conn:
+            # BEGIN IMMEDIATE toma el bloqueo de escritura: dos procesos no
+            # pueden leer y marcar el mismo elemento a la vez
+            conn.execute("BEGIN IMMEDIATE")
+            # Leases vencidos sin intentos restantes: no los reclamará nadie
+            conn.execute(
+                "UPDATE trabajo SET estado = 'fallido', lease_hasta = NULL, error = 'lease vencido' "
+                "WHERE estado = 'en_proceso' AND lease_hasta < ? AND intentos >= ?",
+                (ahora, self.max_intentos)
+            )
+            filas = conn.execute(
+                "SELECT ticker, mercado FROM trabajo "
+                "WHERE (estado = 'pendiente' OR (estado = 'en_proceso' AND lease_hasta < ?)) "
+                "AND intentos < ? ORDER BY rowid LIMIT ?",
+                (ahora, self.max_intentos, n)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE trabajo SET estado = 'en_proceso', trabajador = ?, lease_hasta = ?, "
+                "intentos = intentos + 1 WHERE ticker = ?",
+                [(trabajador, ahora + self.duracion_lease, ticker) for ticker, _ in filas]
+            )
+            conn.execute("COMMIT")
+        return [{"ticker": ticker, "mercado": mercado} for ticker, mercado in filas]
+
+    def completar(self, tickers):
+        with closing(self._conectar()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE trabajo SET estado = 'hecho', lease_hasta = NULL, error = NULL WHERE ticker = ?",
+                [(ticker,) for ticker in tickers]
+            )
+            conn.execute("COMMIT")
+
+    def fallar(self, tickers, error):
+        """Devuelve los tickers a la cola, o los marca fallidos si agotaron los intentos"""
+        with closing(self._conectar()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE trabajo SET estado = CASE WHEN intentos < ? THEN 'pendiente' ELSE 'fallido' END, "
+                "lease_hasta = NULL, error = ? WHERE ticker = ?",
+                [(self.max_intentos, str(error), ticker) for ticker in tickers]
+            )
+            conn.execute("COMMIT")
+
+    def en_curso(self):
+        """Tickers pendientes o en proceso: mientras haya alguno la cola no está agotada"""
+        with closing(self._conectar()) as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM trabajo WHERE estado IN ('pendiente', 'en_proceso')"
+            ).fetchone()[0]
+
+    def conteos(self):
+        with closing(self._conectar()) as conn:
+            return dict(conn.execute("SELECT estado, COUNT(*) FROM trabajo GROUP BY estado").fetchall())
+
+    def resumen(self):
+        conteos = self.conteos()
+        print(f"🧾 Cola de trabajo ({self.ruta}): "
+              + ", ".join(f"{estado}: {n}" for estado, n in sorted(conteos.items())))
+        fallidos = conteos.get("fallido", 0)
+        if fallidos:
+            print(f"⚠️  {fallidos} tickers agotaron sus {self.max_intentos} intentos")
+        return conteos
+
+# =============================================================================
+# TRABAJADORES Y COORDINADOR
+# =============================================================================
+
+def identificador_trabajador(indice):
+    """Identificador único entre hosts que comparten el archivo de la cola"""
+    return f"{socket.gethostname()}:{os.getpid()}:{indice}"
+
+def trabajador(indice, ruta_cola, resultados, opciones_extraccion, llamadas_por_segundo, ruta_cache=None):
+    """Proceso trabajador: reclama lotes, los extrae y transforma y envía las tablas al cargador.
+
+    Cada proceso tiene su propio limitador (con su parte del presupuesto de
+    llamadas) y su propia conexión a la caché; las opciones deben poder
+    serializarse para pasar a otro proceso. Sin lote que reclamar, el
+    trabajador espera mientras queden tickers en proceso: el coordinador
+    puede devolverlos a la cola si falla al guardarlos, o puede vencer el
+    lease de un trabajador caído.
+    """
+    nombre = identificador_trabajador(indice)
+    cola = ColaTrabajo(ruta_cola)
+    opciones = dict(opciones_extraccion)
+    opciones["limitador"] = LimitadorTasa(llamadas_por_segundo)
+    opciones["contador"] = ContadorLlamadas()
+    opciones["circuitos"] = CortaCircuitos()
+    if ruta_cache is not None:
+        from cache_proveedor import CacheRespuestas
+        opciones["cache"] = CacheRespuestas(ruta_cache)
+
+    try:
+        while True:
+            lote = cola.reclamar(nombre)
+            if not lote:
+                if not cola.en_curso():
+                    break
+                time.sleep(ESPERA_COLA)
+                continue
+            try:
+                datos_acciones = extraer_datos_acciones(lote, **opciones)
+                tablas = construir_tablas(datos_acciones)
+            except Exception as e:
+                print(f"❌ Trabajador {nombre}: error procesando {[a['ticker'] for a in lote]}: {e}")
+                traceback.print_exc()
+                cola.fallar([accion["ticker"] for accion in lote], e)
+                continue
+            sin_datos = [accion["ticker"] for accion in lote if accion["ticker"] not in datos_acciones]
+            if sin_datos:
+                cola.fallar(sin_datos, "sin datos del proveedor")
+            # Solo viajan los tickers con su mercado y las tablas, no el paquete completo
+            extraidos = {ticker: {"mercado": datos["mercado"]} for ticker, datos in datos_acciones.items()}
+            resultados.put(("lote", lote, extraidos, tablas))
+    finally:
+        # Las métricas de cada proceso viajan al coordinador para un único informe
+        resultados.put(("fin", nombre, METRICAS.a_dict()))
+
+def ejecutar_multiproceso(lista_acciones, destino, n_procesos, opciones_extraccion=None,
+                          ruta_cola=RUTA_COLA, ruta_cache=None, llamadas_por_segundo=LLAMADAS_POR_SEGUNDO,
+                          reiniciar=True, al_cargar_lote=None):
+    """Reparte los tickers entre `n_procesos` trabajadores a través de la cola de trabajo.
+
+    Los trabajadores extraen y transforman en paralelo (cada uno en su propio
+    proceso, sin competir por el GIL) y este proceso es el único cargador: las
+    tablas de cada lote llegan por una cola de resultados y se guardan con
+    `guardar_tablas`. Un ticker solo se marca como hecho en la cola cuando
+    sus tablas se han guardado. `opciones_extraccion` se pasa a
+    `extraer_datos_acciones` en cada trabajador; el limitador, la caché y
+    los circuitos se crean allí. Un lote que no se pudo guardar vuelve a la
+    cola y lo reclama otro trabajador. Devuelve {tabla: True si todos sus
+    tickers acabaron guardados}.
+    """
+    cola = ColaTrabajo(ruta_cola)
+    cola.encolar(lista_acciones, reiniciar=reiniciar)
+    opciones_extraccion = {clave: valor for clave, valor in (opciones_extraccion or {}).items()
+                           if clave not in ("limitador", "cache", "contador", "circuitos")}
+
+    # El presupuesto de llamadas se reparte entre los procesos
+    resultados_cola = mp.Queue(maxsize=2 * n_procesos)
+    procesos = [
+        mp.Process(target=trabajador, name=f"trabajador-{i}",
+                   args=(i, ruta_cola, resultados_cola, opciones_extraccion,
+                         llamadas_por_segundo / n_procesos, ruta_cache))
+        for i in range(n_procesos)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    print(f"🏭 {n_procesos} procesos trabajadores sobre {len(lista_acciones)} tickers ({ruta_cola})")
+
+    # Tickers de cada tabla cuyo último intento de guardado falló
+    sin_guardar = {}
+    activos = n_procesos
+    n_lote = 0
+    while activos:
+        try:
+            mensaje = resultados_cola.get(timeout=5)
+        except queue.Empty:
+            # Un trabajador que muere sin avisar no debe bloquear al cargador
+            if not any(proceso.is_alive() for proceso in procesos):
+                break
+            continue
+        if mensaje[0] == "fin":
+            activos -= 1
+            METRICAS.fusionar(mensaje[2])
+            continue
+
+        _, lote, extraidos, tablas = mensaje
+        n_lote += 1
+        if extraidos:
+            print(f"\n🏭 Lote {n_lote}: guardando {len(extraidos)} tickers ({', '.join(extraidos)})")
+        resultados_lote = guardar_tablas(destino, tablas, f"lote {n_lote}")
+        for nombre_tabla, exito in resultados_lote.items():
+            pendientes = sin_guardar.setdefault(nombre_tabla, set())
+            if exito:
+                pendientes.difference_update(extraidos)
+            else:
+                pendientes.update(extraidos)
+        if all(resultados_lote.values()):
+            cola.completar(list(extraidos))
+        else:
+            cola.fallar(list(extraidos), "error al guardar")
+        if al_cargar_lote is not None:
+            al_cargar_lote(lote, extraidos, resultados_lote)
+
+    for proceso in procesos:
+        proceso.join()
+    cola.resumen()
+    return {nombre_tabla: not pendientes for nombre_tabla, pendientes in sin_guardar.items()}
@@ -0,0 +1,128 @@
+from datetime import date
+
+import pandas as pd
+
+from metricas import METRICAS
+from transformacion import aplicar_tipos, tipos_de_escritura
+
+# Tablas con una foto por ticker (sin fecha propia) que se guardan versionadas
+TABLAS_DIMENSION = ("activos", "rendimiento_financiero", "estados_financieros", "consenso_analistas")
+
+# Columnas de versión (SCD tipo 2)
+VALIDO_DESDE = "valid from"
+VALIDO_HASTA = "valid to"
+VIGENTE = "is current"
+HUELLA = "row hash"
+COLUMNAS_VERSION = (VALIDO_DESDE, VALIDO_HASTA, VIGENTE, HUELLA)
+
+# Sufijo de la copia de una tabla con el formato anterior mientras se migra
+SUFIJO_SIN_VERSIONAR = "_sin_versionar"
+
+# =============================================================================
+# VERSIONES DE LAS TABLAS DE DIMENSIÓN (SCD TIPO 2)
+# =============================================================================
+# Cada carga trae una foto completa de cada ticker, pero casi nunca cambia.
+# Se guarda un hash del contenido de cada fila y solo se escriben los tickers
+# cuyo hash difiere del de su versión vigente: la versión anterior se cierra
+# ("valid to" = fecha de la foto, "is current" = falso) y la nueva queda
+# vigente desde esa fecha. Dos fotos distintas del mismo día comparten clave
+# (ticker, "valid from"), así que la segunda reemplaza a la primera.
+# La versión vigente se lee con `leer(tabla, actuales=True)`; en MySQL y
+# DuckDB también con la vista <tabla>_actual.
+
+def huella_filas(df):
+    """Hash (hex de 16 caracteres) del contenido de cada fila, sin las columnas de versión.
+
+    Las columnas se recorren en orden alfabético y cada valor se compara como
+    texto con los tipos de escritura, así que la misma foto da el mismo hash
+    en cada ejecución.
+    """
+    columnas = sorted(c for c in df.columns if c not in COLUMNAS_VERSION)
+    contenido = tipos_de_escritura(df[columnas]).astype(str)
+    return pd.util.hash_pandas_object(contenido, index=False).map("{:016x}".format).to_numpy()
+
+def _versionar(df, fecha):
+    """Filas de `df` como versiones vigentes desde `fecha`"""
+    df[VALIDO_DESDE] = fecha
+    df[VALIDO_HASTA] = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    df[VIGENTE] = True
+    return df
+
+def migrar_dimension(destino, tabla, fecha=None):
+    """Convierte una tabla guardada con el formato anterior (una copia por carga) en tabla versionada.
+
+    Se conserva la última fila de cada ticker como versión vigente desde
+    `fecha`: las copias anteriores no dicen desde cuándo valía cada dato.
+    La tabla anterior se renombra a <tabla>_sin_versionar y solo se borra
+    cuando la versionada está escrita; si la escritura falla, se restaura.
+    Devuelve False si la tabla no necesitaba migrarse.
+    """
+    antiguas = destino.leer(tabla)
+    if antiguas.empty or VALIDO_DESDE in antiguas.columns:
+        return False
+    fecha = fecha or date.today()
+    vigentes = aplicar_tipos(antiguas.drop_duplicates("ticker", keep="last").reset_index(drop=True), tabla)
+    vigentes = _versionar(vigentes, fecha)
+    vigentes[HUELLA] = huella_filas(vigentes)
+    respaldo = tabla + SUFIJO_SIN_VERSIONAR
+    destino.renombrar(tabla, respaldo)
+    try:
+        # En MySQL vuelve a crear la tabla vacía con su esquema explícito
+        destino.eliminar(tabla)
+        if not destino.reemplazar(vigentes, tabla, VALIDO_DESDE):
+            raise RuntimeError(f"No se pudo reescribir {tabla} versionada")
+    except Exception:
+        destino.renombrar(respaldo, tabla)
+        print(f"↩️  {tabla} restaurada con el formato anterior")
+        raise
+    destino.eliminar(respaldo)
+    print(f"🧬 {tabla} migrada a tabla versionada: {len(antiguas)} filas -> {len(vigentes)} versiones vigentes")
+    return True
+
+def _leer_vigentes(destino, tabla, tickers, fecha):
+    """Versiones vigentes de `tickers`; si la tabla tiene el formato anterior, antes se migra"""
+    try:
+        vigentes = destino.leer(tabla, tickers=tickers, actuales=True)
+    except Exception:
+        # Sin columna "is current" MySQL y DuckDB fallan; SQLite la toma por un literal y no devuelve nada
+        vigentes = pd.DataFrame()
+    if vigentes.empty:
+        # Ninguna versión vigente: tickers nuevos o tabla con el formato anterior
+        vigentes = destino.leer(tabla, tickers=tickers)
+    if not vigentes.empty and VALIDO_DESDE not in vigentes.columns:
+        migrar_dimension(destino, tabla, fecha)
+        vigentes = destino.leer(tabla, tickers=tickers, actuales=True)
+    return vigentes
+
+def guardar_dimension(destino, df, tabla, fecha=None):
+    """Guarda la foto `df` de una tabla de dimensión escribiendo solo los tickers que cambiaron"""
+    fecha = fecha or date.today()
+    try:
+        nuevas = df.drop_duplicates("ticker", keep="last").reset_index(drop=True)
+        nuevas[HUELLA] = huella_filas(nuevas)
+        with METRICAS.medir("comparar_versiones", tabla=tabla):
+            vigentes = _leer_vigentes(destino, tabla, list(nuevas["ticker"].astype(str).unique()), fecha)
+            anteriores = {} if vigentes.empty else dict(zip(vigentes["ticker"].astype(str), vigentes[HUELLA]))
+            ticker = nuevas["ticker"].astype(str)
+            cambiadas = nuevas[ticker.map(anteriores).to_numpy() != nuevas[HUELLA].to_numpy()]
+        METRICAS.incrementar("filas_sin_cambios", len(nuevas) - len(cambiadas), tabla=tabla)
+        if cambiadas.empty:
+            print(f"⏭️  {tabla}: sin cambios en {len(nuevas)} tickers")
+            return True
+
+        # Se cierran las versiones vigentes de los tickers que cambiaron (salvo las del mismo día, que se reemplazan)
+        filas = [_versionar(cambiadas.copy(), fecha)]
+        if not vigentes.empty:
+            cerradas = vigentes[vigentes["ticker"].astype(str).isin(cambiadas["ticker"].astype(str))
+                                & (pd.to_datetime(vigentes[VALIDO_DESDE]) < pd.Timestamp(fecha))]
+            cerradas = aplicar_tipos(cerradas.reset_index(drop=True), tabla)
+            cerradas[VALIDO_DESDE] = pd.to_datetime(cerradas[VALIDO_DESDE]).dt.date
+            cerradas[VALIDO_HASTA] = pd.Series(pd.Timestamp(fecha), index=cerradas.index, dtype="datetime64[ns]")
+            cerradas[VIGENTE] = False
+            filas.insert(0, cerradas[filas[0].columns])
+        versiones = aplicar_tipos(pd.concat(filas, ignore_index=True), tabla)
+        print(f"🧬 {tabla}: {len(cambiadas)} de {len(nuevas)} tickers con cambios")
+        return destino.reemplazar(versiones, tabla, VALIDO_DESDE)
+    except Exception as e:
+        print(f"❌ Error guardando las versiones de {tabla}: {e}")
+        return False
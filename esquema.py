@@ -0,0 +1,252 @@
+from datetime import date
+
+from sqlalchemy import Column, Index, MetaData, Table, inspect, text, types
+
+from dimensiones import TABLAS_DIMENSION
+
+# =============================================================================
+# ESQUEMA EXPLÍCITO DE LAS TABLAS DE SALIDA
+# =============================================================================
+# Los nombres de columna son los mismos que generan los constructores de
+# transformacion.py, para que las cargas sigan funcionando sin renombrar.
+
+metadata = MetaData()
+
+def _ticker(primaria=False):
+    return Column("ticker", types.String(32), primary_key=primaria, nullable=False)
+
+def _mercado(nombre="market"):
+    return Column(nombre, types.String(16))
+
+def _precio(nombre):
+    return Column(nombre, types.Numeric(18, 4))
+
+def _entero(nombre):
+    return Column(nombre, types.BigInteger)
+
+def _ratio(nombre):
+    return Column(nombre, types.Float)
+
+def _texto(nombre, longitud=255):
+    return Column(nombre, types.String(longitud))
+
+# Las tablas de dimensión se guardan versionadas (ver dimensiones.py): clave (ticker, "valid from")
+def _version(tabla):
+    """Columnas de versión e índice de la versión vigente de una tabla de dimensión"""
+    return (
+        Column("valid from", types.Date, primary_key=True),
+        Column("valid to", types.Date),
+        Column("is current", types.Boolean, nullable=False),
+        _texto("row hash", 16),
+        Index(f"ix_{tabla}_actual", "is current", "ticker")
+    )
+
+activos = Table(
+    "activos", metadata,
+    _ticker(primaria=True), _mercado(),
+    _texto("name"), _texto("short name"),
+    Column("business summary", types.Text),
+    _texto("website"), _texto("Phone", 64), _texto("address"),
+    _texto("city", 128), _texto("state", 128), _texto("pc", 32), _texto("country", 128),
+    _texto("industry", 128), _texto("sector", 128), _texto("quote type", 32),
+    _texto("currency", 8), _texto("language", 16), _texto("region", 8),
+    *_version("activos"),
+    Index("ix_activos_market", "market")
+)
+
+mercado_diario = Table(
+    "mercado_diario", metadata,
+    _ticker(primaria=True), _mercado(),
+    Column("date", types.Date, primary_key=True),
+    _precio("open price"), _precio("high price"), _precio("low price"), _precio("closing price"),
+    _entero("volume"),
+    Index("ix_mercado_diario_market", "market"),
+    Index("ix_mercado_diario_date", "date")
+)
+
+rendimiento_financiero = Table(
+    "rendimiento_financiero", metadata,
+    _ticker(primaria=True), _mercado(),
+    _entero("market cap"),
+    _precio("avg price 50 days"), _precio("avg price 200 days"),
+    _ratio("change percent 52 weeks"),
+    *_version("rendimiento_financiero"),
+    Index("ix_rendimiento_financiero_market", "market")
+)
+
+estados_financieros = Table(
+    "estados_financieros", metadata,
+    _ticker(primaria=True), _mercado(),
+    _entero("total cash"), _entero("total debt"), _entero("total revenue"),
+    _ratio("profit margins"),
+    _entero("gross profits"), _entero("free cash flow"), _entero("operating cash flow"),
+    _ratio("revenue growth"),
+    _entero("ebitda"), _entero("net income to common"),
+    _texto("financial currency", 8),
+    _ratio("price to sale ratio 12 months"), _ratio("enterprise to revenue"), _ratio("enterprise to_ebitda"),
+    _ratio("price to earnings"), _ratio("per futuro"), _ratio("price to book"), _ratio("debt to equity"),
+    _ratio("roa"), _ratio("roe"), _ratio("eps ttm"), _ratio("eps fordward"),
+    *_version("estados_financieros"),
+    Index("ix_estados_financieros_market", "market")
+)
+
+dividendos = Table(
+    "dividendos", metadata,
+    Column("Date", types.Date, primary_key=True),
+    _ticker(primaria=True),
+    Column("divident", types.Numeric(18, 6)),
+    _mercado(),
+    Index("ix_dividendos_market", "market"),
+    Index("ix_dividendos_date", "Date")
+)
+
+splits = Table(
+    "splits", metadata,
+    Column("Date", types.Date, primary_key=True),
+    _ticker(primaria=True),
+    Column("split ratio", types.Numeric(12, 6)),
+    _mercado(),
+    Index("ix_splits_market", "market"),
+    Index("ix_splits_date", "Date")
+)
+
+recomendaciones = Table(
+    "recomendaciones", metadata,
+    Column("period", types.String(8), primary_key=True),
+    Column("strongBuy", types.Integer), Column("buy", types.Integer), Column("hold", types.Integer),
+    Column("sell", types.Integer), Column("strongSell", types.Integer),
+    _ticker(primaria=True), _mercado("mercado"),
+    Column("snapshot date", types.Date, primary_key=True),
+    Index("ix_recomendaciones_ticker", "ticker"),
+    Index("ix_recomendaciones_fecha", "snapshot date"),
+    Index("ix_recomendaciones_mercado", "mercado")
+)
+
+consenso_analistas = Table(
+    "consenso_analistas", metadata,
+    _ticker(primaria=True), _mercado(),
+    Column("average analyst recommendation rating", types.Numeric(6, 2)),
+    Column("number of analysts", types.Integer),
+    _entero("average price"),
+    *_version("consenso_analistas"),
+    Index("ix_consenso_analistas_market", "market")
+)
+
+# Serie ajustada por splits y dividendos y huella de los eventos aplicados (ajustes.py)
+mercado_ajustado = Table(
+    "mercado_ajustado", metadata,
+    _ticker(primaria=True), _mercado(),
+    Column("date", types.Date, primary_key=True),
+    _precio("open price"), _precio("high price"), _precio("low price"), _precio("closing price"),
+    _entero("volume"), _ratio("adjustment factor"),
+    Index("ix_mercado_ajustado_market", "market"),
+    Index("ix_mercado_ajustado_date", "date")
+)
+
+estado_ajustes = Table(
+    "estado_ajustes", metadata,
+    _ticker(primaria=True), _mercado(),
+    Column("date", types.Date),
+    _texto("actions hash", 40)
+)
+
+base_precios = Table(
+    "base_precios", metadata,
+    _ticker(primaria=True), _mercado(),
+    _texto("price basis", 8)
+)
+
+# Tablas derivadas de la serie ajustada (analitica.py)
+rendimientos_diarios = Table(
+    "rendimientos_diarios", metadata,
+    _ticker(primaria=True), _mercado(),
+    Column("date", types.Date, primary_key=True),
+    _precio("closing price"), _ratio("log return"),
+    _precio("avg price 20 days"), _precio("avg price 50 days"), _precio("avg price 200 days"),
+    _ratio("volatility 20 days"), _ratio("volatility 50 days"), _ratio("volatility 200 days"),
+    Index("ix_rendimientos_diarios_market", "market"),
+    Index("ix_rendimientos_diarios_date", "date")
+)
+
+correlaciones_mercados = Table(
+    "correlaciones_mercados", metadata,
+    _ticker(primaria=True), _mercado(),
+    Column("ticker b", types.String(32), primary_key=True, nullable=False), _mercado("market b"),
+    Column("date", types.Date, primary_key=True),
+    _ratio("correlation"),
+    Index("ix_correlaciones_mercados_date", "date")
+)
+
+# =============================================================================
+# CREACIÓN Y PARTICIONADO
+# =============================================================================
+
+def _esta_particionada(conn, tabla):
+    query = text("""
+        SELECT COUNT(*) FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabla AND PARTITION_NAME IS NOT NULL
+    """)
+    return conn.execute(query, {"tabla": tabla}).scalar() > 0
+
+def particionar_por_anio(engine, tabla="mercado_diario", columna="date", desde=2010, hasta=None):
+    """Particiona la tabla por rangos de año (solo MySQL; la columna debe estar en la clave primaria)"""
+    if engine.dialect.name != "mysql":
+        print(f"⚠️  El particionado solo aplica a MySQL, {tabla} se deja sin particionar")
+        return False
+    hasta = hasta or date.today().year + 1
+    q = engine.dialect.identifier_preparer.quote
+    particiones = [f"PARTITION p{anio} VALUES LESS THAN ({anio + 1})" for anio in range(desde, hasta + 1)]
+    particiones.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    try:
+        with engine.begin() as conn:
+            if _esta_particionada(conn, tabla):
+                return True
+            conn.execute(text(
+                f"ALTER TABLE {q(tabla)} PARTITION BY RANGE (YEAR({q(columna)})) ({', '.join(particiones)})"
+            ))
+        print(f"🗂️  {tabla} particionada por año ({desde}-{hasta})")
+        return True
+    except Exception as e:
+        print(f"❌ Error particionando {tabla}: {e}")
+        return False
+
+def crear_vistas_actuales(engine):
+    """Crea la vista <tabla>_actual (versión vigente de cada ticker) de cada tabla de dimensión"""
+    q = engine.dialect.identifier_preparer.quote
+    existentes = set(inspect(engine).get_table_names())
+    creacion = "CREATE OR REPLACE VIEW" if engine.dialect.name == "mysql" else "CREATE VIEW IF NOT EXISTS"
+    with engine.begin() as conn:
+        for tabla in TABLAS_DIMENSION:
+            columnas = {c["name"] for c in inspect(conn).get_columns(tabla)} if tabla in existentes else set()
+            # Las tablas con el formato anterior se migran en la primera carga (ver dimensiones.py)
+            if "is current" in columnas:
+                conn.execute(text(f"{creacion} {q(tabla + '_actual')} AS "
+                                  f"SELECT * FROM {q(tabla)} WHERE {q('is current')}"))
+
+def crear_esquema(engine, particionar=False):
+    """Crea las tablas que falten con tipos, claves primarias e índices explícitos.
+
+    Las tablas que ya existen (por ejemplo, creadas antes por `to_sql`) se
+    conservan tal cual; se informa para que puedan migrarse a mano.
+    """
+    existentes = set(inspect(engine).get_table_names())
+    preexistentes = [t for t in metadata.tables if t in existentes]
+    try:
+        metadata.create_all(engine, checkfirst=True)
+    except Exception as e:
+        print(f"❌ Error creando el esquema: {e}")
+        return False
+
+    creadas = [t for t in metadata.tables if t not in existentes]
+    if creadas:
+        print(f"🧱 Tablas creadas con esquema explícito: {', '.join(creadas)}")
+    if preexistentes:
+        print(f"ℹ️  Tablas existentes conservadas sin cambios: {', '.join(preexistentes)}")
+    try:
+        crear_vistas_actuales(engine)
+    except Exception as e:
+        print(f"⚠️  No se pudieron crear las vistas de versiones vigentes: {e}")
+
+    if particionar:
+        particionar_por_anio(engine)
+    return True
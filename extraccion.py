@@ -0,0 +1,682 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import pandas as pd
+
+from metricas import METRICAS
+from resiliencia import CortaCircuitos, PoliticaReintentos, clasificar_error, es_recuperable, reintentar
+
+# Número de hilos por defecto para la extracción concurrente
+MAX_WORKERS = 4
+
+# Presupuesto de llamadas al proveedor compartido por todos los hilos
+LLAMADAS_POR_SEGUNDO = 4.0
+
+# Pausa fija del modo serial clásico (sin limitador)
+PAUSA_SERIAL = 0.5
+
+# Histórico descargado para tickers nuevos o en recarga completa
+PERIODO_HISTORICO = "10y"
+
+# Precios sin ajustar por dividendos (Yahoo ya los da ajustados por splits):
+# así un dividendo nuevo no cambia las filas ya guardadas, y la serie ajustada
+# se construye a partir de los eventos guardados (ver ajustes.py)
+AJUSTE_AUTOMATICO = False
+
+# Control adaptativo del limitador ante límites del proveedor (AIMD): cada
+# HTTP 429 multiplica la tasa por FACTOR_FRENADO y cada acierto le suma
+# INCREMENTO_TASA de la tasa configurada, sin bajar de FRACCION_TASA_MINIMA
+FACTOR_FRENADO = 0.5
+INCREMENTO_TASA = 0.05
+FRACCION_TASA_MINIMA = 0.1
+
+# Motor de extracción: "hilos" (pool de hilos sobre yfinance) o "async"
+# (un solo hilo con peticiones HTTP concurrentes, ver extraccion_async.py)
+MOTORES = ("hilos", "async")
+MOTOR_EXTRACCION = "hilos"
+
+# Backend de descarga del histórico: "por_ticker" (Ticker.history) o "lote" (yf.download)
+BACKEND_HISTORIAL = "por_ticker"
+TAM_LOTE_HISTORIAL = 20
+
+# =============================================================================
+# PROVEEDOR POR DEFECTO: YAHOO FINANCE
+# =============================================================================
+# yfinance se importa al crear el primer Ticker real, no al importar el
+# módulo: el modo offline, --dry-run desde la caché o los benchmarks no pagan
+# su coste de importación.
+
+def ticker_yfinance(ticker):
+    """Crea un `yf.Ticker` importando yfinance solo cuando hace falta"""
+    import yfinance as yf
+    return yf.Ticker(ticker)
+
+def descargar_yfinance(*args, **kwargs):
+    """`yf.download` con importación diferida de yfinance"""
+    import yfinance as yf
+    return yf.download(*args, **kwargs)
+
+# =============================================================================
+# LIMITADOR DE TASA (TOKEN BUCKET)
+# =============================================================================
+
+class LimitadorTasa:
+    """Token bucket compartido entre hilos para no superar el límite del proveedor"""
+
+    def __init__(self, llamadas_por_segundo=LLAMADAS_POR_SEGUNDO, capacidad=None):
+        self.tasa = float(llamadas_por_segundo)
+        self.tasa_maxima = self.tasa
+        self.tasa_minima = self.tasa * FRACCION_TASA_MINIMA
+        self.capacidad = float(capacidad if capacidad is not None else max(1.0, self.tasa))
+        self._tokens = self.capacidad
+        self._ultimo = time.monotonic()
+        self._ultimo_frenado = float("-inf")
+        self._lock = threading.Lock()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def _reservar(self, tokens):
+        """Consume los tokens y devuelve 0, o devuelve cuánto falta para que los haya"""
+        with self._lock:
+            self._recargar()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self.tasa
+
+    def adquirir(self, tokens=1):
+        """Bloquea hasta que haya tokens disponibles y los consume"""
+        while True:
+            espera = self._reservar(tokens)
+            if not espera:
+                return
+            time.sleep(espera)
+
+    async def adquirir_async(self, tokens=1):
+        """Como `adquirir`, pero cede el bucle de eventos mientras espera"""
+        while True:
+            espera = self._reservar(tokens)
+            if not espera:
+                return
+            await asyncio.sleep(espera)
+
+    def frenar(self, factor=FACTOR_FRENADO):
+        """Reduce la tasa tras un límite del proveedor y vacía el cubo"""
+        with self._lock:
+            ahora = time.monotonic()
+            # Los 429 de las llamadas que ya estaban en vuelo cuentan como uno solo
+            if ahora - self._ultimo_frenado < max(1.0, 1.0 / self.tasa):
+                return self.tasa
+            self._recargar()
+            self._ultimo_frenado = ahora
+            self.tasa = max(self.tasa_minima, self.tasa * factor)
+            self._tokens = min(self._tokens, 0.0)
+            tasa = self.tasa
+        METRICAS.incrementar("frenadas_limitador")
+        print(f"🐢 Límite del proveedor: el limitador baja a {tasa:.2f} llamadas/s")
+        return tasa
+
+    def acelerar(self):
+        """Recupera la tasa poco a poco tras cada llamada correcta"""
+        with self._lock:
+            if self.tasa < self.tasa_maxima:
+                self._recargar()
+                self.tasa = min(self.tasa_maxima, self.tasa + self.tasa_maxima * INCREMENTO_TASA)
+
+# =============================================================================
+# ENVOLTORIOS DEL PROVEEDOR
+# =============================================================================
+
+class TickerEnvuelto:
+    """Proxy sobre un Ticker que intercepta los endpoints usados por el ETL.
+
+    Las subclases sobreescriben `_llamar` para añadir comportamiento (límite de
+    tasa, conteo, caché...) sin tocar `obtener_datos_accion`.
+    """
+
+    def __init__(self, ticker, fabrica):
+        self.ticker = ticker
+        self._fabrica = fabrica
+        self._obj = None
+
+    @property
+    def objeto(self):
+        # El Ticker real se crea solo cuando hace falta
+        if self._obj is None:
+            self._obj = self._fabrica(self.ticker)
+        return self._obj
+
+    def _llamar(self, endpoint, funcion, *args, **kwargs):
+        return funcion(*args, **kwargs)
+
+    def get_info(self):
+        return self._llamar("info", lambda: self.objeto.get_info())
+
+    def history(self, **kwargs):
+        return self._llamar("history", lambda **kw: self.objeto.history(**kw), **kwargs)
+
+    @property
+    def dividends(self):
+        return self._llamar("dividends", lambda: self.objeto.dividends)
+
+    @property
+    def splits(self):
+        return self._llamar("splits", lambda: self.objeto.splits)
+
+    @property
+    def recommendations(self):
+        return self._llamar("recommendations", lambda: self.objeto.recommendations)
+
+
+class _TickerLimitado(TickerEnvuelto):
+    def __init__(self, ticker, fabrica, limitador):
+        super().__init__(ticker, fabrica)
+        self._limitador = limitador
+
+    def _llamar(self, endpoint, funcion, *args, **kwargs):
+        self._limitador.adquirir()
+        return funcion(*args, **kwargs)
+
+
+class _TickerResiliente(TickerEnvuelto):
+    def __init__(self, ticker, fabrica, politica, circuitos, limitador):
+        super().__init__(ticker, fabrica)
+        self._politica = politica
+        self._circuitos = circuitos
+        self._limitador = limitador
+
+    def _llamar(self, endpoint, funcion, *args, **kwargs):
+        return reintentar(lambda: funcion(*args, **kwargs), self._politica, operacion=endpoint,
+                          descripcion=f"{self.ticker} {endpoint}", circuito=self._circuitos.circuito(endpoint),
+                          limitador=self._limitador)
+
+
+class ContadorLlamadas:
+    """Cuenta las llamadas al proveedor por (ticker, endpoint) durante una ejecución.
+
+    Distingue las llamadas lógicas (`registrar`, una por petición del ETL,
+    antes de los reintentos) de los intentos reales contra el proveedor
+    (`registrar_intento`, uno por cada reintento). La garantía de "cada
+    endpoint una sola vez por ticker" se verifica sobre las lógicas con los
+    mismos parámetros: un reintento no es una consulta repetida, y recargar
+    el histórico completo tras un split es otra petición distinta.
+    """
+
+    def __init__(self):
+        self._llamadas = {}
+        self._intentos = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, ticker, endpoint, parametros=None):
+        with self._lock:
+            clave = (ticker, endpoint, json.dumps(parametros or {}, sort_keys=True, default=str))
+            self._llamadas[clave] = self._llamadas.get(clave, 0) + 1
+
+    def registrar_intento(self, ticker, endpoint):
+        with self._lock:
+            clave = (ticker, endpoint)
+            self._intentos[clave] = self._intentos.get(clave, 0) + 1
+        METRICAS.incrementar("llamadas_proveedor", endpoint=endpoint)
+
+    def conteos(self):
+        """Llamadas lógicas por (ticker, endpoint)"""
+        conteos = {}
+        with self._lock:
+            for (ticker, endpoint, _), n in self._llamadas.items():
+                conteos[(ticker, endpoint)] = conteos.get((ticker, endpoint), 0) + n
+        return conteos
+
+    def intentos(self):
+        """Intentos reales contra el proveedor por (ticker, endpoint), reintentos incluidos"""
+        with self._lock:
+            return dict(self._intentos)
+
+    @staticmethod
+    def _por_endpoint(conteos):
+        totales = {}
+        for (_, endpoint), n in conteos.items():
+            totales[endpoint] = totales.get(endpoint, 0) + n
+        return totales
+
+    def total_por_endpoint(self):
+        return self._por_endpoint(self.conteos())
+
+    def intentos_por_endpoint(self):
+        return self._por_endpoint(self.intentos())
+
+    def duplicados(self):
+        """Devuelve las (ticker, endpoint) pedidas más de una vez con los mismos parámetros"""
+        duplicados = {}
+        with self._lock:
+            for (ticker, endpoint, _), n in self._llamadas.items():
+                if n > 1:
+                    duplicados[(ticker, endpoint)] = max(n, duplicados.get((ticker, endpoint), 0))
+        return duplicados
+
+    def resumen(self):
+        """Imprime las llamadas e intentos por endpoint y verifica que no haya repetidas"""
+        print("\n📡 Llamadas al proveedor por endpoint:")
+        llamadas, intentos = self.total_por_endpoint(), self.intentos_por_endpoint()
+        for endpoint in sorted(set(llamadas) | set(intentos)):
+            n, reales = llamadas.get(endpoint, 0), intentos.get(endpoint, 0)
+            detalle = f" ({reales} intentos)" if reales != n else ""
+            print(f"• {endpoint}: {n}{detalle}")
+        duplicados = self.duplicados()
+        if duplicados:
+            print(f"⚠️  {len(duplicados)} endpoints consultados más de una vez por ticker")
+            for (ticker, endpoint), n in sorted(duplicados.items()):
+                print(f"  - {ticker} {endpoint}: {n} llamadas")
+        else:
+            print("✅ Cada endpoint se consultó una sola vez por ticker")
+        return not duplicados
+
+
+class _TickerContado(TickerEnvuelto):
+    def __init__(self, ticker, fabrica, contador, intentos):
+        super().__init__(ticker, fabrica)
+        self._contador = contador
+        self._intentos = intentos
+
+    def _llamar(self, endpoint, funcion, *args, **kwargs):
+        if self._intentos:
+            self._contador.registrar_intento(self.ticker, endpoint)
+        else:
+            self._contador.registrar(self.ticker, endpoint, kwargs)
+        return funcion(*args, **kwargs)
+
+
+class ProveedorContado:
+    """Fábrica de tickers que registra cada llamada en un ContadorLlamadas.
+
+    Fuera de los reintentos registra llamadas lógicas; con `intentos=True`,
+    debajo de ellos, cada intento real.
+    """
+
+    def __init__(self, contador, proveedor=None, intentos=False):
+        self.contador = contador
+        self.proveedor = proveedor or ticker_yfinance
+        self.intentos = intentos
+
+    def __call__(self, ticker):
+        return _TickerContado(ticker, self.proveedor, self.contador, self.intentos)
+
+
+class ProveedorLimitado:
+    """Fábrica de tickers cuyas llamadas consumen tokens de un limitador compartido"""
+
+    def __init__(self, limitador, proveedor=None):
+        self.limitador = limitador
+        self.proveedor = proveedor or ticker_yfinance
+
+    def __call__(self, ticker):
+        return _TickerLimitado(ticker, self.proveedor, self.limitador)
+
+
+class ProveedorResiliente:
+    """Fábrica de tickers que reintentan con backoff y respetan el circuito de cada endpoint.
+
+    Debe envolver al proveedor limitado para que cada reintento consuma su
+    token; con el `limitador` se frena la tasa cuando el proveedor la limita.
+    """
+
+    def __init__(self, politica, circuitos, proveedor=None, limitador=None):
+        self.politica = politica
+        self.circuitos = circuitos
+        self.proveedor = proveedor or ticker_yfinance
+        self.limitador = limitador
+
+    def __call__(self, ticker):
+        return _TickerResiliente(ticker, self.proveedor, self.politica, self.circuitos, self.limitador)
+
+# =============================================================================
+# EXTRACCIÓN DE DATOS
+# =============================================================================
+
+def eventos_del_historial(historial, columna):
+    """Eventos de la columna "Dividends" o "Stock Splits" del histórico, como la serie de `Ticker.dividends`.
+
+    En modo incremental los eventos salen del histórico ya descargado: en
+    yfinance `Ticker.dividends` y `Ticker.splits` descargan el histórico
+    completo del ticker.
+    """
+    if historial is None or historial.empty or columna not in historial.columns:
+        return pd.Series(dtype=float, name=columna)
+    valores = pd.to_numeric(historial[columna], errors="coerce")
+    return valores[valores.fillna(0) != 0].astype(float).rename(columna)
+
+def registrar_error_endpoint(errores, ticker, endpoint, error):
+    """Anota el fallo de un endpoint secundario; el ticker sigue con ese dato vacío"""
+    clase = clasificar_error(error)
+    errores[endpoint] = clase
+    METRICAS.incrementar("errores_endpoint", endpoint=endpoint, clase=clase)
+    print(f"Error obteniendo {endpoint} para {ticker} ({clase}): {error}")
+
+def obtener_datos_accion(ticker, proveedor=None, pausa=PAUSA_SERIAL, desde=None, historial=None):
+    """Función para obtener todos los datos de una acción con mejor manejo de errores.
+
+    `proveedor` es cualquier callable ticker -> objeto con la interfaz de
+    `yf.Ticker` (get_info, history, dividends, splits, recommendations).
+    Si se indica `desde` (última fecha ya guardada) solo se descarga el
+    histórico posterior a esa fecha, y los dividendos y splits nuevos se
+    toman de sus columnas en lugar de sus endpoints; un split en ese tramo
+    obliga a recargar el histórico completo. `historial` es el histórico ya
+    descargado por lotes; si se pasa no se llama a `history` (salvo recarga
+    completa por split).
+    Si `info` o el histórico fallan por un error pasajero (límite del
+    proveedor, red, circuito abierto) devuelve None para que el ticker quede
+    pendiente en lugar de guardarse vacío; los fallos de los demás endpoints
+    quedan en `errores` ({endpoint: clase}).
+    """
+    errores = {}
+    try:
+        ticker_obj = (proveedor or ticker_yfinance)(ticker)
+        with METRICAS.medir("extraccion_endpoint", endpoint="info"):
+            info = ticker_obj.get_info()
+
+        # Pequeña pausa para no saturar la API (0 si ya hay un limitador compartido)
+        if pausa:
+            time.sleep(pausa)
+
+        def historial_completo():
+            with METRICAS.medir("extraccion_endpoint", endpoint="history"):
+                completo = ticker_obj.history(period=PERIODO_HISTORICO, auto_adjust=AJUSTE_AUTOMATICO)
+            METRICAS.incrementar("filas_descargadas", len(completo), endpoint="history")
+            return completo
+
+        # Obtener histórico con manejo de errores
+        incremental = desde is not None
+        try:
+            if historial is not None:
+                pass
+            elif desde is None:
+                historial = historial_completo()
+            elif desde + timedelta(days=1) > date.today():
+                historial = pd.DataFrame()
+                print(f"⏭️  {ticker} ya está al día ({desde})")
+            else:
+                with METRICAS.medir("extraccion_endpoint", endpoint="history"):
+                    historial = ticker_obj.history(start=(desde + timedelta(days=1)).isoformat(),
+                                                   auto_adjust=AJUSTE_AUTOMATICO)
+                METRICAS.incrementar("filas_descargadas", len(historial), endpoint="history")
+
+            # Un split en el tramo nuevo cambia la escala de todo el histórico guardado
+            if desde is not None and not eventos_del_historial(historial, "Stock Splits").empty:
+                print(f"✂️  Split reciente en {ticker}, se recarga el histórico completo")
+                historial = historial_completo()
+                desde = None
+            if historial.empty and desde is None:
+                print(f"Advertencia: Sin datos históricos para {ticker}")
+        except Exception as e:
+            print(f"Error obteniendo histórico para {ticker}: {e}")
+            if es_recuperable(e):
+                raise
+            historial = pd.DataFrame()
+
+        if incremental:
+            # Los eventos vienen en el histórico descargado (el tramo nuevo o el completo si hubo split)
+            splits = eventos_del_historial(historial, "Stock Splits")
+            dividendos = eventos_del_historial(historial, "Dividends")
+        else:
+            # Obtener splits y dividendos con manejo de errores
+            try:
+                with METRICAS.medir("extraccion_endpoint", endpoint="splits"):
+                    splits = ticker_obj.splits
+                if splits.empty:
+                    splits = pd.Series(dtype=float)
+            except Exception as e:
+                registrar_error_endpoint(errores, ticker, "splits", e)
+                splits = pd.Series(dtype=float)
+
+            try:
+                with METRICAS.medir("extraccion_endpoint", endpoint="dividends"):
+                    dividendos = ticker_obj.dividends
+                if dividendos.empty:
+                    dividendos = pd.Series(dtype=float)
+            except Exception as e:
+                registrar_error_endpoint(errores, ticker, "dividends", e)
+                dividendos = pd.Series(dtype=float)
+
+        # Obtener recomendaciones con manejo de errores
+        try:
+            with METRICAS.medir("extraccion_endpoint", endpoint="recommendations"):
+                recomendaciones = ticker_obj.recommendations
+            if recomendaciones is None or recomendaciones.empty:
+                recomendaciones = pd.DataFrame()
+        except Exception as e:
+            registrar_error_endpoint(errores, ticker, "recommendations", e)
+            recomendaciones = pd.DataFrame()
+
+        return {
+            "ticker": ticker,
+            "desde": desde,  # None = histórico completo
+            "info": info,
+            "historial": historial,
+            "dividendos": dividendos,
+            "splits": splits,
+            "recomendaciones": recomendaciones,
+            "errores": errores
+        }
+    except Exception as e:
+        print(f"Error crítico obteniendo datos para {ticker}: {e}")
+        METRICAS.incrementar("tickers_fallidos")
+        return None
+
+# =============================================================================
+# DESCARGA DE HISTÓRICO POR LOTES
+# =============================================================================
+
+def descargar_historial_lote(tickers, descargador=None, **kwargs):
+    """Descarga el histórico de varios tickers en una sola llamada y lo separa por ticker.
+
+    `descargador` tiene la firma de `yf.download`; devuelve {ticker: DataFrame}
+    con las mismas columnas que `Ticker.history` y solo los días en que
+    cotizó cada ticker.
+    """
+    descargador = descargador or descargar_yfinance
+    datos = descargador(
+        list(tickers),
+        group_by="ticker",
+        auto_adjust=AJUSTE_AUTOMATICO,
+        actions=True,
+        threads=False,
+        progress=False,
+        **kwargs
+    )
+    resultado = {}
+    for ticker in tickers:
+        if datos is None or datos.empty:
+            resultado[ticker] = pd.DataFrame()
+            continue
+        if isinstance(datos.columns, pd.MultiIndex):
+            if ticker not in datos.columns.get_level_values(0):
+                resultado[ticker] = pd.DataFrame()
+                continue
+            historial = datos[ticker]
+        else:
+            historial = datos
+        precios = [c for c in ("Open", "High", "Low", "Close") if c in historial.columns]
+        # Los días en que solo cotizaron otros tickers del lote vienen vacíos
+        historial = historial.dropna(how="all", subset=precios)
+        historial.index.name = "Date"
+        historial.columns.name = None
+        resultado[ticker] = historial
+    return resultado
+
+def _agrupar_lotes(lista_acciones, ultimas_fechas, tam_lote):
+    """Agrupa los tickers por mercado y tipo de descarga (completa o incremental)"""
+    grupos = {}
+    for accion in lista_acciones:
+        desde = ultimas_fechas.get(accion["ticker"])
+        if desde is not None and desde + timedelta(days=1) > date.today():
+            continue  # Ya está al día, no hace falta descargar nada
+        clave = (accion["mercado"], desde is None)
+        grupos.setdefault(clave, []).append(accion["ticker"])
+
+    lotes = []
+    for (mercado, completo), tickers in grupos.items():
+        for i in range(0, len(tickers), tam_lote):
+            lote = tickers[i:i + tam_lote]
+            if completo:
+                kwargs = {"period": PERIODO_HISTORICO}
+            else:
+                # Un solo inicio por lote: el más antiguo; el resto se recorta después
+                inicio = min(ultimas_fechas[t] for t in lote) + timedelta(days=1)
+                kwargs = {"start": inicio.isoformat()}
+            lotes.append((mercado, lote, kwargs))
+    return lotes
+
+def precargar_historiales(lista_acciones, ultimas_fechas=None, tam_lote=TAM_LOTE_HISTORIAL,
+                          descargador=None, limitador=None, contador=None, cache=None, solo_cache=False,
+                          politica_reintentos=None, circuitos=None):
+    """Descarga por lotes de mercado el histórico de todos los tickers.
+
+    Devuelve {ticker: historial}; los tickers cuyo lote falla (agotados los
+    reintentos) no aparecen y se descargan después con el camino por ticker.
+    """
+    ultimas_fechas = ultimas_fechas or {}
+    circuitos = circuitos or CortaCircuitos()
+
+    def _descargar(lote, kwargs):
+        # Cada intento consume su token y cuenta como intento real
+        if limitador is not None:
+            limitador.adquirir()
+        if contador is not None:
+            for ticker in lote:
+                contador.registrar_intento(ticker, "download")
+        return descargar_historial_lote(lote, descargador, **kwargs)
+
+    historiales = {}
+    for mercado, lote, kwargs in _agrupar_lotes(lista_acciones, ultimas_fechas, tam_lote):
+        clave_lote = ",".join(lote)
+        try:
+            encontrado = False
+            if cache is not None:
+                encontrado, descargados = cache.leer(clave_lote, "download", kwargs, ignorar_ttl=solo_cache)
+            if not encontrado:
+                if solo_cache:
+                    print(f"⚠️  Lote de {mercado} no está en la caché (modo offline)")
+                    continue
+                print(f"📦 Descargando histórico por lote: {len(lote)} tickers de {mercado}...")
+                if contador is not None:
+                    for ticker in lote:
+                        contador.registrar(ticker, "download", kwargs)
+                with METRICAS.medir("extraccion_endpoint", endpoint="download"):
+                    descargados = reintentar(lambda: _descargar(lote, kwargs), politica_reintentos,
+                                             operacion="download", descripcion=f"lote de {mercado}",
+                                             circuito=circuitos.circuito("download"), limitador=limitador)
+                METRICAS.incrementar("filas_descargadas", sum(len(h) for h in descargados.values()),
+                                     endpoint="download")
+                if cache is not None:
+                    cache.guardar(clave_lote, "download", descargados, kwargs)
+        except Exception as e:
+            print(f"Error descargando lote de {mercado} ({clave_lote}): {e}")
+            continue
+
+        for ticker in lote:
+            historial = descargados.get(ticker, pd.DataFrame())
+            desde = ultimas_fechas.get(ticker)
+            if desde is not None and not historial.empty:
+                fechas = historial.index.tz_localize(None) if historial.index.tz is not None else historial.index
+                historial = historial[fechas.normalize() > pd.Timestamp(desde)]
+            historiales[ticker] = historial
+    return historiales
+
+def extraer_datos_acciones(lista_acciones, max_workers=MAX_WORKERS, limitador=None, proveedor=None,
+                           contador=None, cache=None, solo_cache=False, ultimas_fechas=None,
+                           backend_historial=BACKEND_HISTORIAL, descargador=None, politica_reintentos=None,
+                           circuitos=None, motor=MOTOR_EXTRACCION):
+    """Extrae los datos de todas las acciones con un pool acotado de hilos.
+
+    Todos los hilos comparten el mismo `limitador`, de modo que el número de
+    hilos solo aumenta el solapamiento de la espera de red, no la tasa de
+    llamadas. Con `max_workers=1` y sin limitador se comporta como el bucle
+    serial original. Si se pasa un `contador`, cada llamada al proveedor
+    queda registrada en él, y aparte cada intento real. Con una `cache`
+    (CacheRespuestas) las respuestas vigentes no llegan a la red ni
+    consumen tokens; con `solo_cache=True` no se hace ninguna llamada
+    real. `ultimas_fechas` ({ticker: fecha}) activa la
+    descarga incremental del histórico. Con `backend_historial="lote"` el
+    histórico se pide antes, varios tickers por llamada (`descargador`, con la
+    firma de `yf.download`). Las llamadas reales se reintentan según
+    `politica_reintentos` (PoliticaReintentos) y cada endpoint tiene su
+    circuito en `circuitos` (CortaCircuitos); si no se pasan se crean con los
+    valores por defecto. Con `motor="async"` (y acceso a la red) la
+    extracción la hace `extraer_datos_acciones_async` contra la API HTTP de
+    Yahoo, sin `proveedor` ni `descargador`. Devuelve {ticker: datos} en el
+    orden de `lista_acciones`.
+    """
+    if backend_historial not in ("por_ticker", "lote"):
+        raise ValueError(f"Backend de histórico desconocido: {backend_historial}")
+    if motor not in MOTORES:
+        raise ValueError(f"Motor de extracción desconocido: {motor}")
+    if motor == "async" and not solo_cache:
+        # Importación local: extraccion_async depende de este módulo
+        from extraccion_async import extraer_datos_acciones_async
+        return extraer_datos_acciones_async(
+            lista_acciones, limitador=limitador, contador=contador, cache=cache, ultimas_fechas=ultimas_fechas,
+            politica_reintentos=politica_reintentos, circuitos=circuitos
+        )
+    proveedor = proveedor or ticker_yfinance
+    if contador is not None:
+        proveedor = ProveedorContado(contador, proveedor, intentos=True)
+    if limitador is None and max_workers > 1 and not solo_cache:
+        limitador = LimitadorTasa()
+    if limitador is not None:
+        proveedor = ProveedorLimitado(limitador, proveedor)
+    politica_reintentos = politica_reintentos or PoliticaReintentos()
+    circuitos = circuitos or CortaCircuitos()
+    if not solo_cache:
+        proveedor = ProveedorResiliente(politica_reintentos, circuitos, proveedor, limitador)
+    if contador is not None:
+        # Por encima de los reintentos: una llamada lógica por petición
+        proveedor = ProveedorContado(contador, proveedor)
+    if cache is not None:
+        # Importación local: cache_proveedor depende de este módulo
+        from cache_proveedor import ProveedorCacheado
+        proveedor = ProveedorCacheado(cache, proveedor, solo_cache=solo_cache)
+    pausa = 0 if limitador is not None or solo_cache else PAUSA_SERIAL
+
+    historiales = {}
+    if backend_historial == "lote":
+        historiales = precargar_historiales(
+            lista_acciones, ultimas_fechas, descargador=descargador, limitador=limitador,
+            contador=contador, cache=cache, solo_cache=solo_cache,
+            politica_reintentos=politica_reintentos, circuitos=circuitos
+        )
+
+    def _extraer(accion):
+        print(f"Extrayendo datos para {accion['ticker']} ({accion['mercado']})...")
+        desde = (ultimas_fechas or {}).get(accion["ticker"])
+        return obtener_datos_accion(accion["ticker"], proveedor, pausa, desde,
+                                    historiales.get(accion["ticker"]))
+
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futuros = {pool.submit(_extraer, accion): accion for accion in lista_acciones}
+        for futuro in as_completed(futuros):
+            accion = futuros[futuro]
+            resultados[accion["ticker"]] = futuro.result()
+
+    datos_acciones = {}
+    for accion in lista_acciones:
+        ticker = accion["ticker"]
+        datos = resultados.get(ticker)
+        if datos:
+            # Agregar información del mercado a los datos
+            datos["mercado"] = accion["mercado"]
+            datos_acciones[ticker] = datos
+        else:
+            print(f"No se pudieron obtener datos para {ticker}")
+    incompletos = [ticker for ticker, datos in datos_acciones.items() if datos.get("errores")]
+    if incompletos:
+        print(f"⚠️  {len(incompletos)} tickers con algún endpoint secundario vacío por errores: "
+              f"{', '.join(incompletos)}")
+    circuitos.resumen()
+    return datos_acciones
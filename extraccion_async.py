@@ -0,0 +1,370 @@
+import asyncio
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from extraccion import (AJUSTE_AUTOMATICO, PERIODO_HISTORICO, LimitadorTasa, eventos_del_historial,
+                        registrar_error_endpoint)
+from metricas import METRICAS
+from resiliencia import CortaCircuitos, PoliticaReintentos, es_recuperable, reintentar_async
+
+# API HTTP de Yahoo Finance (la misma que usa yfinance); se puede apuntar a un servidor local
+URL_YAHOO = "https://query2.finance.yahoo.com"
+
+# Yahoo exige una cookie de sesión (se obtiene de esta URL) y un "crumb" ligado a ella
+URL_COOKIE = "https://fc.yahoo.com"
+
+# Peticiones HTTP en vuelo a la vez; todas comparten un único pool de conexiones keep-alive
+MAX_CONCURRENCIA = 64
+
+# Segundos máximos por petición (conexión + respuesta)
+TIMEOUT_PETICION = 30
+
+# Módulos de quoteSummary que yfinance reúne en `get_info`
+MODULOS_INFO = "financialData,quoteType,defaultKeyStatistics,assetProfile,summaryDetail"
+
+COLUMNAS_HISTORIAL = ["Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits"]
+COLUMNAS_RECOMENDACIONES = ["period", "strongBuy", "buy", "hold", "sell", "strongSell"]
+
+CABECERAS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"),
+    "Accept": "application/json"
+}
+
+# =============================================================================
+# RESPUESTAS DE YAHOO -> OBJETOS CON LA FORMA DE yfinance
+# =============================================================================
+
+def _valor_crudo(valor):
+    # quoteSummary envuelve los números en {"raw": 1.5, "fmt": "1.50"}
+    if isinstance(valor, dict):
+        return valor.get("raw") if valor else None
+    return valor
+
+def aplanar_info(modulos, cotizacion=None):
+    """Une los módulos de quoteSummary y la cotización v7 en un dict plano como `Ticker.get_info()`"""
+    info = {}
+    for contenido in modulos.values():
+        if not isinstance(contenido, dict):
+            continue
+        for clave, valor in contenido.items():
+            if isinstance(valor, dict) and valor and "raw" not in valor:
+                continue  # Submódulos anidados que get_info tampoco aplana
+            info.setdefault(clave, _valor_crudo(valor))
+    for clave, valor in (cotizacion or {}).items():
+        info.setdefault(clave, valor)
+    return info
+
+def _fechas_locales(marcas, zona):
+    """Marcas de tiempo Unix -> sesión (medianoche) en la zona horaria de la bolsa"""
+    return pd.to_datetime(np.asarray(marcas, dtype="int64"), unit="s", utc=True).tz_convert(zona).normalize()
+
+def eventos_desde_chart(resultado, tipo):
+    """Serie de dividendos (`tipo="dividends"`) o splits (`"splits"`) de una respuesta de chart"""
+    zona = resultado.get("meta", {}).get("exchangeTimezoneName", "UTC")
+    eventos = (resultado.get("events") or {}).get(tipo) or {}
+    nombre = "Dividends" if tipo == "dividends" else "Stock Splits"
+    if not eventos:
+        return pd.Series(dtype=float, name=nombre)
+    eventos = sorted(eventos.values(), key=lambda e: e["date"])
+    if tipo == "dividends":
+        valores = [e["amount"] for e in eventos]
+    else:
+        valores = [e["numerator"] / e["denominator"] for e in eventos]
+    serie = pd.Series(valores, index=_fechas_locales([e["date"] for e in eventos], zona), name=nombre,
+                      dtype=float)
+    serie.index.name = "Date"
+    return serie[~serie.index.duplicated(keep="last")]
+
+def historial_desde_chart(resultado, auto_ajuste=True):
+    """DataFrame como `Ticker.history()`: OHLCV (ajustado si `auto_ajuste`), dividendos y splits, índice en hora local"""
+    marcas = resultado.get("timestamp") or []
+    if not marcas:
+        return pd.DataFrame(columns=COLUMNAS_HISTORIAL)
+    zona = resultado.get("meta", {}).get("exchangeTimezoneName", "UTC")
+    cotizacion = resultado["indicators"]["quote"][0]
+    historial = pd.DataFrame({
+        columna: pd.to_numeric(pd.Series(cotizacion.get(columna.lower()), dtype=object), errors="coerce").to_numpy()
+        for columna in ("Open", "High", "Low", "Close", "Volume")
+    }, index=_fechas_locales(marcas, zona))
+    historial.index.name = "Date"
+
+    cierre_ajustado = (resultado["indicators"].get("adjclose") or [{}])[0].get("adjclose")
+    if auto_ajuste and cierre_ajustado:
+        # Igual que auto_adjust=True en yfinance: OHLC escalados por cierre ajustado / cierre
+        ajustado = pd.to_numeric(pd.Series(cierre_ajustado, dtype=object), errors="coerce").to_numpy()
+        factor = ajustado / historial["Close"].to_numpy()
+        for columna in ("Open", "High", "Low"):
+            historial[columna] = historial[columna] * factor
+        historial["Close"] = ajustado
+
+    # Las sesiones sin precios se conservan, como en history(); la transformación rellena los nulos
+    historial = historial[~historial.index.duplicated(keep="last")]
+    historial["Volume"] = historial["Volume"].fillna(0).astype("int64")
+    for columna, tipo in (("Dividends", "dividends"), ("Stock Splits", "splits")):
+        historial[columna] = eventos_desde_chart(resultado, tipo).reindex(historial.index).fillna(0.0)
+    return historial
+
+def recomendaciones_desde_quote_summary(modulos):
+    """DataFrame como `Ticker.recommendations` a partir del módulo recommendationTrend"""
+    tendencia = (modulos.get("recommendationTrend") or {}).get("trend") or []
+    if not tendencia:
+        return pd.DataFrame()
+    return pd.DataFrame(tendencia).reindex(columns=COLUMNAS_RECOMENDACIONES)
+
+# =============================================================================
+# CLIENTE HTTP ASÍNCRONO
+# =============================================================================
+
+class ClienteYahooAsync:
+    """Endpoints de Yahoo Finance sobre una sola sesión aiohttp con conexiones reutilizadas.
+
+    Cada endpoint lógico (info, history, dividends, splits, recommendations)
+    pasa por la caché, el semáforo de concurrencia, el limitador de tasa, el
+    contador de llamadas y los reintentos con circuito por endpoint, igual
+    que en el motor por hilos.
+    """
+
+    def __init__(self, sesion, url_base=URL_YAHOO, max_concurrencia=MAX_CONCURRENCIA, limitador=None,
+                 contador=None, cache=None, politica_reintentos=None, circuitos=None):
+        self.sesion = sesion
+        self.url_base = url_base.rstrip("/")
+        self.limitador = limitador
+        self.contador = contador
+        self.cache = cache
+        self.politica = politica_reintentos or PoliticaReintentos()
+        self.circuitos = circuitos or CortaCircuitos()
+        self.crumb = None
+        self._semaforo = asyncio.Semaphore(max_concurrencia)
+
+    async def iniciar_sesion(self, url_cookie=URL_COOKIE):
+        """Obtiene la cookie y el crumb que Yahoo pide en quoteSummary y quote"""
+        if url_cookie:
+            try:
+                async with self.sesion.get(url_cookie, allow_redirects=True):
+                    pass  # Solo interesa la cookie; la página suele responder 404
+            except Exception as e:
+                print(f"⚠️  No se pudo obtener la cookie de Yahoo: {e}")
+        try:
+            self.crumb = await reintentar_async(lambda: self._texto(f"{self.url_base}/v1/test/getcrumb"),
+                                                self.politica, operacion="crumb", descripcion="Crumb de Yahoo")
+        except Exception as e:
+            print(f"⚠️  No se pudo obtener el crumb de Yahoo, info y recomendaciones pueden fallar: {e}")
+
+    async def _texto(self, url):
+        async with self._semaforo, self.sesion.get(url) as respuesta:
+            respuesta.raise_for_status()
+            return (await respuesta.text()).strip()
+
+    async def _json(self, ticker, endpoint, ruta, parametros):
+        """Una petición HTTP real: token del limitador, conteo y JSON de la respuesta"""
+        if self.limitador is not None:
+            await self.limitador.adquirir_async()
+        if self.contador is not None:
+            self.contador.registrar_intento(ticker, endpoint)
+        if self.crumb:
+            parametros = dict(parametros, crumb=self.crumb)
+        async with self._semaforo, self.sesion.get(f"{self.url_base}{ruta}", params=parametros) as respuesta:
+            respuesta.raise_for_status()
+            return await respuesta.json(content_type=None)
+
+    async def _llamar(self, ticker, endpoint, kwargs, funcion):
+        """Caché -> reintentos con circuito -> `funcion()`; `kwargs` identifica la respuesta en la caché"""
+        if self.cache is not None:
+            encontrado, valor = self.cache.leer(ticker, endpoint, kwargs)
+            if encontrado:
+                return valor
+        if self.contador is not None:
+            self.contador.registrar(ticker, endpoint, kwargs)
+        with METRICAS.medir("extraccion_endpoint", endpoint=endpoint, motor="async"):
+            valor = await reintentar_async(funcion, self.politica, operacion=endpoint,
+                                           descripcion=f"{ticker} {endpoint}",
+                                           circuito=self.circuitos.circuito(endpoint), limitador=self.limitador)
+        if self.cache is not None:
+            self.cache.guardar(ticker, endpoint, valor, kwargs)
+        return valor
+
+    async def _chart(self, ticker, endpoint, parametros):
+        respuesta = await self._json(ticker, endpoint, f"/v8/finance/chart/{ticker}", parametros)
+        return respuesta["chart"]["result"][0]
+
+    async def _quote_summary(self, ticker, endpoint, modulos):
+        respuesta = await self._json(ticker, endpoint, f"/v10/finance/quoteSummary/{ticker}",
+                                     {"modules": modulos})
+        return respuesta["quoteSummary"]["result"][0]
+
+    async def _info(self, ticker):
+        # quoteSummary y la cotización v7 van a la vez; juntas dan las mismas claves que get_info
+        modulos, cotizacion = await asyncio.gather(
+            self._quote_summary(ticker, "info", MODULOS_INFO),
+            self._json(ticker, "quote", "/v7/finance/quote", {"symbols": ticker})
+        )
+        resultado = cotizacion.get("quoteResponse", {}).get("result") or [{}]
+        return aplanar_info(modulos, resultado[0])
+
+    def get_info(self, ticker):
+        return self._llamar(ticker, "info", {}, lambda: self._info(ticker))
+
+    def history(self, ticker, **kwargs):
+        parametros = {"interval": "1d", "events": "div,splits", "includeAdjustedClose": "true"}
+        if "start" in kwargs:
+            # Medianoche UTC, como yfinance: no depende de la zona horaria de la máquina
+            inicio = datetime.combine(date.fromisoformat(kwargs["start"]), datetime.min.time(), tzinfo=timezone.utc)
+            parametros.update(period1=int(inicio.timestamp()), period2=int(time.time()))
+        else:
+            parametros["range"] = kwargs.get("period", PERIODO_HISTORICO)
+
+        async def pedir():
+            return historial_desde_chart(await self._chart(ticker, "history", parametros),
+                                         auto_ajuste=kwargs.get("auto_adjust", True))
+        return self._llamar(ticker, "history", kwargs, pedir)
+
+    def _eventos(self, ticker, tipo):
+        # Todo el histórico de eventos con velas trimestrales: respuesta pequeña
+        parametros = {"range": "max", "interval": "3mo", "events": "div" if tipo == "dividends" else "splits"}
+
+        async def pedir():
+            return eventos_desde_chart(await self._chart(ticker, tipo, parametros), tipo)
+        return self._llamar(ticker, tipo, {}, pedir)
+
+    def dividends(self, ticker):
+        return self._eventos(ticker, "dividends")
+
+    def splits(self, ticker):
+        return self._eventos(ticker, "splits")
+
+    def recommendations(self, ticker):
+        async def pedir():
+            return recomendaciones_desde_quote_summary(
+                await self._quote_summary(ticker, "recommendations", "recommendationTrend"))
+        return self._llamar(ticker, "recommendations", {}, pedir)
+
+# =============================================================================
+# EXTRACCIÓN ASÍNCRONA
+# =============================================================================
+
+async def obtener_datos_accion_async(ticker, cliente, desde=None):
+    """Equivalente asíncrono de `obtener_datos_accion`: mismo dict, mismas reglas de error.
+
+    Los endpoints del ticker se piden a la vez. Con `desde` los dividendos
+    y splits nuevos salen del tramo de histórico descargado, y si hay un
+    split en él se vuelve a pedir el histórico completo.
+    """
+    errores = {}
+    if desde is not None and desde + timedelta(days=1) > date.today():
+        print(f"⏭️  {ticker} ya está al día ({desde})")
+        peticion_historial = asyncio.sleep(0, pd.DataFrame())
+    elif desde is not None:
+        peticion_historial = cliente.history(ticker, start=(desde + timedelta(days=1)).isoformat(),
+                                             auto_adjust=AJUSTE_AUTOMATICO)
+    else:
+        peticion_historial = cliente.history(ticker, period=PERIODO_HISTORICO, auto_adjust=AJUSTE_AUTOMATICO)
+
+    if desde is None:
+        peticion_splits, peticion_dividendos = cliente.splits(ticker), cliente.dividends(ticker)
+    else:
+        # En incremental los eventos salen del histórico: no se piden sus endpoints
+        peticion_splits, peticion_dividendos = asyncio.sleep(0, None), asyncio.sleep(0, None)
+
+    info, splits, historial, dividendos, recomendaciones = await asyncio.gather(
+        cliente.get_info(ticker), peticion_splits, peticion_historial, peticion_dividendos,
+        cliente.recommendations(ticker), return_exceptions=True
+    )
+    try:
+        if isinstance(info, Exception):
+            raise info
+
+        if (desde is not None and not isinstance(historial, Exception)
+                and not eventos_del_historial(historial, "Stock Splits").empty):
+            print(f"✂️  Split reciente en {ticker}, se recarga el histórico completo")
+            desde = None
+            historial = await asyncio.gather(cliente.history(ticker, period=PERIODO_HISTORICO,
+                                                             auto_adjust=AJUSTE_AUTOMATICO),
+                                             return_exceptions=True)
+            historial = historial[0]
+
+        if isinstance(historial, Exception):
+            print(f"Error obteniendo histórico para {ticker}: {historial}")
+            if es_recuperable(historial):
+                raise historial
+            historial = pd.DataFrame()
+        if historial.empty and desde is None:
+            print(f"Advertencia: Sin datos históricos para {ticker}")
+        METRICAS.incrementar("filas_descargadas", len(historial), endpoint="history")
+
+        if splits is None:
+            # Los eventos vienen en el histórico descargado (el tramo nuevo o el completo si hubo split)
+            splits = eventos_del_historial(historial, "Stock Splits")
+            dividendos = eventos_del_historial(historial, "Dividends")
+        if isinstance(splits, Exception):
+            registrar_error_endpoint(errores, ticker, "splits", splits)
+            splits = pd.Series(dtype=float)
+        if isinstance(dividendos, Exception):
+            registrar_error_endpoint(errores, ticker, "dividends", dividendos)
+            dividendos = pd.Series(dtype=float)
+
+        if isinstance(recomendaciones, Exception):
+            registrar_error_endpoint(errores, ticker, "recommendations", recomendaciones)
+            recomendaciones = pd.DataFrame()
+
+        return {
+            "ticker": ticker,
+            "desde": desde,  # None = histórico completo
+            "info": info,
+            "historial": historial,
+            "dividendos": dividendos if not dividendos.empty else pd.Series(dtype=float),
+            "splits": splits if not splits.empty else pd.Series(dtype=float),
+            "recomendaciones": recomendaciones,
+            "errores": errores
+        }
+    except Exception as e:
+        print(f"Error crítico obteniendo datos para {ticker}: {e}")
+        METRICAS.incrementar("tickers_fallidos")
+        return None
+
+async def _extraer_async(lista_acciones, ultimas_fechas, url_base, url_cookie, max_concurrencia, **opciones):
+    import aiohttp
+
+    conector = aiohttp.TCPConnector(limit=max_concurrencia, ttl_dns_cache=300, keepalive_timeout=30)
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT_PETICION)
+    async with aiohttp.ClientSession(connector=conector, timeout=timeout, headers=CABECERAS) as sesion:
+        cliente = ClienteYahooAsync(sesion, url_base, max_concurrencia, **opciones)
+        await cliente.iniciar_sesion(url_cookie)
+        resultados = await asyncio.gather(*(
+            obtener_datos_accion_async(accion["ticker"], cliente, ultimas_fechas.get(accion["ticker"]))
+            for accion in lista_acciones
+        ))
+        cliente.circuitos.resumen()
+    return resultados
+
+def extraer_datos_acciones_async(lista_acciones, max_concurrencia=MAX_CONCURRENCIA, limitador=None, contador=None,
+                                 cache=None, ultimas_fechas=None, politica_reintentos=None, circuitos=None,
+                                 url_base=URL_YAHOO, url_cookie=None):
+    """Extrae todos los tickers desde un solo hilo con peticiones HTTP concurrentes.
+
+    Devuelve lo mismo que `extraer_datos_acciones` ({ticker: datos} en el
+    orden de `lista_acciones`). `max_concurrencia` acota las peticiones en
+    vuelo y las conexiones del pool; el `limitador` sigue marcando la tasa.
+    La cookie de Yahoo solo se pide contra la API real (`url_cookie` por
+    defecto); un servidor local no la necesita. Requiere aiohttp.
+    """
+    if url_cookie is None and url_base == URL_YAHOO:
+        url_cookie = URL_COOKIE
+    if limitador is None:
+        limitador = LimitadorTasa()
+    resultados = asyncio.run(_extraer_async(
+        lista_acciones, ultimas_fechas or {}, url_base, url_cookie, max_concurrencia, limitador=limitador,
+        contador=contador, cache=cache, politica_reintentos=politica_reintentos, circuitos=circuitos
+    ))
+
+    datos_acciones = {}
+    for accion, datos in zip(lista_acciones, resultados):
+        if datos:
+            datos["mercado"] = accion["mercado"]
+            datos_acciones[accion["ticker"]] = datos
+        else:
+            print(f"No se pudieron obtener datos para {accion['ticker']}")
+    return datos_acciones
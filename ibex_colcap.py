@@ -1,12 +1,25 @@
-import yfinance as yf
+import argparse
+import sys
+import zlib
+from datetime import date, timedelta
+
 import pandas as pd
-from sqlalchemy import create_engine, types, text
+from sqlalchemy import create_engine, text
 from sqlalchemy.exc import SQLAlchemyError
-import sys
-import time
-import numpy as np
-import mysql.connector
-from mysql.connector import Error
+
+from cache_proveedor import CacheRespuestas
+from cola_trabajo import RUTA_COLA, ejecutar_multiproceso
+from almacenamiento import DESTINOS, AlmacenamientoSQL, crear_almacenamiento, migrar_recomendaciones
+from ajustes import TABLAS_AJUSTES, marcar_precios_sin_ajustar, precios_por_migrar
+from analitica import TABLAS_ANALITICA, actualizar_analitica
+from carga import verificar_duplicados
+from esquema import crear_esquema, metadata
+from pipeline import pipeline_streaming
+from extraccion import MOTORES, ContadorLlamadas, LimitadorTasa, extraer_datos_acciones
+from metricas import METRICAS, RUTA_INFORME_JSON, RUTA_PROMETHEUS
+from registro_ejecuciones import RUTA_REGISTRO, RegistroEjecuciones
+from resiliencia import POLITICA_BD, CortaCircuitos, reintentar
+from transformacion import construir_tablas, informe_memoria
 
 # Configuración de pandas
 pd.set_option('display.max_rows', None)
@@ -32,12 +45,6 @@ mercados = {
     ]
 }
 
-# Crear lista única de todos los tickers con su mercado
-lista_acciones = []
-for mercado, tickers in mercados.items():
-    for ticker in tickers:
-        lista_acciones.append({"ticker": ticker, "mercado": mercado})
-
 # Configuración de la conexión a MySQL (XAMPP)
 DB_USER = "root"
 DB_PASSWORD = ""
@@ -45,12 +52,92 @@ DB_HOST = "127.0.0.1"
 DB_NAME = "colcap_ibex"  # Cambiado a nombre más genérico
 DB_PORT = '3306'
 
+# Configuración de la extracción concurrente
+MAX_WORKERS_EXTRACCION = 4  # 1 = modo serial clásico con pausa fija
+LLAMADAS_POR_SEGUNDO = 4.0  # Límite compartido por todos los hilos
+BACKEND_HISTORIAL = "por_ticker"  # "lote" = varios tickers por descarga, agrupados por mercado
+MOTOR_EXTRACCION = "hilos"  # "async" = un hilo con peticiones HTTP concurrentes (requiere aiohttp)
+
+# Caché local de respuestas de Yahoo Finance
+USAR_CACHE = True
+RUTA_CACHE = "cache_yfinance.sqlite"
+MODO_OFFLINE = False  # True = repetir desde la caché sin tocar la red
+
+# Descargar solo el histórico posterior a la última fecha guardada por ticker
+MODO_INCREMENTAL = True
+
+# Escritura: "upsert" (staging + clave única en la base de datos) o "append" (filtrado en Python)
+MODO_ESCRITURA = "upsert"
+
+# Inserción masiva: "multi", "executemany" o "load_data" (LOAD DATA LOCAL INFILE, solo MySQL)
+ESTRATEGIA_CARGA = "executemany"
+
+# Particionar mercado_diario por año (solo MySQL)
+PARTICIONAR_MERCADO_DIARIO = False
+
+# Extraer, transformar y cargar por lotes de tickers en lugar de todo a la vez
+MODO_STREAMING = False
+TAM_LOTE_STREAMING = 5
+
+# Destino de la carga: "mysql", "parquet" (particionado mercado/ticker/año) o "duckdb"
+DESTINO = "mysql"
+
+# Procesos trabajadores por defecto (1 = todo en este proceso, con hilos)
+PROCESOS = 1
+
+# Recalcular la serie ajustada, rendimientos, medias, volatilidad y correlaciones tras la carga
+# (solo las fechas nuevas y los tickers con eventos nuevos)
+CALCULAR_ANALITICA = True
+
+# Tablas de salida, en el orden en que se guardan (las derivadas se calculan después, desde el destino)
+TABLAS_SALIDA = [tabla for tabla in metadata.tables if tabla not in TABLAS_AJUSTES + TABLAS_ANALITICA]
+
+# =============================================================================
+# SELECCIÓN DE TICKERS
+# =============================================================================
+
+def parsear_shard(valor):
+    """Convierte "i/N" en (i, N), con 0 <= i < N"""
+    try:
+        indice, total = (int(parte) for parte in valor.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard inválido '{valor}', se espera i/N (p. ej. 0/4)")
+    if total < 1 or not 0 <= indice < total:
+        raise argparse.ArgumentTypeError(f"Shard inválido '{valor}': debe cumplirse 0 <= i < N")
+    return indice, total
+
+def en_shard(ticker, shard):
+    """Asignación estable de un ticker a un shard (no depende del orden ni del proceso)"""
+    indice, total = shard
+    return zlib.crc32(ticker.encode("utf-8")) % total == indice
+
+def construir_lista_acciones(mercados_elegidos=None, tickers=None, shard=None):
+    """Crea la lista de tickers con su mercado, filtrada por mercado, ticker y shard"""
+    lista_acciones = []
+    for mercado, tickers_mercado in mercados.items():
+        if mercados_elegidos and mercado not in mercados_elegidos:
+            continue
+        for ticker in tickers_mercado:
+            if tickers and ticker not in tickers:
+                continue
+            if shard is not None and not en_shard(ticker, shard):
+                continue
+            lista_acciones.append({"ticker": ticker, "mercado": mercado})
+    return lista_acciones
+
+# Lista completa de todos los tickers con su mercado
+lista_acciones = construir_lista_acciones()
+
 # =============================================================================
 # FUNCIONES DE CONEXIÓN MEJORADAS
 # =============================================================================
 
 def verificar_mysql():
     """Verifica si MySQL está corriendo antes de intentar conectar"""
+    # Importación diferida: solo hace falta cuando se escribe en MySQL
+    import mysql.connector
+    from mysql.connector import Error
+
     try:
         connection = mysql.connector.connect(
             host=DB_HOST,
@@ -68,534 +155,178 @@ def verificar_mysql():
         return False
 
 def crear_engine_con_reintentos():
-    """Crea el engine con manejo de reintentos"""
-    intentos = 3
-    for i in range(intentos):
+    """Crea el engine reintentando con espera exponencial los fallos pasajeros de conexión"""
+    def crear():
+        engine = create_engine(
+            f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}',
+            pool_recycle=3600,  # Recicla conexiones cada hora
+            pool_pre_ping=True,  # Verifica conexión antes de usar
+            # LOAD DATA LOCAL INFILE necesita habilitarlo también en el cliente
+            connect_args={"local_infile": True} if ESTRATEGIA_CARGA == "load_data" else {}
+        )
+        # Testear la conexión
         try:
-            engine = create_engine(
-                f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}',
-                pool_recycle=3600,  # Recicla conexiones cada hora
-                pool_pre_ping=True  # Verifica conexión antes de usar
-            )
-            # Testear la conexión
             with engine.connect() as test_conn:
                 test_conn.execute(text("SELECT 1"))
-            print("✅ Engine creado y conexión verificada")
-            return engine
-        except SQLAlchemyError as e:
-            print(f"❌ Intento {i+1} fallido: {e}")
-            if i < intentos - 1:
-                time.sleep(2)
-    return None
+        except SQLAlchemyError:
+            engine.dispose()
+            raise
+        return engine
 
-# =============================================================================
-# FUNCIONES PARA EVITAR DUPLICADOS
-# =============================================================================
-
-def obtener_fechas_existentes(engine, tabla, columna_fecha, ticker_columna='ticker'):
-    """Obtiene las fechas ya existentes en la base de datos para evitar duplicados"""
-    try:
-        with engine.connect() as conn:
-            query = text(f"SELECT DISTINCT {ticker_columna}, {columna_fecha} FROM {tabla}")
-            result = conn.execute(query)
-            existing_data = {(row[0], row[1]) for row in result}
-        return existing_data
-    except Exception as e:
-        print(f"Error obteniendo datos existentes de {tabla}: {e}")
-        return set()
-
-def filtrar_datos_nuevos(df, existing_data, fecha_columna, ticker_columna='ticker'):
-    """Filtra solo los datos que no existen en la base de datos"""
-    if df.empty:
-        return df
-    
-    # Crear conjunto de claves únicas (ticker + fecha)
-    df_keys = set(zip(df[ticker_columna], df[fecha_columna]))
-    
-    # Encontrar claves que no existen en la base de datos
-    nuevas_claves = df_keys - existing_data
-    
-    # Filtrar el DataFrame
-    mask = df.apply(lambda row: (row[ticker_columna], row[fecha_columna]) in nuevas_claves, axis=1)
-    return df[mask]
-
-def guardar_dataframe_seguro(engine, df, nombre_tabla, fecha_columna=None, ticker_columna='ticker'):
-    """Guarda un DataFrame de forma segura con verificación de duplicados"""
-    if df.empty:
-        print(f"⚠️  DataFrame vacío para {nombre_tabla}, omitiendo")
-        return False
-    
     try:
-        # Obtener datos existentes si es una tabla con fechas
-        if fecha_columna and fecha_columna in df.columns:
-            existing_data = obtener_fechas_existentes(engine, nombre_tabla, fecha_columna, ticker_columna)
-            df_filtrado = filtrar_datos_nuevos(df, existing_data, fecha_columna, ticker_columna)
-            
-            if df_filtrado.empty:
-                print(f"⏭️  No hay datos nuevos para {nombre_tabla}, omitiendo")
-                return True
-                
-            print(f"📊 {nombre_tabla}: {len(df_filtrado)} registros nuevos de {len(df)} totales")
-            df = df_filtrado
-        
-        # Usar with para manejo automático de conexión
-        with engine.begin() as connection:
-            df.to_sql(
-                nombre_tabla, 
-                connection,
-                if_exists='append', 
-                index=False,
-                method='multi',
-                chunksize=1000
-            )
-        print(f"✓ Tabla '{nombre_tabla}' actualizada correctamente")
-        return True
-    except Exception as e:
-        print(f"❌ Error guardando {nombre_tabla}: {e}")
-        return False
-
-def verificar_duplicados(engine):
-    """Verifica si hay duplicados en las tablas con fechas"""
-    tablas_con_fechas = ['mercado_diario', 'dividendos', 'splits', 'recomendaciones']
-    
-    for tabla in tablas_con_fechas:
-        try:
-            with engine.connect() as conn:
-                query = text(f"""
-                    SELECT ticker, fecha, COUNT(*) as duplicados 
-                    FROM {tabla} 
-                    GROUP BY ticker, fecha 
-                    HAVING COUNT(*) > 1
-                """)
-                result = conn.execute(query)
-                duplicados = result.fetchall()
-                
-                if duplicados:
-                    print(f"⚠️  Duplicados encontrados en {tabla}: {len(duplicados)}")
-                else:
-                    print(f"✅ Sin duplicados en {tabla}")
-                    
-        except Exception as e:
-            print(f"Error verificando duplicados en {tabla}: {e}")
-
-# =============================================================================
-# VERIFICACIÓN INICIAL DE CONEXIÓN
-# =============================================================================
-
-print("🔍 Verificando estado de MySQL...")
-if not verificar_mysql():
-    print("❌ No se puede continuar. Inicia MySQL desde XAMPP y vuelve a ejecutar.")
-    sys.exit(1)
-
-print("🔌 Creando engine de conexión...")
-engine = crear_engine_con_reintentos()
-if not engine:
-    print("❌ No se pudo establecer conexión con MySQL")
-    sys.exit(1)
-
-# Verificar si la base de datos existe
-try:
-    with engine.connect() as conn:
-        result = conn.execute(text("SELECT DATABASE()"))
-        current_db = result.scalar()
-        print(f"Base de datos actual: {current_db}")
-        
-        if current_db == DB_NAME:
-            print(f"✅ Conectado a la base de datos correcta: {DB_NAME}")
-        else:
-            print(f"⚠️  Conectado a: {current_db}, pero esperábamos: {DB_NAME}")
-            print("Creando la base de datos...")
-            conn.execute(text(f"CREATE DATABASE IF NOT EXISTS {DB_NAME}"))
-            conn.execute(text(f"USE {DB_NAME}"))
-            
-except Exception as e:
-    print(f"❌ Error de conexión: {e}")
-    sys.exit(1)
-
-# =============================================================================
-# EXTRACCIÓN DE DATOS
-# =============================================================================
+        engine = reintentar(crear, POLITICA_BD, operacion="conexion_mysql", descripcion="Conexión a MySQL")
+    except SQLAlchemyError as e:
+        print(f"❌ No se pudo crear el engine: {e}")
+        return None
+    print("✅ Engine creado y conexión verificada")
+    return engine
+
+def conectar_base_datos():
+    """Verifica MySQL, crea el engine y el esquema; devuelve el engine o None"""
+    print("🔍 Verificando estado de MySQL...")
+    if not verificar_mysql():
+        print("❌ No se puede continuar. Inicia MySQL desde XAMPP y vuelve a ejecutar.")
+        return None
 
-def obtener_datos_accion(ticker):
-    """Función para obtener todos los datos de una acción con mejor manejo de errores"""
-    try:
-        ticker_obj = yf.Ticker(ticker)
-        info = ticker_obj.get_info()
-        
-        # Pequeña pausa para no saturar la API
-        time.sleep(0.5)
-        
-        # Obtener histórico con manejo de errores
-        try:
-            historial = ticker_obj.history(period="10y")
-            if historial.empty:
-                print(f"Advertencia: Sin datos históricos para {ticker}")
-        except Exception as e:
-            print(f"Error obteniendo histórico para {ticker}: {e}")
-            historial = pd.DataFrame()
-        
-        # Obtener dividendos con manejo de errores
-        try:
-            dividendos = ticker_obj.dividends
-            if dividendos.empty:
-                dividendos = pd.Series(dtype=float)
-        except Exception as e:
-            print(f"Error obteniendo dividendos para {ticker}: {e}")
-            dividendos = pd.Series(dtype=float)
-        
-        # Obtener splits con manejo de errores
-        try:
-            splits = ticker_obj.splits
-            if splits.empty:
-                splits = pd.Series(dtype=float)
-        except Exception as e:
-            print(f"Error obteniendo splits para {ticker}: {e}")
-            splits = pd.Series(dtype=float)
-        
-        # Obtener recomendaciones con manejo de errores
-        try:
-            recomendaciones = ticker_obj.recommendations
-            if recomendaciones is None or recomendaciones.empty:
-                recomendaciones = pd.DataFrame()
-        except Exception as e:
-            print(f"Error obteniendo recomendaciones para {ticker}: {e}")
-            recomendaciones = pd.DataFrame()
-        
-        return {
-            "ticker": ticker,
-            "info": info,
-            "historial": historial,
-            "dividendos": dividendos,
-            "splits": splits,
-            "recomendaciones": recomendaciones
-        }
-    except Exception as e:
-        print(f"Error crítico obteniendo datos para {ticker}: {e}")
+    print("🔌 Creando engine de conexión...")
+    engine = crear_engine_con_reintentos()
+    if not engine:
+        print("❌ No se pudo establecer conexión con MySQL")
         return None
 
-# Función para manejar valores nulos de forma más robusta
-def safe_get(data, key, default=None):
-    """Obtiene valores de forma segura de diccionarios anidados"""
-    if isinstance(data, dict):
-        return data.get(key, default)
-    return default
-
-# Paso 1: Extraer todos los datos
-datos_acciones = {}
-for accion in lista_acciones:
-    ticker = accion["ticker"]
-    mercado = accion["mercado"]
-    print(f"Extrayendo datos para {ticker} ({mercado})...")
-    datos = obtener_datos_accion(ticker)
-    if datos:
-        # Agregar información del mercado a los datos
-        datos["mercado"] = mercado
-        datos_acciones[ticker] = datos
-    else:
-        print(f"No se pudieron obtener datos para {ticker}")
-
-print("Extracción completada. Creando DataFrames...")
-
-# Paso 2: Crear DataFrames optimizados para SQL con mejor manejo de nulos
-
-# TABLA 1: activos
-activos_data = []
-for accion_info in lista_acciones:
-    ticker = accion_info["ticker"]
-    mercado = accion_info["mercado"]
-    
-    if ticker in datos_acciones:
-        datos = datos_acciones[ticker]
-        info = datos["info"]
-        
-        activos_data.append({
-            "ticker": ticker,
-            "market": mercado,  # Nueva columna para identificar el mercado
-            "name": safe_get(info, "longName", "No disponible"),
-            "short name": safe_get(info, "shortName", "No disponible"),
-            "business summary": safe_get(info, "longBusinessSummary", "No disponible"),
-            "website": safe_get(info, "website", "No disponible"),
-            "Phone": safe_get(info, "phone", "No disponible"),
-            "address": safe_get(info, "address1", "No disponible"),
-            "city": safe_get(info, "city", "No disponible"),
-            "state": safe_get(info, "state", "No disponible"),
-            "pc": safe_get(info, "zip", "No disponible"),
-            "country": safe_get(info, "country", "No disponible"),
-            "industry": safe_get(info, "industry", "No disponible"),
-            "sector": safe_get(info, "sector", "No disponible"),
-            "quote type": safe_get(info, "quoteType", "No disponible"),
-            "currency": safe_get(info, "currency", "No disponible"),
-            "language": safe_get(info, "language", "No disponible"),
-            "region": safe_get(info, "region", "No disponible")
-        })
-    else:
-        print(f"⚠️  No hay datos para {ticker}, omitiendo de la tabla activos")
-
-activos = pd.DataFrame(activos_data)
-
-# TABLA 2: datos_mercado_diario
-mercado_data = []
-for accion_info in lista_acciones:
-    ticker = accion_info["ticker"]
-    mercado = accion_info["mercado"]
-    
-    if ticker in datos_acciones:
-        datos = datos_acciones[ticker]
-        historial = datos["historial"]
-        
-        if not historial.empty:
-            historial = historial.reset_index()
-            for _, row in historial.iterrows():
-                mercado_data.append({
-                    "ticker": ticker,
-                    "market": mercado,  # Nueva columna para identificar el mercado
-                    "date": row["Date"].date() if pd.notna(row["Date"]) else None,
-                    "open price": round(row["Open"], 2) if pd.notna(row["Open"]) else 0.00,
-                    "high price": round(row["High"], 2) if pd.notna(row["High"]) else 0.00,
-                    "low price": round(row["Low"], 2) if pd.notna(row["Low"]) else 0.00,
-                    "closing price": round(row["Close"], 2) if pd.notna(row["Close"]) else 0.00,
-                    "volume": int(row["Volume"]) if pd.notna(row["Volume"]) else 0
-                })
-
-mercado_diario = pd.DataFrame(mercado_data)
-
-# TABLA 3: rendimiento_financiero
-rendimiento_data = []
-for accion_info in lista_acciones:
-    ticker = accion_info["ticker"]
-    mercado = accion_info["mercado"]
-    
-    if ticker in datos_acciones:
-        datos = datos_acciones[ticker]
-        info = datos["info"]
-        
-        rendimiento_data.append({
-            "ticker": ticker,
-            "market": mercado,  # Nueva columna para identificar el mercado
-            "market cap": safe_get(info, "marketCap", 0),
-            "avg price 50 days": safe_get(info, "fiftyDayAverage", 0),
-            "avg price 200 days": safe_get(info, "twoHundredDayAverage", 0),
-            "change percent 52 weeks": safe_get(info, "fiftyTwoWeekChangePercent", 0)
-        })
-
-rendimiento_financiero = pd.DataFrame(rendimiento_data)
-
-# TABLA 4: estados_financieros
-estados_data = []
-for accion_info in lista_acciones:
-    ticker = accion_info["ticker"]
-    mercado = accion_info["mercado"]
-    
-    if ticker in datos_acciones:
-        datos = datos_acciones[ticker]
-        info = datos["info"]
-        
-        estados_data.append({
-            "ticker": ticker,
-            "market": mercado,  # Nueva columna para identificar el mercado
-            "total cash": safe_get(info, "totalCash", 0),
-            "total debt": safe_get(info, "totalDebt", 0),
-            "total revenue": safe_get(info, "totalRevenue", 0),
-            "profit margins": safe_get(info, "profitMargins", 0),
-            "gross profits": safe_get(info, "grossProfits", 0),
-            "free cash flow": safe_get(info, "freeCashflow", 0),
-            "operating cash flow": safe_get(info, "operatingCashflow", 0),
-            "revenue growth": safe_get(info, "revenueGrowth", 0),
-            "ebitda": safe_get(info, "ebitda", 0),
-            "net income to common": safe_get(info, "netIncomeToCommon", 0),
-            "financial currency": safe_get(info, "financialCurrency", "No disponible"),
-            
-            
-            
-            
-            
-            "price to sale ratio 12 months": safe_get(info, "priceToSalesTrailing12Months", 0),
-            "enterprise to revenue": safe_get(info, "enterpriseToRevenue", 0),
-            "enterprise to_ebitda": safe_get(info, "enterpriseToEbitda", 0),
-            "price to earnings": safe_get(info, "trailingPE", 0),
-            "per futuro": safe_get(info, "forwardPE", 0),
-            "price to book": safe_get(info, "priceToBook", 0),
-            "debt to equity": safe_get(info, "debtToEquity", 0),
-            "roa": safe_get(info, "returnOnAssets", 0),
-            "roe": safe_get(info, "returnOnEquity", 0),
-            "eps ttm": safe_get(info, "epsTrailingTwelveMonths", 0),
-            "eps fordward": safe_get(info, "epsForward", 0)
-        })
-
-estados_financieros = pd.DataFrame(estados_data)
-
-# TABLA 5: Dividendos
-data_dividendos = {}
-for accion_info in lista_acciones:
-    ticker = accion_info["ticker"]
-    mercado = accion_info["mercado"]
-    
+    # Verificar si la base de datos existe
     try:
-        ticker_obj = yf.Ticker(ticker)
-        dividendos_acciones = ticker_obj.dividends
-        data_dividendos[ticker] = dividendos_acciones
+        with engine.connect() as conn:
+            result = conn.execute(text("SELECT DATABASE()"))
+            current_db = result.scalar()
+            print(f"Base de datos actual: {current_db}")
+
+            if current_db == DB_NAME:
+                print(f"✅ Conectado a la base de datos correcta: {DB_NAME}")
+            else:
+                print(f"⚠️  Conectado a: {current_db}, pero esperábamos: {DB_NAME}")
+                print("Creando la base de datos...")
+                conn.execute(text(f"CREATE DATABASE IF NOT EXISTS {DB_NAME}"))
+                conn.execute(text(f"USE {DB_NAME}"))
+
     except Exception as e:
-        print(f"Error obteniendo dividendos de {ticker}: {e}")
-
-# Crear DataFrame y limpiar
-dividendos = pd.DataFrame(data_dividendos)
-dividendos.fillna(0, inplace=True)
-
-# CORRECCIÓN: Verificar y convertir el índice apropiadamente
-if not dividendos.empty:
-    # Asegurar que el índice es DateTimeIndex y luego extraer la fecha
-    dividendos.index = pd.to_datetime(dividendos.index)
-    dividendos.index = dividendos.index.date  # Esto ahora funcionará
-    
-    # Resto del procesamiento
-    dividendos = dividendos.reset_index().rename(columns={'index': 'Date'})
-    dividendos = dividendos.melt(id_vars=['Date'], var_name='ticker', value_name='dividendo')
-    dividendos = dividendos[dividendos['dividendo'] != 0]  # Eliminar filas con dividendos cero
-    
-    # Agregar información del mercado
-    mercado_dict = {accion["ticker"]: accion["mercado"] for accion in lista_acciones}
-    dividendos['mercado'] = dividendos['ticker'].map(mercado_dict)
-else:
-    print("No se encontraron datos de dividendos")
-    dividendos = pd.DataFrame(columns=['Date', 'ticker', 'dividendo', 'mercado'])
-    dividendos = dividendos.rename(columns={'dividendo': 'divident', 'mercado': 'market'})
-
-# TABLA 6: Splits
-splits_data = {}
-for accion_info in lista_acciones:
-    ticker = accion_info["ticker"]
-    mercado = accion_info["mercado"]
-    
-    ticker_obj = yf.Ticker(ticker)
-    splits_acciones = ticker_obj.splits
-    splits_data[ticker] = splits_acciones
-
-splits = pd.DataFrame(splits_data)
-splits.fillna(0, inplace=True)
-splits = splits.reset_index().rename(columns={'index': 'Date'})
-splits = splits.melt(id_vars=['Date'], var_name='ticker', value_name='split_ratio')
-splits = splits[splits['split_ratio'] != 0]  # Eliminar filas con splits cero
-
-# Agregar información del mercado
-mercado_dict = {accion["ticker"]: accion["mercado"] for accion in lista_acciones}
-splits['mercado'] = splits['ticker'].map(mercado_dict)
-
-# Renombrar columnas finales
-splits = splits.rename(columns={'split_ratio': 'split ratio','mercado': 'market'})
-
-# TABLA 7: Recomendaciones
-all_recommendations_list = []
-for accion_info in lista_acciones:
-    ticker = accion_info["ticker"]
-    mercado = accion_info["mercado"]
-    
-    ticker_obj = yf.Ticker(ticker)
-    recommendations_df = ticker_obj.recommendations
-    
-    if recommendations_df is not None and not recommendations_df.empty:
-        recommendations_df['ticker'] = ticker
-        recommendations_df['mercado'] = mercado  # Nueva columna para identificar el mercado
-        recommendations_df = recommendations_df.reset_index()
-        all_recommendations_list.append(recommendations_df)
-
-# Concatenar todos los DataFrames de la lista en uno solo
-recomendaciones = pd.concat(all_recommendations_list) if all_recommendations_list else pd.DataFrame()
-
-# TABLA 8: Consenso analistas  
-nombres_empresas = {}
-
-for accion_info in lista_acciones:
-    ticker = accion_info["ticker"]
-    mercado = accion_info["mercado"]
-    
-    ticker_obj = yf.Ticker(ticker)
-    info = ticker_obj.get_info()  
-    
-    calificacion_media = info.get("recommendationMean", 0)
-    num_analistas = info.get("numberOfAnalystOpinions", 0)
-    precio_objetivo = info.get("targetMeanPrice", 0)
-    
-    nombres_empresas[ticker] = {
-        "mercado": mercado,  # Nueva columna para identificar el mercado
-        "calificacion_media_recomendacion": round(calificacion_media, 2),
-        "No_analistas": int(num_analistas),
-        "precio_objetivo_medio_COP": int(precio_objetivo)
-    }
+        print(f"❌ Error de conexión: {e}")
+        engine.dispose()
+        return None
 
-# Crea el DataFrame a partir del diccionario, con los tickers como índice
-consenso_analistas = pd.DataFrame.from_dict(nombres_empresas, orient='index')
-consenso_analistas = consenso_analistas.reset_index().rename(columns={'index': 'ticker',
-            'mercado': 'market', 'calificacion_media_recomendacion': 'average analyst recommendation rating',
-            'No_analistas': 'number of analysts','precio_objetivo_medio_COP': 'average price'})
-                                                                   
-
-# Mostrar información de los DataFrames creados
-print("\nResumen de datos extraídos:")
-print(f"Activos: {activos.shape}")
-print(f"Datos mercado diario: {mercado_diario.shape}")
-print(f"Rendimiento financiero: {rendimiento_financiero.shape}")
-print(f"Estados financieros: {estados_financieros.shape}")
-print(f"Dividendos: {dividendos.shape}")
-print(f"Splits: {splits.shape}")
-print(f"Recomendaciones: {recomendaciones.shape if not recomendaciones.empty else '0 registros'}")
-print(f"Consenso analistas: {consenso_analistas.shape}")
+    # Crear las tablas que falten con tipos, claves e índices explícitos
+    print("🧱 Verificando esquema...")
+    crear_esquema(engine, particionar=PARTICIONAR_MERCADO_DIARIO)
+    return engine
 
 # =============================================================================
-# GUARDADO EN MYSQL CON MANEJO SEGURO Y SIN DUPLICADOS
+# ETAPAS DEL ETL
 # =============================================================================
 
-try:
-    print("💾 Iniciando guardado seguro en MySQL...")
-    
-    # Diccionario de tablas a guardar con sus columnas de fecha
+def calcular_ultimas_fechas(destino, lista_acciones, desde=None):
+    """Última fecha ya cubierta por ticker: la del destino (modo incremental) o el día previo a `desde`"""
+    if desde is not None:
+        print(f"📅 Histórico desde {desde.isoformat()} para {len(lista_acciones)} tickers")
+        return {accion["ticker"]: desde - timedelta(days=1) for accion in lista_acciones}
+    if destino is None or not MODO_INCREMENTAL:
+        return {}
+    ultimas_fechas = destino.ultimas_fechas()
+    if ultimas_fechas:
+        print(f"📅 Modo incremental: {len(ultimas_fechas)} tickers con histórico previo")
+    return ultimas_fechas
+
+def opciones_de_extraccion(ultimas_fechas, motor=MOTOR_EXTRACCION):
+    """Argumentos de `extraer_datos_acciones` según la configuración del módulo"""
+    limitador = LimitadorTasa(LLAMADAS_POR_SEGUNDO) if MAX_WORKERS_EXTRACCION > 1 else None
+    cache = CacheRespuestas(RUTA_CACHE) if USAR_CACHE or MODO_OFFLINE else None
+    if MODO_OFFLINE:
+        print(f"📴 Modo offline: solo se usarán las respuestas guardadas en {RUTA_CACHE}")
+    return dict(
+        max_workers=MAX_WORKERS_EXTRACCION,
+        limitador=limitador,
+        contador=ContadorLlamadas(),
+        # Compartidos por todos los lotes: un endpoint caído no se vuelve a martillear en cada lote
+        circuitos=CortaCircuitos(),
+        cache=cache,
+        solo_cache=MODO_OFFLINE,
+        ultimas_fechas=ultimas_fechas,
+        backend_historial=BACKEND_HISTORIAL,
+        motor=motor
+    )
+
+def resumen_extraccion(opciones_extraccion):
+    """Cada endpoint debe haberse consultado una sola vez por ticker"""
+    opciones_extraccion["contador"].resumen()
+    if opciones_extraccion["cache"] is not None:
+        opciones_extraccion["cache"].resumen()
+
+def transformar(datos_acciones):
+    """Construye las ocho tablas y muestra su tamaño"""
+    print("Extracción completada. Creando DataFrames...")
+
+    # Paso 2: Crear DataFrames optimizados para SQL con mejor manejo de nulos
+    # Todas las tablas se construyen a partir del mismo paquete de datos por ticker
+    tablas = construir_tablas(datos_acciones)
+
+    # Mostrar información de los DataFrames creados
+    print("\nResumen de datos extraídos:")
+    print(f"Activos: {tablas['activos'].shape}")
+    print(f"Datos mercado diario: {tablas['mercado_diario'].shape}")
+    print(f"Rendimiento financiero: {tablas['rendimiento_financiero'].shape}")
+    print(f"Estados financieros: {tablas['estados_financieros'].shape}")
+    print(f"Dividendos: {tablas['dividendos'].shape}")
+    print(f"Splits: {tablas['splits'].shape}")
+    recomendaciones = tablas['recomendaciones']
+    print(f"Recomendaciones: {recomendaciones.shape if not recomendaciones.empty else '0 registros'}")
+    print(f"Consenso analistas: {tablas['consenso_analistas'].shape}")
+    informe_memoria(tablas)
+    return tablas
+
+def cargar(destino, tablas, tickers, registro):
+    """Guarda las tablas en el destino sin duplicar y devuelve {tabla: éxito}"""
+    print(f"💾 Iniciando guardado seguro en {destino.nombre}...")
+
+    # Columna de fecha de cada tabla, para filtrar lo ya guardado
     tablas_config = {
-        'activos': {'df': activos, 'fecha_columna': None},
-        'mercado_diario': {'df': mercado_diario, 'fecha_columna': 'fecha'},
-        'rendimiento_financiero': {'df': rendimiento_financiero, 'fecha_columna': None},
-        'estados_financieros': {'df': estados_financieros, 'fecha_columna': None},
-        'dividendos': {'df': dividendos, 'fecha_columna': 'Date'},
-        'splits': {'df': splits, 'fecha_columna': 'Date'},
-        'recomendaciones': {'df': recomendaciones, 'fecha_columna': 'Date'},
-        'consenso_analistas': {'df': consenso_analistas, 'fecha_columna': None}
+        'activos': {'df': tablas['activos'], 'fecha_columna': None},
+        'mercado_diario': {'df': tablas['mercado_diario'], 'fecha_columna': 'date'},
+        'rendimiento_financiero': {'df': tablas['rendimiento_financiero'], 'fecha_columna': None},
+        'estados_financieros': {'df': tablas['estados_financieros'], 'fecha_columna': None},
+        'dividendos': {'df': tablas['dividendos'], 'fecha_columna': 'Date'},
+        'splits': {'df': tablas['splits'], 'fecha_columna': 'Date'},
+        'recomendaciones': {'df': tablas['recomendaciones'], 'fecha_columna': 'snapshot date'},
+        'consenso_analistas': {'df': tablas['consenso_analistas'], 'fecha_columna': None}
     }
-    
+
+    # Al reanudar se omiten las tablas ya guardadas para todos estos tickers
+    tablas_pendientes = registro.tablas_pendientes(tickers, TABLAS_SALIDA)
+
     resultados = {}
     for nombre_tabla, config in tablas_config.items():
-        resultados[nombre_tabla] = guardar_dataframe_seguro(
-            engine, 
-            config['df'], 
-            nombre_tabla, 
+        if nombre_tabla not in tablas_pendientes:
+            print(f"⏭️  Tabla '{nombre_tabla}' ya guardada en esta ejecución")
+            continue
+        resultados[nombre_tabla] = destino.guardar(
+            config['df'],
+            nombre_tabla,
             config['fecha_columna']
         )
-    
-    # Resumen de resultados
+    # Una tabla vacía no tiene nada pendiente de guardar para estos tickers
+    guardadas = {tabla: exito for tabla, exito in resultados.items() if not tablas[tabla].empty}
+    registro.registrar_carga(tickers, guardadas, tablas_pendientes)
+    return resultados
+
+def mostrar_resultados(resultados):
+    """Resumen de las tablas guardadas"""
     print("\n📊 Resumen de guardado:")
     exitos = sum(resultados.values())
     total = len(resultados)
     print(f"✅ {exitos}/{total} tablas actualizadas exitosamente")
-    
+
     for tabla, exito in resultados.items():
         status = "✅" if exito else "❌"
         print(f"{status} {tabla}")
 
-except Exception as e:
-    print(f"❌ Error durante el proceso de guardado: {e}")
-    import traceback
-    traceback.print_exc()
-
-finally:
-    # Verificar duplicados
-    print("\n🔍 Verificando duplicados...")
-    verificar_duplicados(engine)
-    
-    # CIERRE DE CONEXIONES
-    print("\n🔌 Cerrando conexiones...")
-    try:
-        engine.dispose()
-        print("✅ Engine y conexiones cerrados correctamente")
-    except Exception as e:
-        print(f"⚠️  Error cerrando engine: {e}")
-
 # =============================================================================
 # VERIFICACIÓN FINAL
 # =============================================================================
@@ -609,26 +340,222 @@ def verificar_tablas_creadas():
         with temp_engine.connect() as conn:
             result = conn.execute(text("SHOW TABLES"))
             tablas = [row[0] for row in result]
-            
+
             print("\n📊 Tablas en la base de datos:")
             for tabla in tablas:
                 count_result = conn.execute(text(f"SELECT COUNT(*) FROM {tabla}"))
                 count = count_result.scalar()
                 print(f"• {tabla}: {count} registros")
-                
+
             # Verificar distribución por mercado
-            if 'activos' in tablas:
-                result = conn.execute(text("SELECT mercado, COUNT(*) FROM activos GROUP BY mercado"))
+            if 'activos_actual' in tablas:
+                result = conn.execute(text("SELECT market, COUNT(*) FROM activos_actual GROUP BY market"))
                 print("\n📈 Distribución por mercado:")
                 for row in result:
                     print(f"• {row[0]}: {row[1]} activos")
-        
+
         temp_engine.dispose()
-        
+
     except Exception as e:
         print(f"Error verificando tablas: {e}")
 
-# Ejecutar verificación
-verificar_tablas_creadas()
+# =============================================================================
+# EJECUCIÓN
+# =============================================================================
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="ETL de IBEX 35 y COLCAP hacia MySQL")
+    parser.add_argument("--markets", nargs="+", choices=list(mercados), metavar="MERCADO",
+                        help=f"Mercados a procesar ({', '.join(mercados)}); por defecto, todos")
+    parser.add_argument("--tickers", nargs="+", metavar="TICKER",
+                        help="Procesar solo estos tickers (p. ej. SAN.MC ECOPETROL.CL)")
+    parser.add_argument("--shard", type=parsear_shard, metavar="i/N",
+                        help="Procesar solo el shard i de N (0 <= i < N), para repartir en varios procesos")
+    parser.add_argument("--since", type=date.fromisoformat, metavar="AAAA-MM-DD",
+                        help="Descargar el histórico desde esta fecha en lugar de la última guardada")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Extraer y transformar sin conectarse ni escribir en MySQL")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reanuda la última ejecución si quedó incompleta: solo procesa los tickers pendientes")
+    parser.add_argument("--procesos", type=int, default=PROCESOS, metavar="N",
+                        help="Procesos trabajadores que extraen y transforman en paralelo (cola de trabajo local)")
+    parser.add_argument("--motor", choices=MOTORES, default=MOTOR_EXTRACCION,
+                        help="Extracción con un pool de hilos sobre yfinance o asíncrona sobre la API HTTP de Yahoo")
+    parser.add_argument("--destino", choices=DESTINOS, default=DESTINO,
+                        help="Dónde cargar las tablas: MySQL, Parquet particionado o un archivo DuckDB")
+    parser.add_argument("--ruta-destino", metavar="RUTA",
+                        help="Directorio Parquet o archivo DuckDB (por defecto, datos_parquet/ y colcap_ibex.duckdb)")
+    parser.add_argument("--sin-analitica", action="store_true",
+                        help="No actualizar las tablas derivadas (precios ajustados, rendimientos y correlaciones)")
+    parser.add_argument("--analitica-completa", action="store_true",
+                        help="Recalcular las tablas derivadas de todo el histórico en lugar de solo las fechas nuevas")
+    parser.add_argument("--metricas-json", default=RUTA_INFORME_JSON, metavar="RUTA",
+                        help="Informe JSON con tiempos por etapa y contadores de la ejecución")
+    parser.add_argument("--metricas-prom", default=RUTA_PROMETHEUS, metavar="RUTA",
+                        help="Textfile de Prometheus para el collector de node_exporter (vacío para omitirlo)")
+    return parser
+
+def ruta_por_shard(ruta, shard):
+    """Cada shard lleva su propio registro y su propia cola para que sus ejecuciones no se mezclen"""
+    if shard is None:
+        return ruta
+    indice, total = shard
+    base, extension = ruta.rsplit(".", 1)
+    return f"{base}_shard{indice}de{total}.{extension}"
+
+def ejecutar_prueba(lista_acciones, desde=None, motor=MOTOR_EXTRACCION):
+    """Extrae y transforma sin tocar la base de datos (--dry-run)"""
+    print("🧪 Modo prueba: no se escribirá en MySQL")
+    opciones_extraccion = opciones_de_extraccion(calcular_ultimas_fechas(None, lista_acciones, desde), motor)
+    datos_acciones = extraer_datos_acciones(lista_acciones, **opciones_extraccion)
+    resumen_extraccion(opciones_extraccion)
+    transformar(datos_acciones)
+    faltantes = len(lista_acciones) - len(datos_acciones)
+    print(f"\n🧪 Prueba terminada: {len(datos_acciones)} tickers extraídos, {faltantes} sin datos")
+    return 0 if not faltantes else 1
+
+def exportar_metricas(args, seleccion, codigo):
+    """Muestra los tramos más lentos y escribe el informe JSON y el textfile de Prometheus"""
+    METRICAS.resumen()
+    extra = {
+        "argumentos": vars(args),
+        "tickers_seleccionados": len(seleccion),
+        "codigo_salida": codigo
+    }
+    try:
+        if args.metricas_json:
+            print(f"📈 Informe de métricas: {METRICAS.guardar_json(args.metricas_json, extra)}")
+        if args.metricas_prom:
+            print(f"📈 Métricas de Prometheus: {METRICAS.guardar_prometheus(args.metricas_prom)}")
+    except OSError as e:
+        print(f"⚠️  No se pudieron escribir las métricas: {e}")
+    return codigo
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    seleccion = construir_lista_acciones(args.markets, args.tickers, args.shard)
+    if args.tickers:
+        desconocidos = set(args.tickers) - {accion["ticker"] for accion in construir_lista_acciones(args.markets)}
+        if desconocidos:
+            print(f"⚠️  Tickers fuera de los mercados elegidos: {', '.join(sorted(desconocidos))}")
+    if not seleccion:
+        print("⚠️  La selección no contiene ningún ticker")
+        return 0
+    print(f"🎯 {len(seleccion)} tickers seleccionados"
+          + (f" (shard {args.shard[0]}/{args.shard[1]})" if args.shard else ""))
+
+    if args.dry_run:
+        return exportar_metricas(args, seleccion, ejecutar_prueba(seleccion, args.since, args.motor))
+
+    engine = None
+    if args.destino == "mysql":
+        engine = conectar_base_datos()
+        if engine is None:
+            return 1
+        destino = AlmacenamientoSQL(engine, modo=MODO_ESCRITURA, estrategia=ESTRATEGIA_CARGA)
+    else:
+        # Los destinos columnares locales no necesitan MySQL
+        destino = crear_almacenamiento(args.destino, ruta=args.ruta_destino)
+        print(f"🗃️  Destino {args.destino}: {destino.ruta}")
+    migrar_recomendaciones(destino)
+
+    # Tickers con precios guardados antes con auto_adjust=True: se recarga su histórico completo sin ajustar
+    sin_marca, ajustados = precios_por_migrar(destino, [accion["ticker"] for accion in seleccion])
+    if ajustados:
+        if getattr(destino, "modo", None) == "append":
+            print(f"❌ {len(ajustados)} tickers tienen en mercado_diario precios ajustados por dividendos, y en "
+                  f"modo 'append' no se pueden reemplazar: ejecute con MODO_ESCRITURA = 'upsert' para recargarlos")
+            destino.cerrar()
+            return 1
+        print(f"🔁 {len(ajustados)} tickers con precios guardados ajustados por dividendos (auto_adjust=True): "
+              f"se recarga su histórico completo sin ajustar")
+
+    # Registro de avance por ticker y por tabla, para poder reanudar tras un fallo
+    registro = RegistroEjecuciones(ruta_por_shard(RUTA_REGISTRO, args.shard))
+    registro.iniciar(reanudar=args.resume)
+    pendientes = seleccion
+    if args.resume:
+        pendientes = registro.pendientes(seleccion, TABLAS_SALIDA)
+        print(f"⏯️  {len(seleccion) - len(pendientes)} tickers ya completos, {len(pendientes)} pendientes")
+
+    def registrar_lote(lote, datos_acciones, resultados):
+        """Registra la extracción y la carga de un lote en el registro de ejecuciones"""
+        registro.registrar_extraccion(lote, datos_acciones)
+        registro.registrar_carga(list(datos_acciones), resultados, TABLAS_SALIDA)
+
+    try:
+        # Paso 1: Extraer (pool acotado de hilos con limitador compartido)
+        ultimas_fechas = calcular_ultimas_fechas(destino, pendientes, args.since)
+        ultimas_fechas = {t: fecha for t, fecha in ultimas_fechas.items() if t not in ajustados}
+        opciones_extraccion = opciones_de_extraccion(ultimas_fechas, args.motor)
+
+        if args.procesos > 1:
+            # Extracción y transformación en N procesos; este proceso es el único cargador
+            resultados = ejecutar_multiproceso(
+                pendientes, destino, args.procesos, opciones_extraccion,
+                ruta_cola=ruta_por_shard(RUTA_COLA, args.shard),
+                ruta_cache=RUTA_CACHE if opciones_extraccion["cache"] is not None else None,
+                llamadas_por_segundo=LLAMADAS_POR_SEGUNDO, reiniciar=not args.resume,
+                al_cargar_lote=registrar_lote
+            )
+        elif MODO_STREAMING:
+            # Extracción, transformación y carga lote a lote con memoria acotada
+            print(f"🚰 Modo streaming: lotes de {TAM_LOTE_STREAMING} tickers")
+            resultados = pipeline_streaming(
+                pendientes, destino, opciones_extraccion, tam_lote=TAM_LOTE_STREAMING,
+                al_cargar_lote=registrar_lote
+            )
+            resumen_extraccion(opciones_extraccion)
+        else:
+            datos_acciones = extraer_datos_acciones(pendientes, **opciones_extraccion)
+            registro.registrar_extraccion(pendientes, datos_acciones)
+            resumen_extraccion(opciones_extraccion)
+
+            # Paso 2 y 3: transformar y guardar en el destino sin duplicar
+            tablas = transformar(datos_acciones)
+            resultados = cargar(destino, tablas, list(datos_acciones), registro)
+
+        mostrar_resultados(resultados)
+
+        # Los tickers sin marca cuyo mercado_diario ya se guardó quedan marcados como sin ajustar
+        completadas = registro.etapas_completadas(set(sin_marca))
+        marcar_precios_sin_ajustar(destino, [accion for accion in seleccion
+                                             if "mercado_diario" in completadas.get(accion["ticker"], set())],
+                                   ajustados)
+
+        # Paso 4: tablas derivadas, desde lo que ya está guardado en el destino
+        if CALCULAR_ANALITICA and not args.sin_analitica:
+            actualizar_analitica(destino, [accion["ticker"] for accion in seleccion], args.analitica_completa)
+
+    except Exception as e:
+        print(f"❌ Error durante el proceso de guardado: {e}")
+        import traceback
+        traceback.print_exc()
+
+    finally:
+        # Verificar duplicados (los destinos columnares reemplazan por clave al escribir)
+        if engine is not None:
+            print("\n🔍 Verificando duplicados...")
+            verificar_duplicados(engine)
+
+        # Cerrar la ejecución en el registro (queda "incompleta" si falta algún ticker)
+        faltantes = registro.finalizar(seleccion, TABLAS_SALIDA)
+        registro.resumen(seleccion, TABLAS_SALIDA)
+
+        # CIERRE DE CONEXIONES
+        print("\n🔌 Cerrando conexiones...")
+        try:
+            destino.cerrar()
+            print("✅ Engine y conexiones cerrados correctamente")
+        except Exception as e:
+            print(f"⚠️  Error cerrando engine: {e}")
+
+    # Ejecutar verificación
+    if engine is not None:
+        verificar_tablas_creadas()
+
+    print("\n🎉 Proceso completado! Los datos nuevos se han agregado sin duplicar los existentes.")
+    return exportar_metricas(args, seleccion, 0 if not faltantes else 1)
 
-print("\n🎉 Proceso completado! Los datos nuevos se han agregado sin duplicar los existentes.")
+if __name__ == "__main__":
+    sys.exit(main())
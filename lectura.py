@@ -0,0 +1,260 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+import pandas as pd
+from sqlalchemy import types
+
+from ajustes import TABLA_AJUSTADA
+from analitica import TABLA_CORRELACIONES, TABLA_RENDIMIENTOS
+from esquema import metadata
+from metricas import METRICAS
+from transformacion import TIPOS_TABLAS, aplicar_tipos
+
+# Archivo SQLite de la caché de consultas en disco (opcional)
+RUTA_CACHE_LECTURAS = "cache_lecturas.sqlite"
+
+# Memoria máxima de la caché en proceso; las consultas menos usadas salen primero
+MAX_MB_CACHE_MEMORIA = 256
+
+# Tickers por lote en las lecturas por lotes
+TICKERS_POR_LOTE = 25
+
+# =============================================================================
+# LECTURA DE LOS DATOS GUARDADOS PARA CUADERNOS Y PANELES
+# =============================================================================
+# Las consultas se filtran por tickers, mercados y rango de fechas en el propio
+# destino (`leer` empuja los filtros a SQL o poda particiones Parquet) y
+# devuelven DataFrames con la política de tipos de transformacion.py y las
+# fechas como datetime64. Los resultados se guardan en una caché LRU en
+# memoria y, opcionalmente, en una caché SQLite en disco compartida entre
+# procesos. Cada entrada recuerda la versión de su tabla en el destino
+# (`destino.version`), que cambia con cada escritura: en cuanto se cargan
+# filas nuevas la entrada deja de servirse y la siguiente consulta va al
+# destino.
+
+def tipar(df, tabla):
+    """Aplica la política de tipos y convierte el resto de columnas según esquema.py.
+
+    Las fechas pasan a datetime64, los booleanos a bool y los numéricos que
+    algunos destinos devuelven como Decimal o texto a números.
+    """
+    df = aplicar_tipos(df, tabla)
+    if tabla not in metadata.tables:
+        return df
+    politica = TIPOS_TABLAS.get(tabla, {})
+    for columna in metadata.tables[tabla].columns:
+        nombre = columna.name
+        if nombre not in df.columns or nombre in politica:
+            continue
+        if isinstance(columna.type, types.Date):
+            df[nombre] = pd.to_datetime(df[nombre])
+        elif isinstance(columna.type, types.Boolean):
+            df[nombre] = df[nombre].astype(bool)
+        elif isinstance(columna.type, types.Integer) and not pd.api.types.is_integer_dtype(df[nombre]):
+            df[nombre] = pd.to_numeric(df[nombre], errors="coerce").astype("Int64")
+        elif isinstance(columna.type, types.Numeric) and not pd.api.types.is_float_dtype(df[nombre]):
+            df[nombre] = pd.to_numeric(df[nombre], errors="coerce").astype("float64")
+    return df
+
+def _origen(destino):
+    """Identifica el destino en las claves de la caché en disco (sin la contraseña)"""
+    if getattr(destino, "ruta", None):
+        return f"{destino.nombre}:{os.path.abspath(destino.ruta)}"
+    return f"{destino.nombre}:{destino.engine.url}"
+
+
+class CacheConsultas:
+    """Caché persistente en SQLite de los resultados de las consultas, por versión de tabla"""
+
+    def __init__(self, ruta=RUTA_CACHE_LECTURAS):
+        self.ruta = ruta
+        with closing(self._conectar()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS consultas (
+                    tabla TEXT NOT NULL,
+                    parametros TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    guardado_en REAL NOT NULL,
+                    contenido BLOB NOT NULL,
+                    PRIMARY KEY (tabla, parametros)
+                )
+            """)
+
+    def _conectar(self):
+        # Una conexión por operación: varios paneles pueden compartir la caché
+        return sqlite3.connect(self.ruta, timeout=30)
+
+    def leer(self, tabla, parametros, version):
+        """Devuelve (encontrado, DataFrame); una entrada de otra versión de la tabla se descarta"""
+        with closing(self._conectar()) as conn, conn:
+            fila = conn.execute("SELECT version, contenido FROM consultas WHERE tabla = ? AND parametros = ?",
+                                (tabla, parametros)).fetchone()
+            if fila is not None and fila[0] != str(version):
+                conn.execute("DELETE FROM consultas WHERE tabla = ? AND parametros = ?", (tabla, parametros))
+                fila = None
+        return (True, pickle.loads(fila[1])) if fila is not None else (False, None)
+
+    def guardar(self, tabla, parametros, version, df):
+        with closing(self._conectar()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO consultas VALUES (?, ?, ?, ?, ?)",
+                         (tabla, parametros, str(version), time.time(),
+                          pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def limpiar(self, tabla=None):
+        """Elimina las consultas guardadas de `tabla` (o todas); devuelve cuántas"""
+        with closing(self._conectar()) as conn, conn:
+            if tabla is None:
+                return conn.execute("DELETE FROM consultas").rowcount
+            return conn.execute("DELETE FROM consultas WHERE tabla = ?", (tabla,)).rowcount
+
+
+class LectorDatos:
+    """Consultas de precios, eventos y analítica de un destino, con caché en memoria y en disco.
+
+    `consultar` devuelve una copia del resultado, así que quien la modifique
+    no altera la caché. Con `cache_disco` (una CacheConsultas o una ruta) los
+    resultados sobreviven al proceso y se comparten entre paneles.
+    """
+
+    def __init__(self, destino, max_mb_memoria=MAX_MB_CACHE_MEMORIA, cache_disco=None):
+        self.destino = destino
+        self.max_bytes = int(max_mb_memoria * 1024 ** 2)
+        if isinstance(cache_disco, str):
+            cache_disco = CacheConsultas(cache_disco)
+        self.cache_disco = cache_disco
+        self.origen = _origen(destino)
+        self.aciertos = {"memoria": 0, "disco": 0}
+        self.fallos = 0
+        self._memoria = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _clave(tabla, tickers, mercados, desde, hasta, actuales):
+        return (tabla,
+                None if tickers is None else tuple(sorted(set(tickers))),
+                None if mercados is None else tuple(sorted(set(mercados))),
+                None if desde is None else pd.Timestamp(desde).date(),
+                None if hasta is None else pd.Timestamp(hasta).date(),
+                bool(actuales))
+
+    def _de_memoria(self, clave, version):
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is None:
+                return None
+            if entrada[0] != version:
+                # La tabla cambió desde que se guardó la consulta
+                self._bytes -= entrada[2]
+                del self._memoria[clave]
+                return None
+            self._memoria.move_to_end(clave)
+            return entrada[1]
+
+    def _a_memoria(self, clave, version, df):
+        tamanio = int(df.memory_usage(index=True, deep=True).sum())
+        if tamanio > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._memoria.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= anterior[2]
+            self._memoria[clave] = (version, df, tamanio)
+            self._bytes += tamanio
+            while self._bytes > self.max_bytes:
+                _, (_, _, liberados) = self._memoria.popitem(last=False)
+                self._bytes -= liberados
+
+    def _anotar(self, nivel, tabla):
+        with self._lock:
+            if nivel == "destino":
+                self.fallos += 1
+            else:
+                self.aciertos[nivel] += 1
+        METRICAS.incrementar("lecturas", nivel=nivel, tabla=tabla)
+
+    def consultar(self, tabla, tickers=None, mercados=None, desde=None, hasta=None, actuales=False):
+        """Filas de `tabla` filtradas en el destino, servidas desde la caché si la tabla no cambió"""
+        clave = self._clave(tabla, tickers, mercados, desde, hasta, actuales)
+        version = self.destino.version(tabla)
+        df = self._de_memoria(clave, version)
+        if df is not None:
+            self._anotar("memoria", tabla)
+            return df.copy()
+
+        parametros = json.dumps([self.origen, *clave[1:]], default=str)
+        if self.cache_disco is not None:
+            encontrado, df = self.cache_disco.leer(tabla, parametros, version)
+            if encontrado:
+                self._anotar("disco", tabla)
+                self._a_memoria(clave, version, df)
+                return df.copy()
+
+        self._anotar("destino", tabla)
+        _, tickers, mercados, desde, hasta, actuales = clave
+        with METRICAS.medir("lectura", tabla=tabla):
+            df = tipar(self.destino.leer(tabla, tickers, mercados, desde, hasta, actuales), tabla)
+        self._a_memoria(clave, version, df)
+        if self.cache_disco is not None:
+            self.cache_disco.guardar(tabla, parametros, version, df)
+        return df.copy()
+
+    def por_lotes(self, tabla, tickers=None, mercados=None, desde=None, hasta=None, actuales=False,
+                  tickers_por_lote=TICKERS_POR_LOTE):
+        """Genera la consulta en DataFrames de `tickers_por_lote` tickers, sin pasar por la caché.
+
+        Para recorrer tablas enteras sin tenerlas en memoria: cada lote es una
+        lectura filtrada en el destino. Sin `tickers` se recorren todos los de
+        la tabla.
+        """
+        if tickers is None:
+            tickers = self.destino.tickers(tabla)
+        tickers = sorted(set(tickers))
+        for inicio in range(0, len(tickers), tickers_por_lote):
+            lote = tickers[inicio:inicio + tickers_por_lote]
+            with METRICAS.medir("lectura", tabla=tabla):
+                df = self.destino.leer(tabla, lote, mercados, desde, hasta, actuales)
+            if not df.empty:
+                yield tipar(df, tabla)
+
+    # Atajos por tipo de dato
+
+    def precios(self, tickers=None, mercados=None, desde=None, hasta=None, ajustados=False):
+        """Precios diarios tal como se descargaron o, con `ajustados`, ajustados por splits y dividendos"""
+        return self.consultar(TABLA_AJUSTADA if ajustados else "mercado_diario", tickers, mercados, desde, hasta)
+
+    def dividendos(self, tickers=None, mercados=None, desde=None, hasta=None):
+        return self.consultar("dividendos", tickers, mercados, desde, hasta)
+
+    def splits(self, tickers=None, mercados=None, desde=None, hasta=None):
+        return self.consultar("splits", tickers, mercados, desde, hasta)
+
+    def rendimientos(self, tickers=None, mercados=None, desde=None, hasta=None):
+        return self.consultar(TABLA_RENDIMIENTOS, tickers, mercados, desde, hasta)
+
+    def correlaciones(self, tickers=None, mercados=None, desde=None, hasta=None):
+        return self.consultar(TABLA_CORRELACIONES, tickers, mercados, desde, hasta)
+
+    def activos(self, tickers=None, mercados=None):
+        """Versión vigente de la ficha de cada activo"""
+        return self.consultar("activos", tickers, mercados, actuales=True)
+
+    def invalidar(self, tabla=None):
+        """Vacía la caché en memoria (y la de disco) de `tabla`, o de todas las tablas"""
+        with self._lock:
+            for clave in [c for c in self._memoria if tabla is None or c[0] == tabla]:
+                self._bytes -= self._memoria.pop(clave)[2]
+        if self.cache_disco is not None:
+            self.cache_disco.limpiar(tabla)
+
+    def resumen(self):
+        total = sum(self.aciertos.values()) + self.fallos
+        print(f"🗄️  Lecturas: {total} consultas, {self.aciertos['memoria']} desde memoria, "
+              f"{self.aciertos['disco']} desde disco, {self.fallos} al destino "
+              f"({self._bytes / 1024 ** 2:.1f} MB en memoria)")
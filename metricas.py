@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Archivos de salida por defecto del informe de la ejecución
+RUTA_INFORME_JSON = "metricas_ejecucion.json"
+RUTA_PROMETHEUS = "metricas_etl.prom"
+
+# Prefijo de las métricas en el textfile de Prometheus (node_exporter)
+PREFIJO_PROMETHEUS = "bvc_etl"
+
+# =============================================================================
+# MÉTRICAS DE LA EJECUCIÓN: TRAMOS DE TIEMPO Y CONTADORES
+# =============================================================================
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+class Metricas:
+    """Registro thread-safe de tramos de tiempo (spans) y contadores con etiquetas.
+
+    Un tramo acumula número de ejecuciones, segundos totales y máximo; un
+    contador, un total. Ambos se identifican por nombre y etiquetas
+    (p. ej. `medir("transformacion", tabla="activos")`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.inicio = time.time()
+            self._tramos = {}
+            self._contadores = {}
+
+    @contextmanager
+    def medir(self, nombre, **etiquetas):
+        """Mide la duración del bloque, falle o no"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_tramo(nombre, time.perf_counter() - inicio, **etiquetas)
+
+    def registrar_tramo(self, nombre, segundos, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            tramo = self._tramos.setdefault(clave, {"veces": 0, "segundos": 0.0, "maximo": 0.0})
+            tramo["veces"] += 1
+            tramo["segundos"] += segundos
+            tramo["maximo"] = max(tramo["maximo"], segundos)
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def a_dict(self):
+        """Instantánea serializable de todos los tramos y contadores"""
+        with self._lock:
+            return {
+                "inicio": self.inicio,
+                "tramos": [{"nombre": nombre, "etiquetas": dict(etiquetas), **valores}
+                           for (nombre, etiquetas), valores in sorted(self._tramos.items())],
+                "contadores": [{"nombre": nombre, "etiquetas": dict(etiquetas), "valor": valor}
+                               for (nombre, etiquetas), valor in sorted(self._contadores.items())]
+            }
+
+    def fusionar(self, instantanea):
+        """Suma la instantánea de otro proceso (p. ej. un trabajador de la cola)"""
+        for tramo in instantanea["tramos"]:
+            clave = _clave(tramo["nombre"], tramo["etiquetas"])
+            with self._lock:
+                actual = self._tramos.setdefault(clave, {"veces": 0, "segundos": 0.0, "maximo": 0.0})
+                actual["veces"] += tramo["veces"]
+                actual["segundos"] += tramo["segundos"]
+                actual["maximo"] = max(actual["maximo"], tramo["maximo"])
+        for contador in instantanea["contadores"]:
+            self.incrementar(contador["nombre"], contador["valor"], **contador["etiquetas"])
+
+    def total(self, nombre):
+        """Suma de un contador sobre todas sus etiquetas"""
+        with self._lock:
+            return sum(valor for (n, _), valor in self._contadores.items() if n == nombre)
+
+    # -------------------------------------------------------------------------
+    # Exportación
+    # -------------------------------------------------------------------------
+
+    def guardar_json(self, ruta=RUTA_INFORME_JSON, extra=None):
+        """Escribe el informe de la ejecución en JSON"""
+        informe = self.a_dict()
+        informe["fin"] = time.time()
+        informe["duracion_segundos"] = informe["fin"] - informe["inicio"]
+        informe["inicio_iso"] = datetime.fromtimestamp(informe["inicio"]).isoformat(timespec="seconds")
+        informe.update(extra or {})
+        _escribir_atomico(ruta, json.dumps(informe, indent=2, ensure_ascii=False, default=str))
+        return ruta
+
+    def a_prometheus(self, prefijo=PREFIJO_PROMETHEUS):
+        """Texto en formato de exposición de Prometheus"""
+        instantanea = self.a_dict()
+        lineas = []
+
+        def etiquetas_texto(etiquetas):
+            if not etiquetas:
+                return ""
+            pares = ",".join(f'{k}="{_escapar(v)}"' for k, v in sorted(etiquetas.items()))
+            return "{" + pares + "}"
+
+        tramos = {}
+        for tramo in instantanea["tramos"]:
+            tramos.setdefault(tramo["nombre"], []).append(tramo)
+        for nombre, series in sorted(tramos.items()):
+            base = f"{prefijo}_{nombre}"
+            lineas.append(f"# TYPE {base}_segundos_total counter")
+            lineas += [f"{base}_segundos_total{etiquetas_texto(t['etiquetas'])} {t['segundos']:.6f}" for t in series]
+            lineas.append(f"# TYPE {base}_veces_total counter")
+            lineas += [f"{base}_veces_total{etiquetas_texto(t['etiquetas'])} {t['veces']}" for t in series]
+            lineas.append(f"# TYPE {base}_maximo_segundos gauge")
+            lineas += [f"{base}_maximo_segundos{etiquetas_texto(t['etiquetas'])} {t['maximo']:.6f}" for t in series]
+
+        contadores = {}
+        for contador in instantanea["contadores"]:
+            contadores.setdefault(contador["nombre"], []).append(contador)
+        for nombre, series in sorted(contadores.items()):
+            base = f"{prefijo}_{nombre}_total"
+            lineas.append(f"# TYPE {base} counter")
+            lineas += [f"{base}{etiquetas_texto(c['etiquetas'])} {c['valor']}" for c in series]
+
+        lineas.append(f"# TYPE {prefijo}_ultima_ejecucion_timestamp_segundos gauge")
+        lineas.append(f"{prefijo}_ultima_ejecucion_timestamp_segundos {time.time():.0f}")
+        lineas.append(f"# TYPE {prefijo}_duracion_ejecucion_segundos gauge")
+        lineas.append(f"{prefijo}_duracion_ejecucion_segundos {time.time() - instantanea['inicio']:.3f}")
+        return "\n".join(lineas) + "\n"
+
+    def guardar_prometheus(self, ruta=RUTA_PROMETHEUS, prefijo=PREFIJO_PROMETHEUS):
+        """Escribe el textfile para el collector de node_exporter"""
+        _escribir_atomico(ruta, self.a_prometheus(prefijo))
+        return ruta
+
+    def resumen(self, n=10):
+        """Muestra los tramos que más tiempo acumularon"""
+        tramos = sorted(self.a_dict()["tramos"], key=lambda t: t["segundos"], reverse=True)[:n]
+        print("\n⏱️  Tramos con más tiempo acumulado:")
+        for tramo in tramos:
+            etiquetas = ", ".join(f"{k}={v}" for k, v in tramo["etiquetas"].items())
+            print(f"• {tramo['nombre']}{f' ({etiquetas})' if etiquetas else ''}: "
+                  f"{tramo['segundos']:.2f} s en {tramo['veces']} veces")
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _escribir_atomico(ruta, contenido):
+    # node_exporter no debe leer nunca un archivo a medio escribir
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+
+# Registro global de la ejecución; cada proceso tiene el suyo
+METRICAS = Metricas()
@@ -0,0 +1,120 @@
+import queue
+import threading
+import traceback
+
+from carga import columna_fecha
+from extraccion import LimitadorTasa, extraer_datos_acciones
+from transformacion import construir_tablas
+
+# Tickers por lote y lotes en vuelo entre etapas: la memoria queda acotada
+# por (etapas + colas) x TAM_LOTE_STREAMING tickers, sin importar el universo
+TAM_LOTE_STREAMING = 5
+MAX_LOTES_EN_COLA = 2
+
+# Marca de fin de flujo entre etapas
+_FIN = object()
+
+# =============================================================================
+# PIPELINE STREAMING: EXTRACCIÓN -> TRANSFORMACIÓN -> CARGA POR LOTES
+# =============================================================================
+
+def _lotes(lista_acciones, tam_lote):
+    for i in range(0, len(lista_acciones), tam_lote):
+        yield lista_acciones[i:i + tam_lote]
+
+def _etapa(nombre, entrada, salida, funcion, errores):
+    """Consume lotes de `entrada`, aplica `funcion` y pasa el resultado a `salida`"""
+    try:
+        while True:
+            lote = entrada.get()
+            if lote is _FIN:
+                break
+            try:
+                salida.put(funcion(lote))
+            except Exception as e:
+                print(f"❌ Error en la etapa de {nombre}: {e}")
+                traceback.print_exc()
+                errores.append((nombre, e))
+    finally:
+        # Aunque falle, la etapa siguiente debe enterarse de que no hay más lotes
+        salida.put(_FIN)
+
+def guardar_tablas(destino, tablas, etiqueta="lote"):
+    """Guarda las tablas no vacías de un lote en el destino (ver almacenamiento.py) y devuelve {tabla: éxito}"""
+    resultados = {}
+    for nombre_tabla, df in tablas.items():
+        if df.empty:
+            continue
+        try:
+            resultados[nombre_tabla] = destino.guardar(df, nombre_tabla, columna_fecha(nombre_tabla))
+        except Exception as e:
+            print(f"❌ Error guardando {nombre_tabla} del {etiqueta}: {e}")
+            resultados[nombre_tabla] = False
+    return resultados
+
+def pipeline_streaming(lista_acciones, destino, opciones_extraccion=None,
+                       tam_lote=TAM_LOTE_STREAMING, max_lotes_en_cola=MAX_LOTES_EN_COLA,
+                       al_cargar_lote=None):
+    """Procesa los tickers en lotes pequeños a través de tres etapas conectadas por colas acotadas.
+
+    Cada lote se extrae, se transforma en las ocho tablas y se guarda antes de
+    que el siguiente ocupe memoria: las colas acotadas frenan la extracción si
+    la carga va más lenta. `opciones_extraccion` se pasa a
+    `extraer_datos_acciones`; las tablas se guardan en `destino`.
+    Tras guardar cada lote se llama a `al_cargar_lote(lote, datos_acciones,
+    resultados)` (por ejemplo, para el registro de ejecuciones).
+    Devuelve {tabla: True si todos sus lotes se guardaron}.
+    """
+    opciones_extraccion = dict(opciones_extraccion or {})
+    # Un único limitador para todos los lotes, no uno nuevo por llamada
+    if opciones_extraccion.get("limitador") is None and opciones_extraccion.get("max_workers", 2) > 1:
+        opciones_extraccion["limitador"] = LimitadorTasa()
+
+    entrada_extraccion = queue.Queue(maxsize=max_lotes_en_cola)
+    cola_transformar = queue.Queue(maxsize=max_lotes_en_cola)
+    cola_cargar = queue.Queue(maxsize=max_lotes_en_cola)
+    errores = []
+
+    def extraer(lote):
+        return lote, extraer_datos_acciones(lote, **opciones_extraccion)
+
+    def transformar(extraido):
+        lote, datos_acciones = extraido
+        return lote, datos_acciones, construir_tablas(datos_acciones)
+
+    def alimentar():
+        for lote in _lotes(lista_acciones, tam_lote):
+            entrada_extraccion.put(lote)
+        entrada_extraccion.put(_FIN)
+
+    hilos = [
+        threading.Thread(target=alimentar, name="alimentador", daemon=True),
+        threading.Thread(target=_etapa, args=("extracción", entrada_extraccion, cola_transformar, extraer, errores),
+                         name="extraccion", daemon=True),
+        threading.Thread(target=_etapa, args=("transformación", cola_transformar, cola_cargar, transformar, errores),
+                         name="transformacion", daemon=True),
+    ]
+    for hilo in hilos:
+        hilo.start()
+
+    # La carga corre en el hilo principal: una sola conexión escribe a la vez
+    resultados = {}
+    n_lote = 0
+    while True:
+        elemento = cola_cargar.get()
+        if elemento is _FIN:
+            break
+        lote, datos_acciones, tablas = elemento
+        n_lote += 1
+        print(f"\n🚰 Lote {n_lote}: guardando {len(datos_acciones)} tickers ({', '.join(datos_acciones)})")
+        resultados_lote = guardar_tablas(destino, tablas, f"lote {n_lote}")
+        for nombre_tabla, exito in resultados_lote.items():
+            resultados[nombre_tabla] = resultados.get(nombre_tabla, True) and exito
+        if al_cargar_lote is not None:
+            al_cargar_lote(lote, datos_acciones, resultados_lote)
+
+    for hilo in hilos:
+        hilo.join()
+    if errores:
+        print(f"⚠️  {len(errores)} lotes con errores durante el streaming")
+    return resultados
@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+# Archivo SQLite local con el progreso de cada ejecución
+RUTA_REGISTRO = "registro_ejecuciones.sqlite"
+
+# Etapa de extracción; el resto de etapas son las tablas de salida
+ETAPA_EXTRACCION = "extraccion"
+
+
+class RegistroEjecuciones:
+    """Registro persistente del avance de cada ejecución, por ticker y por tabla.
+
+    Cada ticker pasa por la etapa de extracción y por una etapa de carga por
+    cada tabla de salida. Al reanudar una ejecución interrumpida solo quedan
+    pendientes los tickers con alguna etapa sin completar.
+    """
+
+    def __init__(self, ruta=RUTA_REGISTRO):
+        self.ruta = ruta
+        self.ejecucion = None
+        self._lock = threading.Lock()
+        with closing(self._conectar()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ejecuciones (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    iniciada_en REAL NOT NULL,
+                    terminada_en REAL,
+                    estado TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS progreso (
+                    ejecucion INTEGER NOT NULL,
+                    ticker TEXT NOT NULL,
+                    etapa TEXT NOT NULL,
+                    completada INTEGER NOT NULL,
+                    detalle TEXT,
+                    actualizado_en REAL NOT NULL,
+                    PRIMARY KEY (ejecucion, ticker, etapa)
+                )
+            """)
+
+    def _conectar(self):
+        # Una conexión por operación: el registro se usa desde varios hilos
+        return sqlite3.connect(self.ruta, timeout=30)
+
+    def iniciar(self, reanudar=False):
+        """Abre una ejecución nueva o, con `reanudar`, retoma la última si quedó sin terminar.
+
+        Solo se reanuda la ejecución más reciente: si terminó, una anterior
+        fallida ya quedó cubierta por ella y se inicia una nueva.
+        """
+        with closing(self._conectar()) as conn, conn:
+            if reanudar:
+                fila = conn.execute("SELECT id, estado FROM ejecuciones ORDER BY id DESC LIMIT 1").fetchone()
+                if fila is not None and fila[1] != "completada":
+                    self.ejecucion = fila[0]
+                    conn.execute("UPDATE ejecuciones SET estado = 'en_curso', terminada_en = NULL WHERE id = ?",
+                                 (self.ejecucion,))
+                    print(f"⏯️  Reanudando la ejecución {self.ejecucion} registrada en {self.ruta}")
+                    return self.ejecucion
+                print("ℹ️  La última ejecución terminó, no hay nada que reanudar: se inicia una nueva")
+            cursor = conn.execute("INSERT INTO ejecuciones (iniciada_en, estado) VALUES (?, 'en_curso')",
+                                  (time.time(),))
+            self.ejecucion = cursor.lastrowid
+        return self.ejecucion
+
+    def registrar(self, tickers, etapa, completada, detalle=None):
+        """Marca la etapa de varios tickers como completada o fallida"""
+        ahora = time.time()
+        with self._lock, closing(self._conectar()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO progreso VALUES (?, ?, ?, ?, ?, ?)",
+                [(self.ejecucion, ticker, etapa, int(bool(completada)), detalle, ahora) for ticker in tickers]
+            )
+
+    def registrar_extraccion(self, lista_acciones, datos_acciones):
+        """Registra qué tickers del lote se extrajeron y cuáles fallaron"""
+        tickers = [accion["ticker"] for accion in lista_acciones]
+        self.registrar([t for t in tickers if t in datos_acciones], ETAPA_EXTRACCION, True)
+        self.registrar([t for t in tickers if t not in datos_acciones], ETAPA_EXTRACCION, False,
+                       "sin datos del proveedor")
+
+    def registrar_carga(self, tickers, resultados, tablas):
+        """Registra el resultado de cada tabla para los tickers cargados.
+
+        Las tablas sin resultado (nada que guardar para esos tickers) cuentan
+        como completadas.
+        """
+        for tabla in tablas:
+            exito = resultados.get(tabla, True)
+            self.registrar(tickers, tabla, exito, None if exito else "error al guardar")
+
+    def etapas_completadas(self, tickers=None):
+        """Devuelve {ticker: {etapas completadas}} de la ejecución actual"""
+        with closing(self._conectar()) as conn:
+            filas = conn.execute(
+                "SELECT ticker, etapa FROM progreso WHERE ejecucion = ? AND completada = 1",
+                (self.ejecucion,)
+            ).fetchall()
+        completadas = {}
+        for ticker, etapa in filas:
+            if tickers is None or ticker in tickers:
+                completadas.setdefault(ticker, set()).add(etapa)
+        return completadas
+
+    def pendientes(self, lista_acciones, tablas):
+        """Filtra `lista_acciones` a los tickers con alguna etapa sin completar"""
+        etapas = {ETAPA_EXTRACCION, *tablas}
+        completadas = self.etapas_completadas()
+        return [accion for accion in lista_acciones
+                if not etapas <= completadas.get(accion["ticker"], set())]
+
+    def tablas_pendientes(self, tickers, tablas):
+        """Tablas que aún falta guardar para al menos uno de los tickers"""
+        completadas = self.etapas_completadas(set(tickers))
+        return [tabla for tabla in tablas
+                if any(tabla not in completadas.get(ticker, set()) for ticker in tickers)]
+
+    def finalizar(self, lista_acciones, tablas):
+        """Cierra la ejecución: completada si no queda ningún ticker pendiente"""
+        pendientes = self.pendientes(lista_acciones, tablas)
+        estado = "completada" if not pendientes else "incompleta"
+        with closing(self._conectar()) as conn, conn:
+            conn.execute("UPDATE ejecuciones SET terminada_en = ?, estado = ? WHERE id = ?",
+                         (time.time(), estado, self.ejecucion))
+        return pendientes
+
+    def resumen(self, lista_acciones, tablas):
+        pendientes = self.pendientes(lista_acciones, tablas)
+        print(f"📒 Ejecución {self.ejecucion}: {len(lista_acciones) - len(pendientes)}/{len(lista_acciones)} "
+              f"tickers completos")
+        if pendientes:
+            print(f"⚠️  Pendientes (reintentar con --resume): {', '.join(a['ticker'] for a in pendientes)}")
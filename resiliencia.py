@@ -0,0 +1,276 @@
+import asyncio
+import json
+import random
+import threading
+import time
+
+from metricas import METRICAS
+
+# Intentos por llamada (el primero incluido) y espera base del backoff exponencial
+MAX_INTENTOS = 4
+ESPERA_BASE = 0.5
+ESPERA_MAXIMA = 30.0
+
+# Ante un límite del proveedor (HTTP 429) la espera parte de más arriba
+FACTOR_ESPERA_LIMITE = 4.0
+
+# Fallos seguidos de un endpoint que abren su circuito, y segundos que permanece abierto
+UMBRAL_FALLOS_CIRCUITO = 5
+TIEMPO_APERTURA_CIRCUITO = 60.0
+
+# Clases de error
+LIMITE = "limite"                # el proveedor pide bajar el ritmo: reintentar más despacio
+NO_ENCONTRADO = "no_encontrado"  # el dato no existe (ticker deslistado, endpoint sin datos): no reintentar
+TRANSITORIO = "transitorio"      # red, timeouts, 5xx, conexión perdida o deadlock: reintentar
+PERMANENTE = "permanente"        # error de datos o de programación: reintentar no sirve
+
+_TEXTOS_LIMITE = ("too many requests", "rate limit", "rate limited", "429")
+_TEXTOS_NO_ENCONTRADO = ("404", "not found", "delisted", "no data found", "no timezone found",
+                         "symbol may be delisted", "quote not found")
+
+# Códigos de error de MySQL que no se arreglan reintentando (acceso denegado, base o tabla inexistente...)
+_CODIGOS_MYSQL_PERMANENTES = {1044, 1045, 1049, 1054, 1064, 1146}
+
+# =============================================================================
+# CLASIFICACIÓN DE ERRORES
+# =============================================================================
+
+class CircuitoAbierto(Exception):
+    """El endpoint acumula fallos y se deja de consultar durante un tiempo"""
+
+
+def _codigo_http(error):
+    for objeto in (error, getattr(error, "response", None)):
+        for atributo in ("status", "status_code"):
+            codigo = getattr(objeto, atributo, None)
+            if isinstance(codigo, int):
+                return codigo
+    return None
+
+def _codigo_mysql(error):
+    # SQLAlchemy envuelve la excepción del driver en `orig`; PyMySQL pone el código en args[0]
+    original = getattr(error, "orig", None)
+    argumentos = getattr(original, "args", ())
+    return argumentos[0] if argumentos and isinstance(argumentos[0], int) else None
+
+def clasificar_error(error):
+    """Devuelve LIMITE, NO_ENCONTRADO, TRANSITORIO o PERMANENTE según la excepción"""
+    if isinstance(error, CircuitoAbierto):
+        return TRANSITORIO
+    codigo = _codigo_http(error)
+    nombre = type(error).__name__
+    mensaje = str(error).lower()
+    if codigo == 429 or "RateLimit" in nombre or any(t in mensaje for t in _TEXTOS_LIMITE):
+        return LIMITE
+    if codigo in (404, 410) or any(t in mensaje for t in _TEXTOS_NO_ENCONTRADO):
+        return NO_ENCONTRADO
+    if codigo is not None:
+        return TRANSITORIO if codigo >= 500 or codigo == 408 else PERMANENTE
+    if _codigo_mysql(error) in _CODIGOS_MYSQL_PERMANENTES:
+        return PERMANENTE
+    if nombre in ("IntegrityError", "ProgrammingError", "DataError", "NotSupportedError"):
+        return PERMANENTE
+    # Una respuesta truncada o una página de error en lugar de JSON es pasajera
+    if isinstance(error, json.JSONDecodeError):
+        return TRANSITORIO
+    if isinstance(error, (ValueError, TypeError, KeyError, AttributeError, IndexError)):
+        return PERMANENTE
+    return TRANSITORIO
+
+def es_recuperable(error):
+    """Indica si el fallo es pasajero: conviene reintentar el ticker más tarde en lugar de darlo por vacío"""
+    return clasificar_error(error) in (LIMITE, TRANSITORIO)
+
+def _espera_indicada(error):
+    """Segundos de la cabecera Retry-After de la respuesta, si el proveedor la envía"""
+    cabeceras = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(cabeceras.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+# =============================================================================
+# POLÍTICA DE REINTENTOS (BACKOFF EXPONENCIAL CON JITTER)
+# =============================================================================
+
+class PoliticaReintentos:
+    """Número de intentos y espera entre ellos.
+
+    La espera del intento n es `espera_base * 2**n` (multiplicada por
+    `factor_limite` si el proveedor pidió bajar el ritmo), acotada por
+    `espera_maxima`, con jitter: un valor al azar entre la mitad y el total,
+    para que los hilos que fallaron a la vez no reintenten a la vez.
+    """
+
+    def __init__(self, max_intentos=MAX_INTENTOS, espera_base=ESPERA_BASE, espera_maxima=ESPERA_MAXIMA,
+                 factor_limite=FACTOR_ESPERA_LIMITE, semilla=None):
+        self.max_intentos = max(1, max_intentos)
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.factor_limite = factor_limite
+        self._aleatorio = random.Random(semilla)
+
+    def espera(self, intento, clase, error=None):
+        indicada = _espera_indicada(error) if error is not None else None
+        if indicada is not None:
+            return min(self.espera_maxima, indicada)
+        tope = self.espera_base * 2 ** intento * (self.factor_limite if clase == LIMITE else 1)
+        tope = min(self.espera_maxima, tope)
+        return tope / 2 + self._aleatorio.uniform(0, tope / 2)
+
+# Conexión y escritura en la base de datos: pocos intentos y esperas más largas
+POLITICA_BD = PoliticaReintentos(max_intentos=3, espera_base=2.0)
+
+# =============================================================================
+# CIRCUIT BREAKER POR ENDPOINT
+# =============================================================================
+
+class Circuito:
+    """Circuit breaker de un endpoint: cerrado, abierto o semiabierto.
+
+    Tras `umbral_fallos` fallos seguidos se abre y las llamadas fallan al
+    instante con CircuitoAbierto. Pasado `tiempo_apertura` deja pasar una
+    sola llamada de prueba (semiabierto): si va bien se cierra y si falla
+    vuelve a abrirse.
+    """
+
+    def __init__(self, nombre, umbral_fallos=UMBRAL_FALLOS_CIRCUITO, tiempo_apertura=TIEMPO_APERTURA_CIRCUITO):
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self.estado = "cerrado"
+        self.fallos = 0
+        self.aperturas = 0
+        self._abierto_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        with self._lock:
+            if self.estado == "cerrado":
+                return True
+            if self.estado == "abierto" and time.monotonic() >= self._abierto_hasta:
+                # Solo el primero en llegar hace la llamada de prueba
+                self.estado = "semiabierto"
+                return True
+            return False
+
+    def exito(self):
+        with self._lock:
+            if self.estado != "cerrado":
+                print(f"🔌 Circuito de {self.nombre} cerrado de nuevo")
+            self.estado = "cerrado"
+            self.fallos = 0
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.estado == "semiabierto" or (self.estado == "cerrado" and self.fallos >= self.umbral_fallos):
+                self.estado = "abierto"
+                self.aperturas += 1
+                self._abierto_hasta = time.monotonic() + self.tiempo_apertura
+                METRICAS.incrementar("circuitos_abiertos", endpoint=self.nombre)
+                print(f"⛔ Circuito de {self.nombre} abierto tras {self.fallos} fallos seguidos; "
+                      f"se reintentará en {self.tiempo_apertura:.0f} s")
+
+
+class CortaCircuitos:
+    """Un Circuito por endpoint, compartido por todos los hilos de la extracción"""
+
+    def __init__(self, umbral_fallos=UMBRAL_FALLOS_CIRCUITO, tiempo_apertura=TIEMPO_APERTURA_CIRCUITO):
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self._circuitos = {}
+        self._lock = threading.Lock()
+
+    def circuito(self, endpoint):
+        with self._lock:
+            if endpoint not in self._circuitos:
+                self._circuitos[endpoint] = Circuito(endpoint, self.umbral_fallos, self.tiempo_apertura)
+            return self._circuitos[endpoint]
+
+    def resumen(self):
+        with self._lock:
+            circuitos = list(self._circuitos.values())
+        abiertos = [c for c in circuitos if c.aperturas]
+        if abiertos:
+            print("\n⛔ Endpoints que abrieron su circuito:")
+            for circuito in abiertos:
+                print(f"• {circuito.nombre}: {circuito.aperturas} veces (ahora {circuito.estado})")
+        return abiertos
+
+# =============================================================================
+# EJECUCIÓN CON REINTENTOS
+# =============================================================================
+
+def _comprobar_circuito(circuito, operacion, descripcion):
+    if circuito is not None and not circuito.permitir():
+        METRICAS.incrementar("llamadas_rechazadas", operacion=operacion)
+        raise CircuitoAbierto(f"Circuito de {circuito.nombre} abierto, no se consulta {descripcion}")
+
+def _tras_exito(circuito, limitador):
+    if circuito is not None:
+        circuito.exito()
+    if limitador is not None:
+        limitador.acelerar()
+
+def _tras_fallo(error, intento, politica, operacion, descripcion, circuito, limitador):
+    """Anota el fallo y devuelve la espera antes del siguiente intento, o None si no se reintenta"""
+    clase = clasificar_error(error)
+    if circuito is not None:
+        # Que el dato no exista no dice nada malo del endpoint
+        if clase in (LIMITE, TRANSITORIO):
+            circuito.fallo()
+        else:
+            circuito.exito()
+    if clase == LIMITE and limitador is not None:
+        limitador.frenar()
+    if clase in (NO_ENCONTRADO, PERMANENTE) or intento == politica.max_intentos - 1:
+        return None
+    espera = politica.espera(intento, clase, error)
+    METRICAS.incrementar("reintentos", operacion=operacion, clase=clase)
+    print(f"🔁 {descripcion}: {clase} ({error}); reintento {intento + 1}/{politica.max_intentos - 1} "
+          f"en {espera:.1f} s")
+    return espera
+
+def reintentar(funcion, politica=None, operacion="llamada", descripcion=None, circuito=None, limitador=None):
+    """Ejecuta `funcion()` reintentando los fallos pasajeros con backoff exponencial.
+
+    Los errores NO_ENCONTRADO y PERMANENTE se propagan al momento; LIMITE y
+    TRANSITORIO se reintentan hasta `politica.max_intentos` y después se
+    propaga el último. Con un `circuito`, los fallos pasajeros cuentan para
+    abrirlo y, si está abierto, se lanza CircuitoAbierto sin llamar. Con un
+    `limitador` (LimitadorTasa), un LIMITE lo frena y cada acierto lo
+    recupera poco a poco. `operacion` es la etiqueta de las métricas.
+    """
+    politica = politica or PoliticaReintentos()
+    descripcion = descripcion or operacion
+    for intento in range(politica.max_intentos):
+        _comprobar_circuito(circuito, operacion, descripcion)
+        try:
+            resultado = funcion()
+        except Exception as e:
+            espera = _tras_fallo(e, intento, politica, operacion, descripcion, circuito, limitador)
+            if espera is None:
+                raise
+            time.sleep(espera)
+        else:
+            _tras_exito(circuito, limitador)
+            return resultado
+
+async def reintentar_async(funcion, politica=None, operacion="llamada", descripcion=None, circuito=None,
+                           limitador=None):
+    """Como `reintentar`, para una función que devuelve una corrutina; espera sin bloquear el bucle"""
+    politica = politica or PoliticaReintentos()
+    descripcion = descripcion or operacion
+    for intento in range(politica.max_intentos):
+        _comprobar_circuito(circuito, operacion, descripcion)
+        try:
+            resultado = await funcion()
+        except Exception as e:
+            espera = _tras_fallo(e, intento, politica, operacion, descripcion, circuito, limitador)
+            if espera is None:
+                raise
+            await asyncio.sleep(espera)
+        else:
+            _tras_exito(circuito, limitador)
+            return resultado
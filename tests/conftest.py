@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del ETL están en la raíz del repositorio, sin paquete
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class RelojFalso:
+    """Sustituye al módulo `time`: `sleep` avanza el reloj al instante y anota cada espera"""
+
+    def __init__(self, inicio=1000.0):
+        self.ahora = inicio
+        self.esperas = []
+
+    def monotonic(self):
+        return self.ahora
+
+    def time(self):
+        return self.ahora
+
+    def perf_counter(self):
+        return self.ahora
+
+    def sleep(self, segundos):
+        self.esperas.append(segundos)
+        self.ahora += segundos
+
+    def avanzar(self, segundos):
+        self.ahora += segundos
+
+
+@pytest.fixture
+def reloj():
+    return RelojFalso()
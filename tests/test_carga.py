@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from almacenamiento import AlmacenamientoSQL, crear_almacenamiento
+from benchmark_etl import generar_datos_acciones
+from carga import guardar_dataframe_seguro
+from esquema import crear_esquema
+from transformacion import construir_mercado_diario
+
+# =============================================================================
+# UPSERT IDEMPOTENTE POR CLAVE (TICKER, FECHA)
+# =============================================================================
+
+@pytest.fixture
+def mercado_diario():
+    return construir_mercado_diario(generar_datos_acciones(4, 60))
+
+@pytest.fixture(params=["sqlite", "duckdb"])
+def destino(request, tmp_path):
+    if request.param == "sqlite":
+        engine = create_engine(f"sqlite:///{tmp_path / 'datos.sqlite'}")
+        crear_esquema(engine)
+        almacenamiento = AlmacenamientoSQL(engine, modo="upsert")
+    else:
+        almacenamiento = crear_almacenamiento("duckdb", ruta=str(tmp_path / "datos.duckdb"))
+    yield almacenamiento
+    almacenamiento.cerrar()
+
+def _ordenadas(df):
+    return df.sort_values(["ticker", "date"]).reset_index(drop=True)
+
+def test_guardar_dos_veces_no_duplica_filas(destino, mercado_diario):
+    assert destino.guardar(mercado_diario, "mercado_diario", "date")
+    assert destino.guardar(mercado_diario, "mercado_diario", "date")
+    guardadas = destino.leer("mercado_diario")
+    assert len(guardadas) == len(mercado_diario)
+    assert not guardadas.duplicated(["ticker", "date"]).any()
+
+def test_guardar_con_solape_actualiza_y_anade(destino, mercado_diario):
+    fechas = sorted(mercado_diario["date"].unique())
+    primera = mercado_diario[mercado_diario["date"] <= fechas[40]]
+    destino.guardar(primera, "mercado_diario", "date")
+
+    # El segundo tramo repite 10 sesiones con el cierre corregido
+    segunda = mercado_diario[mercado_diario["date"] > fechas[30]].copy()
+    corregidas = segunda["date"] <= fechas[40]
+    segunda.loc[corregidas, "closing price"] = segunda.loc[corregidas, "closing price"] + 1
+    assert destino.guardar(segunda, "mercado_diario", "date")
+
+    guardadas = _ordenadas(destino.leer("mercado_diario"))
+    assert len(guardadas) == len(mercado_diario)
+    esperado = _ordenadas(pd.concat([primera[primera["date"] <= fechas[30]], segunda]))
+    assert guardadas["closing price"].to_numpy() == pytest.approx(esperado["closing price"].to_numpy(),
+                                                                 nan_ok=True)
+
+def test_upsert_sqlite_usa_la_clave_de_la_tabla(tmp_path, mercado_diario):
+    engine = create_engine(f"sqlite:///{tmp_path / 'datos.sqlite'}")
+    crear_esquema(engine)
+    for _ in range(3):
+        assert guardar_dataframe_seguro(engine, mercado_diario, "mercado_diario", "date", modo="upsert")
+    with engine.connect() as conn:
+        filas = conn.execute(text("SELECT COUNT(*) FROM mercado_diario")).scalar()
+        tablas = {fila[0] for fila in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+    assert filas == len(mercado_diario)
+    # La tabla de paso del upsert no queda en la base
+    assert not any(tabla.startswith("_staging") for tabla in tablas)
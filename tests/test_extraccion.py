@@ -0,0 +1,175 @@
+import threading
+import time
+
+import pytest
+
+import extraccion
+from benchmark_etl import ProveedorSintetico, TickerSintetico, _comparar_tablas, generar_lista_acciones
+from extraccion import ContadorLlamadas, LimitadorTasa, extraer_datos_acciones
+from resiliencia import PoliticaReintentos
+
+DIAS = 120
+ENDPOINTS = {"info", "history", "dividends", "splits", "recommendations"}
+
+# =============================================================================
+# LIMITADOR DE TASA
+# =============================================================================
+
+def test_limitador_deja_pasar_la_rafaga_y_despues_espera(monkeypatch, reloj):
+    monkeypatch.setattr(extraccion, "time", reloj)
+    limitador = LimitadorTasa(2.0)
+    limitador.adquirir()
+    limitador.adquirir()
+    assert reloj.esperas == []
+
+    for _ in range(4):
+        limitador.adquirir()
+    # 4 llamadas más a 2 por segundo: 2 segundos de espera en total
+    assert sum(reloj.esperas) == pytest.approx(2.0)
+
+def test_limitador_recupera_tokens_con_el_tiempo(monkeypatch, reloj):
+    monkeypatch.setattr(extraccion, "time", reloj)
+    limitador = LimitadorTasa(4.0)
+    for _ in range(4):
+        limitador.adquirir()
+    reloj.avanzar(1.0)
+    for _ in range(4):
+        limitador.adquirir()
+    assert reloj.esperas == []
+
+def test_limitador_frena_y_acelera_sin_salir_de_sus_limites(monkeypatch, reloj):
+    monkeypatch.setattr(extraccion, "time", reloj)
+    limitador = LimitadorTasa(10.0)
+    assert limitador.frenar() == pytest.approx(5.0)
+    # Los 429 de las llamadas en vuelo cuentan como uno solo
+    assert limitador.frenar() == pytest.approx(5.0)
+    for _ in range(10):
+        reloj.avanzar(2.0)
+        limitador.frenar()
+    assert limitador.tasa == pytest.approx(limitador.tasa_minima)
+
+    for _ in range(100):
+        limitador.acelerar()
+    assert limitador.tasa == pytest.approx(10.0)
+
+def test_limitador_compartido_acota_la_tasa_de_todos_los_hilos():
+    limitador = LimitadorTasa(200.0, capacidad=1)
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=lambda: [limitador.adquirir() for _ in range(10)]) for _ in range(5)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    # 50 tokens con uno de partida: al menos 49 / 200 segundos
+    assert time.perf_counter() - inicio >= 49 / 200 * 0.9
+
+# =============================================================================
+# POOL DE EXTRACCIÓN
+# =============================================================================
+
+class ProveedorConcurrencia(ProveedorSintetico):
+    """Proveedor sintético que mide cuántas llamadas hay en vuelo a la vez"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.en_vuelo = 0
+        self.max_en_vuelo = 0
+        self._lock_vuelo = threading.Lock()
+
+    def llamada(self, ticker, endpoint):
+        with self._lock_vuelo:
+            self.en_vuelo += 1
+            self.max_en_vuelo = max(self.max_en_vuelo, self.en_vuelo)
+        try:
+            super().llamada(ticker, endpoint)
+        finally:
+            with self._lock_vuelo:
+                self.en_vuelo -= 1
+
+def test_pool_extrae_cada_endpoint_una_vez_por_ticker_en_orden():
+    lista = generar_lista_acciones(8)
+    contador = ContadorLlamadas()
+    datos = extraer_datos_acciones(lista, max_workers=4, proveedor=ProveedorSintetico(DIAS),
+                                   limitador=LimitadorTasa(1000.0), contador=contador)
+    assert list(datos) == [accion["ticker"] for accion in lista]
+    assert contador.duplicados() == {}
+    assert contador.total_por_endpoint() == {endpoint: len(lista) for endpoint in ENDPOINTS}
+
+def test_pool_respeta_el_numero_de_hilos():
+    proveedor = ProveedorConcurrencia(DIAS, latencia=0.02)
+    extraer_datos_acciones(generar_lista_acciones(12), max_workers=3, proveedor=proveedor,
+                           limitador=LimitadorTasa(1000.0))
+    assert 1 < proveedor.max_en_vuelo <= 3
+
+def test_pool_da_las_mismas_tablas_que_la_extraccion_serial():
+    lista = generar_lista_acciones(6)
+    serial = extraer_datos_acciones(lista, max_workers=1, proveedor=ProveedorSintetico(DIAS),
+                                    limitador=LimitadorTasa(1000.0))
+    concurrente = extraer_datos_acciones(lista, max_workers=4, proveedor=ProveedorSintetico(DIAS),
+                                         limitador=LimitadorTasa(1000.0))
+    assert _comparar_tablas(serial, concurrente) == []
+
+def test_reintento_no_cuenta_como_otra_llamada():
+    contador = ContadorLlamadas()
+    datos = extraer_datos_acciones(generar_lista_acciones(6), max_workers=2,
+                                   proveedor=ProveedorSintetico(DIAS, tasa_errores=0.3, semilla=1),
+                                   limitador=LimitadorTasa(1000.0), contador=contador,
+                                   politica_reintentos=PoliticaReintentos(max_intentos=8, espera_base=0.001))
+    assert len(datos) == 6
+    assert contador.duplicados() == {}
+    assert sum(contador.intentos_por_endpoint().values()) > sum(contador.total_por_endpoint().values())
+
+def test_ticker_sin_info_queda_fuera_del_resultado():
+    lista = generar_lista_acciones(3)
+    datos = extraer_datos_acciones(lista, max_workers=2,
+                                   proveedor=ProveedorSintetico(DIAS, endpoints_caidos={"info"}),
+                                   limitador=LimitadorTasa(1000.0),
+                                   politica_reintentos=PoliticaReintentos(max_intentos=1))
+    assert datos == {}
+
+# =============================================================================
+# EXTRACCIÓN INCREMENTAL Y RECARGA POR SPLIT
+# =============================================================================
+
+def _fechas_y_split(ticker, proveedor):
+    sintetico = TickerSintetico(ticker, proveedor)
+    fechas = [marca.date() for marca in sintetico._historial_completo().index]
+    splits = sintetico._splits()
+    return fechas, (None if splits.empty else splits.index[0].date())
+
+def test_incremental_solo_trae_las_sesiones_nuevas_sin_pedir_eventos():
+    proveedor = ProveedorSintetico(DIAS)
+    lista = [accion for accion in generar_lista_acciones(10)
+             if _fechas_y_split(accion["ticker"], proveedor)[1] is None][:3]
+    fechas, _ = _fechas_y_split(lista[0]["ticker"], proveedor)
+    ultimas = {accion["ticker"]: fechas[-10] for accion in lista}
+
+    contador = ContadorLlamadas()
+    datos = extraer_datos_acciones(lista, max_workers=2, proveedor=proveedor, limitador=LimitadorTasa(1000.0),
+                                   contador=contador, ultimas_fechas=ultimas)
+    for accion in lista:
+        historial = datos[accion["ticker"]]["historial"]
+        assert len(historial) == 9
+        assert historial.index.tz_localize(None).normalize().min().date() > fechas[-10]
+    # Los eventos nuevos salen de las columnas del histórico
+    assert "dividends" not in contador.total_por_endpoint()
+    assert "splits" not in contador.total_por_endpoint()
+
+def test_split_en_el_tramo_nuevo_recarga_el_historico_completo():
+    proveedor = ProveedorSintetico(DIAS)
+    ticker = next(accion["ticker"] for accion in generar_lista_acciones(10)
+                  if _fechas_y_split(accion["ticker"], proveedor)[1] is not None)
+    fechas, fecha_split = _fechas_y_split(ticker, proveedor)
+    desde = fechas[fechas.index(fecha_split) - 5]
+
+    contador = ContadorLlamadas()
+    datos = extraer_datos_acciones([{"ticker": ticker, "mercado": "IBEX_35"}], max_workers=1,
+                                   proveedor=proveedor, limitador=LimitadorTasa(1000.0), contador=contador,
+                                   ultimas_fechas={ticker: desde})
+    resultado = datos[ticker]
+    assert resultado["desde"] is None
+    assert len(resultado["historial"]) == DIAS
+    assert len(resultado["splits"]) == 1
+    # El tramo incremental y la recarga completa son dos peticiones distintas, no una repetida
+    assert contador.conteos()[(ticker, "history")] == 2
+    assert contador.duplicados() == {}
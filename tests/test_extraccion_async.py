@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from benchmark_etl import (ProveedorSintetico, ServidorYahooSintetico, TickerSintetico, _comparar_tablas,
+                           generar_lista_acciones)
+from extraccion import LimitadorTasa, extraer_datos_acciones
+from extraccion_async import extraer_datos_acciones_async
+
+DIAS = 120
+N_TICKERS = 10
+
+# =============================================================================
+# MISMO PAQUETE DE DATOS QUE EL MOTOR POR HILOS
+# =============================================================================
+# Los dos motores leen los mismos datos sintéticos: el de hilos a través de
+# ProveedorSintetico y el asíncrono por HTTP contra el servidor local que
+# imita la API de Yahoo. Los huecos del histórico sintético ejercitan los NA.
+
+@pytest.fixture(scope="module")
+def servidor():
+    with ServidorYahooSintetico(DIAS) as servidor:
+        yield servidor
+
+@pytest.fixture(scope="module")
+def lista():
+    return generar_lista_acciones(N_TICKERS)
+
+def _ultimas_fechas(lista):
+    """Una fecha antes del split para los tickers con split y diez sesiones atrás para el resto"""
+    proveedor = ProveedorSintetico(DIAS)
+    ultimas = {}
+    for accion in lista:
+        sintetico = TickerSintetico(accion["ticker"], proveedor)
+        fechas = [marca.date() for marca in sintetico._historial_completo().index]
+        splits = sintetico._splits()
+        ultimas[accion["ticker"]] = (fechas[-10] if splits.empty
+                                     else fechas[fechas.index(splits.index[0].date()) - 5])
+    return ultimas
+
+def _extraer_con_los_dos_motores(lista, servidor, ultimas_fechas=None):
+    hilos = extraer_datos_acciones(lista, max_workers=4, proveedor=ProveedorSintetico(DIAS),
+                                   limitador=LimitadorTasa(1000.0), ultimas_fechas=ultimas_fechas)
+    asincrono = extraer_datos_acciones_async(lista, limitador=LimitadorTasa(1000.0), url_base=servidor.url,
+                                             ultimas_fechas=ultimas_fechas)
+    return hilos, asincrono
+
+def _comprobar_iguales(hilos, asincrono):
+    assert list(asincrono) == list(hilos)
+    for ticker, datos in hilos.items():
+        assert asincrono[ticker]["desde"] == datos["desde"]
+        assert asincrono[ticker]["errores"] == datos["errores"]
+        assert len(asincrono[ticker]["historial"]) == len(datos["historial"])
+    assert _comparar_tablas(hilos, asincrono) == []
+
+def test_historico_completo_da_las_mismas_tablas(servidor, lista):
+    _comprobar_iguales(*_extraer_con_los_dos_motores(lista, servidor))
+
+def test_incremental_y_recarga_por_split_dan_las_mismas_tablas(servidor, lista):
+    ultimas = _ultimas_fechas(lista)
+    hilos, asincrono = _extraer_con_los_dos_motores(lista, servidor, ultimas)
+    _comprobar_iguales(hilos, asincrono)
+    # Hay tickers de los dos caminos: recarga completa por split y tramo incremental
+    assert {datos["desde"] is None for datos in asincrono.values()} == {True, False}
+
+@pytest.mark.parametrize("zona", ["Asia/Tokyo", "Pacific/Kiritimati", "America/Bogota"])
+def test_incremental_no_depende_de_la_zona_horaria_de_la_maquina(servidor, lista, zona, monkeypatch):
+    # El proveedor en proceso fecha el histórico con el día local: se compara el motor asíncrono consigo mismo
+    ultimas = _ultimas_fechas(lista)
+    referencia = extraer_datos_acciones_async(lista, limitador=LimitadorTasa(1000.0), url_base=servidor.url,
+                                              ultimas_fechas=ultimas)
+    monkeypatch.setenv("TZ", zona)
+    time.tzset()
+    try:
+        en_zona = extraer_datos_acciones_async(lista, limitador=LimitadorTasa(1000.0), url_base=servidor.url,
+                                               ultimas_fechas=ultimas)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    _comprobar_iguales(referencia, en_zona)
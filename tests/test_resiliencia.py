@@ -0,0 +1,178 @@
+import json
+import types
+
+import pytest
+
+import resiliencia
+from resiliencia import (LIMITE, NO_ENCONTRADO, PERMANENTE, TRANSITORIO, Circuito, CircuitoAbierto,
+                         PoliticaReintentos, clasificar_error, es_recuperable, reintentar)
+
+
+class ErrorHTTP(Exception):
+    """Error con código y cabeceras, como los de requests o aiohttp"""
+
+    def __init__(self, status, cabeceras=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.response = types.SimpleNamespace(status_code=status, headers=cabeceras or {})
+
+
+class ErrorMySQL(Exception):
+    """Excepción de SQLAlchemy con el error del driver en `orig`"""
+
+    def __init__(self, codigo):
+        super().__init__(f"MySQL {codigo}")
+        self.orig = Exception(codigo, "detalle")
+
+
+@pytest.fixture
+def reloj_resiliencia(monkeypatch, reloj):
+    monkeypatch.setattr(resiliencia, "time", reloj)
+    return reloj
+
+def _falla_y_luego(errores, resultado="ok"):
+    """Función que lanza cada error de `errores` en orden y después devuelve `resultado`"""
+    pendientes = list(errores)
+    llamadas = []
+
+    def funcion():
+        llamadas.append(1)
+        if pendientes:
+            raise pendientes.pop(0)
+        return resultado
+    return funcion, llamadas
+
+# =============================================================================
+# CLASIFICACIÓN DE ERRORES
+# =============================================================================
+
+@pytest.mark.parametrize("error, clase", [
+    (ErrorHTTP(429), LIMITE),
+    (RuntimeError("Too Many Requests. Rate limited. Try after a while."), LIMITE),
+    (ErrorHTTP(404), NO_ENCONTRADO),
+    (RuntimeError("$XYZ: possibly delisted; no timezone found"), NO_ENCONTRADO),
+    (ErrorHTTP(503), TRANSITORIO),
+    (ErrorHTTP(408), TRANSITORIO),
+    (ErrorHTTP(400), PERMANENTE),
+    (ConnectionResetError("connection reset by peer"), TRANSITORIO),
+    (TimeoutError("read timed out"), TRANSITORIO),
+    (json.JSONDecodeError("Expecting value", "<html>", 0), TRANSITORIO),
+    (KeyError("regularMarketPrice"), PERMANENTE),
+    (ErrorMySQL(1045), PERMANENTE),
+    (ErrorMySQL(1213), TRANSITORIO),
+    (CircuitoAbierto("abierto"), TRANSITORIO),
+])
+def test_clasificar_error(error, clase):
+    assert clasificar_error(error) == clase
+    assert es_recuperable(error) == (clase in (LIMITE, TRANSITORIO))
+
+# =============================================================================
+# POLÍTICA DE REINTENTOS
+# =============================================================================
+
+def test_espera_respeta_retry_after():
+    politica = PoliticaReintentos(espera_maxima=30.0)
+    assert politica.espera(0, LIMITE, ErrorHTTP(429, {"Retry-After": "7"})) == 7.0
+    # Acotada por la espera máxima
+    assert politica.espera(0, LIMITE, ErrorHTTP(429, {"Retry-After": "120"})) == 30.0
+
+def test_retry_after_invalido_usa_el_backoff():
+    politica = PoliticaReintentos(espera_base=1.0, semilla=0)
+    espera = politica.espera(2, TRANSITORIO, ErrorHTTP(503, {"Retry-After": "mañana"}))
+    assert 2.0 <= espera <= 4.0
+
+@pytest.mark.parametrize("intento", range(5))
+def test_backoff_exponencial_con_jitter(intento):
+    politica = PoliticaReintentos(espera_base=0.5, espera_maxima=30.0, factor_limite=4.0, semilla=intento)
+    tope = min(30.0, 0.5 * 2 ** intento)
+    assert tope / 2 <= politica.espera(intento, TRANSITORIO) <= tope
+    tope_limite = min(30.0, tope * 4.0)
+    assert tope_limite / 2 <= politica.espera(intento, LIMITE) <= tope_limite
+
+def test_reintentar_espera_lo_que_indica_el_proveedor(reloj_resiliencia):
+    funcion, llamadas = _falla_y_luego([ErrorHTTP(429, {"Retry-After": "3"}), ErrorHTTP(503, {"Retry-After": "1"})])
+    assert reintentar(funcion, PoliticaReintentos(max_intentos=4)) == "ok"
+    assert len(llamadas) == 3
+    assert reloj_resiliencia.esperas == [3.0, 1.0]
+
+def test_reintentar_no_repite_errores_definitivos(reloj_resiliencia):
+    for error in (ErrorHTTP(404), ValueError("dato mal formado")):
+        funcion, llamadas = _falla_y_luego([error])
+        with pytest.raises(type(error)):
+            reintentar(funcion, PoliticaReintentos(max_intentos=4))
+        assert len(llamadas) == 1
+    assert reloj_resiliencia.esperas == []
+
+def test_reintentar_propaga_el_ultimo_error_al_agotar_los_intentos(reloj_resiliencia):
+    funcion, llamadas = _falla_y_luego([ErrorHTTP(503)] * 10)
+    with pytest.raises(ErrorHTTP):
+        reintentar(funcion, PoliticaReintentos(max_intentos=3))
+    assert len(llamadas) == 3
+    assert len(reloj_resiliencia.esperas) == 2
+
+def test_limite_frena_el_limitador():
+    frenadas = []
+    limitador = types.SimpleNamespace(frenar=lambda: frenadas.append(1), acelerar=lambda: None)
+    funcion, _ = _falla_y_luego([ErrorHTTP(429, {"Retry-After": "0"})])
+    reintentar(funcion, PoliticaReintentos(max_intentos=2), limitador=limitador)
+    assert frenadas == [1]
+
+# =============================================================================
+# CIRCUIT BREAKER
+# =============================================================================
+
+def test_circuito_se_abre_tras_el_umbral_de_fallos(reloj_resiliencia):
+    circuito = Circuito("info", umbral_fallos=3, tiempo_apertura=60.0)
+    for _ in range(2):
+        circuito.fallo()
+        assert circuito.estado == "cerrado" and circuito.permitir()
+    circuito.fallo()
+    assert circuito.estado == "abierto"
+    assert not circuito.permitir()
+    reloj_resiliencia.avanzar(59.0)
+    assert not circuito.permitir()
+
+def test_circuito_semiabierto_deja_pasar_una_sola_prueba(reloj_resiliencia):
+    circuito = Circuito("info", umbral_fallos=1, tiempo_apertura=60.0)
+    circuito.fallo()
+    reloj_resiliencia.avanzar(60.0)
+    assert circuito.permitir()
+    assert circuito.estado == "semiabierto"
+    assert not circuito.permitir()
+
+def test_circuito_semiabierto_se_cierra_con_un_acierto(reloj_resiliencia):
+    circuito = Circuito("info", umbral_fallos=1, tiempo_apertura=60.0)
+    circuito.fallo()
+    reloj_resiliencia.avanzar(60.0)
+    circuito.permitir()
+    circuito.exito()
+    assert circuito.estado == "cerrado" and circuito.fallos == 0
+    assert circuito.permitir()
+
+def test_circuito_semiabierto_vuelve_a_abrirse_con_un_fallo(reloj_resiliencia):
+    circuito = Circuito("info", umbral_fallos=3, tiempo_apertura=60.0)
+    for _ in range(3):
+        circuito.fallo()
+    reloj_resiliencia.avanzar(60.0)
+    circuito.permitir()
+    # En semiabierto basta un fallo, sin esperar al umbral
+    circuito.fallo()
+    assert circuito.estado == "abierto" and circuito.aperturas == 2
+    assert not circuito.permitir()
+    reloj_resiliencia.avanzar(60.0)
+    assert circuito.permitir()
+
+def test_circuito_abierto_rechaza_sin_llamar(reloj_resiliencia):
+    circuito = Circuito("history", umbral_fallos=2, tiempo_apertura=60.0)
+    funcion, llamadas = _falla_y_luego([ErrorHTTP(503)] * 10)
+    with pytest.raises(CircuitoAbierto):
+        reintentar(funcion, PoliticaReintentos(max_intentos=5), circuito=circuito)
+    assert len(llamadas) == 2
+
+def test_dato_inexistente_no_cuenta_para_el_circuito(reloj_resiliencia):
+    circuito = Circuito("splits", umbral_fallos=2)
+    for _ in range(5):
+        funcion, _ = _falla_y_luego([ErrorHTTP(404)])
+        with pytest.raises(ErrorHTTP):
+            reintentar(funcion, PoliticaReintentos(), circuito=circuito)
+    assert circuito.estado == "cerrado"
@@ -0,0 +1,403 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from metricas import METRICAS
+
+# =============================================================================
+# TRANSFORMACIÓN: CONSTRUCCIÓN DE LAS TABLAS
+# =============================================================================
+# Todos los constructores leen únicamente del paquete de datos por ticker que
+# devuelve `extraer_datos_acciones` ({ticker: datos}); ninguno vuelve a
+# consultar al proveedor.
+
+# Función para manejar valores nulos de forma más robusta
+def safe_get(data, key, default=None):
+    """Obtiene valores de forma segura de diccionarios anidados"""
+    if isinstance(data, dict):
+        return data.get(key, default)
+    return default
+
+# =============================================================================
+# POLÍTICA DE TIPOS EN MEMORIA
+# =============================================================================
+# Cada constructor devuelve su tabla con tipos compactos: ticker y mercado
+# categóricos, precios en float32, enteros y ratios con NA nativo (Int64 y
+# Float64) y textos en `string`. Un dato que el proveedor no da queda como NA,
+# no como 0 ni "No disponible", y llega a los destinos como NULL.
+
+# Tipos de la política
+CATEGORIA = "category"
+PRECIO = "precio"
+ENTERO = "Int64"
+DECIMAL = "Float64"
+TEXTO = "string"
+
+# float32 tiene 24 bits de mantisa: por debajo de 2**17 conserva el precio
+# exacto al céntimo; una columna con precios mayores se queda en float64
+PRECIO_MAXIMO_FLOAT32 = 2 ** 17
+DECIMALES_PRECIO = 2
+
+_TEXTOS_ACTIVOS = ("name", "short name", "business summary", "website", "Phone", "address", "city", "state",
+                   "pc", "country", "industry", "sector", "quote type", "currency", "language", "region")
+
+TIPOS_TABLAS = {
+    "activos": {"ticker": CATEGORIA, "market": CATEGORIA, **{c: TEXTO for c in _TEXTOS_ACTIVOS}},
+    "mercado_diario": {
+        "ticker": CATEGORIA, "market": CATEGORIA,
+        "open price": PRECIO, "high price": PRECIO, "low price": PRECIO, "closing price": PRECIO,
+        "volume": ENTERO
+    },
+    "rendimiento_financiero": {
+        "ticker": CATEGORIA, "market": CATEGORIA, "market cap": ENTERO,
+        "avg price 50 days": DECIMAL, "avg price 200 days": DECIMAL, "change percent 52 weeks": DECIMAL
+    },
+    "estados_financieros": {
+        "ticker": CATEGORIA, "market": CATEGORIA,
+        **{c: ENTERO for c in ("total cash", "total debt", "total revenue", "gross profits", "free cash flow",
+                                "operating cash flow", "ebitda", "net income to common")},
+        **{c: DECIMAL for c in ("profit margins", "revenue growth", "price to sale ratio 12 months",
+                                 "enterprise to revenue", "enterprise to_ebitda", "price to earnings",
+                                 "per futuro", "price to book", "debt to equity", "roa", "roe", "eps ttm",
+                                 "eps fordward")},
+        "financial currency": TEXTO
+    },
+    "dividendos": {"ticker": CATEGORIA, "market": CATEGORIA},
+    "splits": {"ticker": CATEGORIA, "market": CATEGORIA},
+    "recomendaciones": {
+        "ticker": CATEGORIA, "mercado": CATEGORIA, "period": CATEGORIA,
+        **{c: ENTERO for c in ("strongBuy", "buy", "hold", "sell", "strongSell")}
+    },
+    "consenso_analistas": {
+        "ticker": CATEGORIA, "market": CATEGORIA, "average analyst recommendation rating": DECIMAL,
+        "number of analysts": ENTERO, "average price": ENTERO
+    },
+    # Serie ajustada de ajustes.py: sin redondear, los factores acumulados tienen más de 2 decimales
+    "mercado_ajustado": {
+        "ticker": CATEGORIA, "market": CATEGORIA,
+        **{c: DECIMAL for c in ("open price", "high price", "low price", "closing price", "adjustment factor")},
+        "volume": ENTERO
+    },
+    "estado_ajustes": {"ticker": CATEGORIA, "market": CATEGORIA, "actions hash": TEXTO},
+    "base_precios": {"ticker": CATEGORIA, "market": CATEGORIA, "price basis": TEXTO},
+    # Tablas derivadas de analitica.py
+    "rendimientos_diarios": {
+        "ticker": CATEGORIA, "market": CATEGORIA, "closing price": DECIMAL, "log return": DECIMAL,
+        **{f"avg price {n} days": DECIMAL for n in (20, 50, 200)},
+        **{f"volatility {n} days": DECIMAL for n in (20, 50, 200)}
+    },
+    "correlaciones_mercados": {
+        "ticker": CATEGORIA, "market": CATEGORIA, "ticker b": CATEGORIA, "market b": CATEGORIA,
+        "correlation": DECIMAL
+    }
+}
+
+def _a_precio(serie):
+    valores = pd.to_numeric(serie, errors="coerce").astype("float64").round(DECIMALES_PRECIO)
+    maximo = valores.abs().max()
+    return valores if maximo >= PRECIO_MAXIMO_FLOAT32 else valores.astype("float32")
+
+def _a_tipo(serie, tipo):
+    if tipo == PRECIO:
+        return _a_precio(serie)
+    if tipo in (ENTERO, DECIMAL):
+        # Los valores no numéricos del proveedor (p. ej. "Infinity") quedan como NA
+        valores = pd.to_numeric(serie, errors="coerce").astype("float64")
+        valores = valores.where(np.isfinite(valores))
+        return valores.round().astype(ENTERO) if tipo == ENTERO else valores.astype(DECIMAL)
+    return serie.astype(tipo)
+
+def aplicar_tipos(df, tabla):
+    """Convierte las columnas de `df` a los tipos de TIPOS_TABLAS[tabla]; las demás no se tocan"""
+    for columna, tipo in TIPOS_TABLAS.get(tabla, {}).items():
+        if columna in df.columns:
+            df[columna] = _a_tipo(df[columna], tipo)
+    return df
+
+def tipos_de_escritura(df):
+    """Copia de `df` con tipos que aceptan todos los destinos.
+
+    Las categorías pasan a object y los precios float32 a float64 redondeados
+    (el float32 impreso tal cual llevaría decimales espurios a un NUMERIC);
+    Int64, Float64 y string se conservan, con NA como valor nulo.
+    """
+    df = df.copy()
+    for columna in df.columns:
+        serie = df[columna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            df[columna] = serie.astype(object)
+        elif serie.dtype == np.float32:
+            df[columna] = serie.astype("float64").round(DECIMALES_PRECIO)
+    return df
+
+def memoria_tablas(tablas):
+    """Bytes en memoria de cada tabla, contando el contenido de las cadenas"""
+    return {nombre: int(df.memory_usage(index=True, deep=True).sum()) for nombre, df in tablas.items()}
+
+def informe_memoria(tablas):
+    """Muestra la memoria de cada tabla y el total"""
+    memoria = memoria_tablas(tablas)
+    print("\n🧠 Memoria de las tablas:")
+    for nombre, bytes_tabla in memoria.items():
+        filas = len(tablas[nombre])
+        por_fila = f", {bytes_tabla / filas:.0f} B/fila" if filas else ""
+        print(f"• {nombre}: {bytes_tabla / 2 ** 20:.2f} MiB ({filas} filas{por_fila})")
+    print(f"• Total: {sum(memoria.values()) / 2 ** 20:.2f} MiB")
+    return memoria
+
+# TABLA 1: activos
+def construir_activos(datos_acciones):
+    """Construye la tabla de activos a partir del info de cada ticker"""
+    activos_data = []
+    for ticker, datos in datos_acciones.items():
+        info = datos["info"]
+
+        activos_data.append({
+            "ticker": ticker,
+            "market": datos["mercado"],  # Nueva columna para identificar el mercado
+            "name": safe_get(info, "longName"),
+            "short name": safe_get(info, "shortName"),
+            "business summary": safe_get(info, "longBusinessSummary"),
+            "website": safe_get(info, "website"),
+            "Phone": safe_get(info, "phone"),
+            "address": safe_get(info, "address1"),
+            "city": safe_get(info, "city"),
+            "state": safe_get(info, "state"),
+            "pc": safe_get(info, "zip"),
+            "country": safe_get(info, "country"),
+            "industry": safe_get(info, "industry"),
+            "sector": safe_get(info, "sector"),
+            "quote type": safe_get(info, "quoteType"),
+            "currency": safe_get(info, "currency"),
+            "language": safe_get(info, "language"),
+            "region": safe_get(info, "region")
+        })
+
+    return aplicar_tipos(pd.DataFrame(activos_data), "activos")
+
+# TABLA 2: datos_mercado_diario
+COLUMNAS_PRECIOS = {
+    "Open": "open price",
+    "High": "high price",
+    "Low": "low price",
+    "Close": "closing price"
+}
+
+def construir_mercado_diario(datos_acciones):
+    """Construye la tabla de precios diarios a partir del histórico de cada ticker.
+
+    Transformación columnar: se concatenan los arrays del histórico de todos
+    los tickers y el redondeo y la extracción de la fecha se hacen sobre
+    columnas completas en lugar de fila a fila. Un precio o volumen que falta
+    queda como NA.
+    """
+    tickers, mercados, fechas, volumen = [], [], [], []
+    precios = {destino: [] for destino in COLUMNAS_PRECIOS.values()}
+    for ticker, datos in datos_acciones.items():
+        historial = datos["historial"]
+        if historial.empty:
+            continue
+
+        indice = pd.DatetimeIndex(historial.index)
+        if indice.tz is not None:
+            # Quitar la zona horaria conserva la fecha local de la bolsa
+            indice = indice.tz_localize(None)
+        fechas.append(indice.normalize().to_numpy())
+        tickers.append(np.full(len(historial), ticker, dtype=object))
+        mercados.append(np.full(len(historial), datos["mercado"], dtype=object))
+        for origen, destino in COLUMNAS_PRECIOS.items():
+            precios[destino].append(historial[origen].to_numpy(dtype=float))
+        volumen.append(historial["Volume"].to_numpy(dtype=float))
+
+    if not fechas:
+        return pd.DataFrame()
+
+    mercado_diario = pd.DataFrame({
+        "ticker": pd.Categorical(np.concatenate(tickers), categories=list(datos_acciones)),
+        "market": pd.Categorical(np.concatenate(mercados)),  # Nueva columna para identificar el mercado
+        "date": pd.Series(np.concatenate(fechas)).dt.date
+    })
+    for destino, arrays in precios.items():
+        mercado_diario[destino] = np.concatenate(arrays)
+    mercado_diario["volume"] = np.concatenate(volumen)
+    return aplicar_tipos(mercado_diario, "mercado_diario")
+
+# TABLA 3: rendimiento_financiero
+def construir_rendimiento_financiero(datos_acciones):
+    """Construye la tabla de rendimiento financiero a partir del info de cada ticker"""
+    rendimiento_data = []
+    for ticker, datos in datos_acciones.items():
+        info = datos["info"]
+
+        rendimiento_data.append({
+            "ticker": ticker,
+            "market": datos["mercado"],  # Nueva columna para identificar el mercado
+            "market cap": safe_get(info, "marketCap"),
+            "avg price 50 days": safe_get(info, "fiftyDayAverage"),
+            "avg price 200 days": safe_get(info, "twoHundredDayAverage"),
+            "change percent 52 weeks": safe_get(info, "fiftyTwoWeekChangePercent")
+        })
+
+    return aplicar_tipos(pd.DataFrame(rendimiento_data), "rendimiento_financiero")
+
+# TABLA 4: estados_financieros
+def construir_estados_financieros(datos_acciones):
+    """Construye la tabla de estados financieros a partir del info de cada ticker"""
+    estados_data = []
+    for ticker, datos in datos_acciones.items():
+        info = datos["info"]
+
+        estados_data.append({
+            "ticker": ticker,
+            "market": datos["mercado"],  # Nueva columna para identificar el mercado
+            "total cash": safe_get(info, "totalCash"),
+            "total debt": safe_get(info, "totalDebt"),
+            "total revenue": safe_get(info, "totalRevenue"),
+            "profit margins": safe_get(info, "profitMargins"),
+            "gross profits": safe_get(info, "grossProfits"),
+            "free cash flow": safe_get(info, "freeCashflow"),
+            "operating cash flow": safe_get(info, "operatingCashflow"),
+            "revenue growth": safe_get(info, "revenueGrowth"),
+            "ebitda": safe_get(info, "ebitda"),
+            "net income to common": safe_get(info, "netIncomeToCommon"),
+            "financial currency": safe_get(info, "financialCurrency"),
+            "price to sale ratio 12 months": safe_get(info, "priceToSalesTrailing12Months"),
+            "enterprise to revenue": safe_get(info, "enterpriseToRevenue"),
+            "enterprise to_ebitda": safe_get(info, "enterpriseToEbitda"),
+            "price to earnings": safe_get(info, "trailingPE"),
+            "per futuro": safe_get(info, "forwardPE"),
+            "price to book": safe_get(info, "priceToBook"),
+            "debt to equity": safe_get(info, "debtToEquity"),
+            "roa": safe_get(info, "returnOnAssets"),
+            "roe": safe_get(info, "returnOnEquity"),
+            "eps ttm": safe_get(info, "epsTrailingTwelveMonths"),
+            "eps fordward": safe_get(info, "epsForward")
+        })
+
+    return aplicar_tipos(pd.DataFrame(estados_data), "estados_financieros")
+
+def construir_eventos(datos_acciones, clave, columna_valor):
+    """Construye una tabla larga (Date, ticker, valor, market) de eventos por ticker.
+
+    Se concatenan solo los eventos no nulos de cada Series en lugar de
+    alinear todos los tickers en una matriz fechas x tickers, así que el
+    coste crece con el número de eventos.
+    """
+    eventos = []
+    for ticker, datos in datos_acciones.items():
+        serie = datos[clave]
+        if serie is None or serie.empty:
+            continue
+        serie = serie[serie.notna() & (serie != 0)]
+        if serie.empty:
+            continue
+
+        indice = pd.DatetimeIndex(serie.index)
+        if indice.tz is not None:
+            # Fecha local de la bolsa, igual que en mercado_diario
+            indice = indice.tz_localize(None)
+        eventos.append(pd.DataFrame({
+            "Date": indice.normalize().date,
+            "ticker": ticker,
+            columna_valor: serie.to_numpy(dtype=float),
+            "market": datos["mercado"]
+        }).sort_values("Date", kind="stable"))
+
+    if not eventos:
+        return pd.DataFrame(columns=["Date", "ticker", columna_valor, "market"])
+    eventos = pd.concat(eventos, ignore_index=True)
+    eventos["ticker"] = pd.Categorical(eventos["ticker"], categories=list(datos_acciones))
+    eventos["market"] = eventos["market"].astype(CATEGORIA)
+    return eventos
+
+# TABLA 5: Dividendos
+def construir_dividendos(datos_acciones):
+    """Construye la tabla de dividendos a partir de los dividendos ya extraídos"""
+    dividendos = construir_eventos(datos_acciones, "dividendos", "divident")
+    if dividendos.empty:
+        print("No se encontraron datos de dividendos")
+    return dividendos
+
+# TABLA 6: Splits
+def construir_splits(datos_acciones):
+    """Construye la tabla de splits a partir de los splits ya extraídos"""
+    return construir_eventos(datos_acciones, "splits", "split ratio")
+
+# TABLA 7: Recomendaciones
+# El proveedor da la tendencia por periodo relativo ("0m", "-1m", ...) sin
+# fecha: cada carga se guarda como una foto del día, con clave
+# (ticker, period, snapshot date)
+FECHA_FOTO = "snapshot date"
+
+def construir_recomendaciones(datos_acciones, fecha=None):
+    """Construye la tabla de recomendaciones a partir de las recomendaciones ya extraídas"""
+    fecha = fecha or date.today()
+    all_recommendations_list = []
+    for ticker, datos in datos_acciones.items():
+        recommendations_df = datos["recomendaciones"]
+
+        if recommendations_df is not None and not recommendations_df.empty:
+            # Copia para no modificar el paquete de datos compartido
+            recommendations_df = recommendations_df.copy()
+            recommendations_df['ticker'] = ticker
+            recommendations_df['mercado'] = datos["mercado"]  # Nueva columna para identificar el mercado
+            # El índice solo se conserva si es informativo (p. ej. fechas), no el RangeIndex
+            recommendations_df = recommendations_df.reset_index(
+                drop=isinstance(recommendations_df.index, pd.RangeIndex))
+            recommendations_df[FECHA_FOTO] = fecha
+            all_recommendations_list.append(recommendations_df)
+
+    # Concatenar todos los DataFrames de la lista en uno solo
+    if not all_recommendations_list:
+        return pd.DataFrame()
+    return aplicar_tipos(pd.concat(all_recommendations_list), "recomendaciones")
+
+# TABLA 8: Consenso analistas
+def construir_consenso_analistas(datos_acciones):
+    """Construye la tabla de consenso de analistas a partir del info ya extraído"""
+    nombres_empresas = {}
+    for ticker, datos in datos_acciones.items():
+        info = datos["info"]
+
+        nombres_empresas[ticker] = {
+            "mercado": datos["mercado"],  # Nueva columna para identificar el mercado
+            "calificacion_media_recomendacion": safe_get(info, "recommendationMean"),
+            "No_analistas": safe_get(info, "numberOfAnalystOpinions"),
+            "precio_objetivo_medio_COP": safe_get(info, "targetMeanPrice")
+        }
+
+    # Crea el DataFrame a partir del diccionario, con los tickers como índice
+    consenso_analistas = pd.DataFrame.from_dict(nombres_empresas, orient='index')
+    consenso_analistas = consenso_analistas.reset_index().rename(columns={'index': 'ticker',
+                'mercado': 'market', 'calificacion_media_recomendacion': 'average analyst recommendation rating',
+                'No_analistas': 'number of analysts', 'precio_objetivo_medio_COP': 'average price'})
+    if consenso_analistas.empty:
+        return consenso_analistas
+    calificacion = 'average analyst recommendation rating'
+    consenso_analistas[calificacion] = pd.to_numeric(consenso_analistas[calificacion], errors='coerce').round(2)
+    # El precio objetivo se trunca a entero, como hasta ahora
+    consenso_analistas['average price'] = np.trunc(pd.to_numeric(consenso_analistas['average price'], errors='coerce'))
+    return aplicar_tipos(consenso_analistas, "consenso_analistas")
+
+CONSTRUCTORES = {
+    'activos': construir_activos,
+    'mercado_diario': construir_mercado_diario,
+    'rendimiento_financiero': construir_rendimiento_financiero,
+    'estados_financieros': construir_estados_financieros,
+    'dividendos': construir_dividendos,
+    'splits': construir_splits,
+    'recomendaciones': construir_recomendaciones,
+    'consenso_analistas': construir_consenso_analistas
+}
+
+def construir_tablas(datos_acciones):
+    """Construye las ocho tablas de salida a partir del mismo paquete de datos"""
+    tablas = {}
+    for nombre, constructor in CONSTRUCTORES.items():
+        with METRICAS.medir("transformacion", tabla=nombre):
+            tablas[nombre] = constructor(datos_acciones)
+        METRICAS.incrementar("filas_transformadas", len(tablas[nombre]), tabla=nombre)
+    for nombre, bytes_tabla in memoria_tablas(tablas).items():
+        METRICAS.incrementar("bytes_en_memoria", bytes_tabla, tabla=nombre)
+    return tablas